@@ -0,0 +1,487 @@
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from compression import open_input
+from config_loader import ConfigLoader
+from constants import DAYS_OF_WEEK, MINUTES_PER_DAY
+from fare_system import LinePairIndex
+from journey import (
+    BATCH_CSV_HEADER,
+    CSV_HEADER,
+    EPOCH_WEEKDAY,
+    SECONDS_PER_DAY,
+    check_header,
+    format_timestamp,
+    in_time_order,
+    parse_timestamp,
+    strptime_timestamp,
+)
+from main import calculate_card_total_fares, calculate_user_total_fare, read_csv
+from settings import BASE_DIR
+from utils import resolve_path
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+DEFAULT_START = "2023-09-11T00:00:00"
+# Share of generated journeys that fall inside a peak window
+PEAK_SHARE = 0.6
+WRITE_BATCH = 100_000
+CONFIG_LOADS = 50
+DEFAULT_HISTORY = "benchmarks/history.json"
+
+
+def _peak_windows(peak_hours):
+    """Return the peak windows of each weekday as (start, end) minutes of the day."""
+    windows = []
+    for day in DAYS_OF_WEEK:
+        day_windows = []
+        for start, end in peak_hours.get(day, []):
+            start_hour, start_minute = map(int, start.split(":"))
+            end_hour, end_minute = map(int, end.split(":"))
+            day_windows.append(
+                (start_hour * 60 + start_minute, end_hour * 60 + end_minute)
+            )
+        windows.append(day_windows)
+    return windows
+
+
+def generate_journeys(config, rows, seed=0, cards=0, days=28, start=DEFAULT_START):
+    """Yield `rows` synthetic CSV rows for `config`, in time order.
+
+    The same arguments always give the same rows. Journeys are spread over
+    `days` days from `start`, with `PEAK_SHARE` of them inside peak windows and
+    line pairs drawn from the whole fare chart. With `cards`, each row starts
+    with one of that many card IDs, a few of which are used far more than others.
+    """
+    rng = random.Random(seed)
+    pairs = [key.split(",") for key in sorted(config["fare_chart"])]
+    windows = _peak_windows(config["peak_hours"])
+    first_day = parse_timestamp(start) // SECONDS_PER_DAY
+
+    for index in range(days):
+        day = first_day + index
+        day_windows = windows[(day + EPOCH_WEEKDAY) % 7]
+        day_rows = rows * (index + 1) // days - rows * index // days
+
+        seconds = []
+        for _ in range(day_rows):
+            if day_windows and rng.random() < PEAK_SHARE:
+                window_start, window_end = rng.choice(day_windows)
+                minute = rng.randint(window_start, window_end)
+            else:
+                minute = rng.randrange(MINUTES_PER_DAY)
+            seconds.append(minute * 60 + rng.randrange(60))
+        seconds.sort()
+
+        for second in seconds:
+            timestamp = day * SECONDS_PER_DAY + second
+            from_line, to_line = rng.choice(pairs)
+            row = [from_line, to_line, format_timestamp(timestamp)]
+            if cards:
+                card = min(int(rng.paretovariate(1.2)) - 1, cards - 1)
+                row.insert(0, f"card-{card}")
+            yield row
+
+
+def write_journeys_csv(file_path, config, rows, seed=0, cards=0, days=28):
+    """Write a synthetic journey CSV from `generate_journeys` to `file_path`."""
+    with open(file_path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(BATCH_CSV_HEADER if cards else CSV_HEADER)
+        batch = []
+        for row in generate_journeys(config, rows, seed, cards, days):
+            batch.append(row)
+            if len(batch) >= WRITE_BATCH:
+                writer.writerows(batch)
+                batch.clear()
+        writer.writerows(batch)
+
+
+def peak_rss():
+    """Return the peak resident set size of this process in bytes, if known."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def run_benchmark(config_path, file_path):
+    """Price `file_path` stage by stage and return the timing of each stage.
+
+    The stages are the ones `main` runs: loading the configuration (repeated
+    `CONFIG_LOADS` times, since a single load is too quick to time reliably),
+    reading the CSV with `main.read_csv`, which validates every row into a
+    `Journey`, sorting by time and calculating the fare. Returns a list of
+    (stage, seconds, rows, peak RSS) tuples and the calculated total.
+    """
+    results = []
+
+    def finish(stage, started, rows):
+        results.append((stage, time.perf_counter() - started, rows, peak_rss()))
+
+    started = time.perf_counter()
+    config_loader = ConfigLoader(resolve_path(config_path))
+    for _ in range(CONFIG_LOADS):
+        config = config_loader.load_config()
+    finish("load_config", started, CONFIG_LOADS)
+    line_pairs = LinePairIndex(config["fare_chart"])
+
+    file_path = resolve_path(file_path)
+    with open_input(file_path, text=True) as file:
+        batch = check_header(next(csv.reader(file), None))
+    calculate = calculate_card_total_fares if batch else calculate_user_total_fare
+
+    started = time.perf_counter()
+    journeys = read_csv(file_path, line_pairs, batch=batch)
+    finish("read_csv", started, len(journeys))
+
+    started = time.perf_counter()
+    journeys = in_time_order(journeys)
+    finish("sort", started, len(journeys))
+
+    started = time.perf_counter()
+    total = calculate(config, journeys, presorted=True)
+    finish("calculate", started, len(journeys))
+    return results, total
+
+
+def benchmark_timestamps(date_times):
+    """Time `parse_timestamp` against plain `strptime` on the same timestamps.
+
+    Returns a list of (parser, seconds, rows, peak RSS) tuples, like
+    `run_benchmark`. Raises a `ValueError` if the parsers disagree on any of them.
+    """
+    results = []
+    parsed = []
+    for name, parse in (
+        ("strptime", strptime_timestamp),
+        ("fixed_format", parse_timestamp),
+    ):
+        started = time.perf_counter()
+        parsed.append([parse(date_time) for date_time in date_times])
+        results.append(
+            (name, time.perf_counter() - started, len(date_times), peak_rss())
+        )
+    if parsed[0] != parsed[1]:
+        raise ValueError("The timestamp parsers disagree.")
+    return results
+
+
+def format_speedup(results):
+    """Format parser timings as a table of rows/sec, with the speedup of each."""
+    lines = [f"{'parser':<14}{'seconds':>10}{'rows/sec':>14}{'speedup':>10}"]
+    baseline = results[0][1]
+    for name, seconds, rows, _ in results:
+        rate = rows / seconds if seconds else float("inf")
+        speedup = baseline / seconds if seconds else float("inf")
+        lines.append(f"{name:<14}{seconds:>10.3f}{rate:>14,.0f}{speedup:>9.1f}x")
+    return "\n".join(lines)
+
+
+def format_results(results):
+    """Format benchmark results as a table of rows/sec and peak RSS per stage."""
+    lines = [f"{'stage':<12}{'seconds':>10}{'rows/sec':>14}{'peak RSS':>12}"]
+    for stage, seconds, rows, rss in results:
+        rate = rows / seconds if seconds else float("inf")
+        rss = "n/a" if rss is None else f"{rss / 1024**2:.1f}M"
+        lines.append(f"{stage:<12}{seconds:>10.3f}{rate:>14,.0f}{rss:>12}")
+    seconds = sum(result[1] for result in results)
+    rows = results[-1][2] if results else 0
+    rate = rows / seconds if seconds else float("inf")
+    lines.append(f"{'total':<12}{seconds:>10.3f}{rate:>14,.0f}")
+    return "\n".join(lines)
+
+
+def git_revision():
+    """Return the short git revision of this checkout, marked if it has changes."""
+
+    def git(*args):
+        return subprocess.run(
+            ["git", *args], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+
+    try:
+        revision = git("rev-parse", "--short", "HEAD")
+        if git("status", "--porcelain", "--untracked-files=no"):
+            revision += "+dirty"
+        return revision
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def machine_fingerprint():
+    """Describe this machine, with a short ID that is stable across runs on it."""
+    machine = {
+        "system": platform.system(),
+        "release": platform.release(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+    encoded = json.dumps(machine, sort_keys=True).encode()
+    machine["id"] = hashlib.sha256(encoded).hexdigest()[:12]
+    return machine
+
+
+def make_record(results, source):
+    """Build a history record of benchmark results for this revision and machine.
+
+    `source` describes the input that was priced, so that runs on different data
+    can be told apart.
+    """
+    return {
+        "revision": git_revision(),
+        "machine": machine_fingerprint(),
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        "source": source,
+        "stages": {
+            stage: {"seconds": seconds, "rows": rows, "peak_rss": rss}
+            for stage, seconds, rows, rss in results
+        },
+    }
+
+
+def load_history(history_path):
+    """Return the list of saved benchmark records, oldest first."""
+    try:
+        with open(history_path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return []
+
+
+def save_record(history_path, record):
+    """Append a record to the history file, replacing the file atomically."""
+    history = load_history(history_path)
+    history.append(record)
+    os.makedirs(os.path.dirname(history_path) or ".", exist_ok=True)
+    temp_path = f"{history_path}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(history, file, indent=2)
+    os.replace(temp_path, history_path)
+
+
+def select_records(history, machine_id, baseline=None):
+    """Pick the (baseline, candidate) records to compare for one machine.
+
+    The candidate is the latest run on the machine. The baseline is the latest
+    earlier run whose revision starts with `baseline`, or simply the run before
+    the candidate if no revision is given.
+    """
+    runs = [record for record in history if record["machine"]["id"] == machine_id]
+    if len(runs) < 2:
+        raise ValueError("Need at least two saved runs on this machine to compare.")
+    candidate, earlier = runs[-1], runs[:-1]
+    if baseline is not None:
+        earlier = [r for r in earlier if r["revision"].startswith(baseline)]
+        if not earlier:
+            raise ValueError(f"No saved run of revision {baseline} on this machine.")
+    return earlier[-1], candidate
+
+
+def compare_records(baseline, candidate, threshold):
+    """Compare throughput stage by stage.
+
+    Returns a list of (stage, baseline rows/sec, candidate rows/sec, change,
+    regressed) tuples for every stage both runs recorded, so no stage the
+    baseline timed goes unwatched. A stage regresses when its throughput drops
+    by more than `threshold` (a fraction, e.g. 0.1 for 10%).
+    """
+
+    def rate(stage):
+        return stage["rows"] / stage["seconds"] if stage["seconds"] else float("inf")
+
+    comparison = []
+    for name, stage in candidate["stages"].items():
+        if name not in baseline["stages"]:
+            continue
+        before, after = rate(baseline["stages"][name]), rate(stage)
+        change = after / before - 1 if before else 0.0
+        regressed = change < -threshold
+        comparison.append((name, before, after, change, regressed))
+    return comparison
+
+
+def format_comparison(baseline, candidate, comparison):
+    """Format a comparison as a table of per-stage throughput changes."""
+    lines = [
+        f"baseline {baseline['revision']} ({baseline['recorded_at']}) -> "
+        f"candidate {candidate['revision']} ({candidate['recorded_at']})",
+    ]
+    if baseline["source"] != candidate["source"]:
+        lines.append(
+            f"warning: inputs differ ({baseline['source']} vs {candidate['source']})"
+        )
+    lines.append(f"{'stage':<12}{'baseline':>14}{'candidate':>14}{'change':>10}")
+    for name, before, after, change, regressed in comparison:
+        flag = "  REGRESSION" if regressed else ""
+        lines.append(f"{name:<12}{before:>14,.0f}{after:>14,.0f}{change:>+10.1%}{flag}")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    """Parse benchmark arguments."""
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic journeys and benchmark fare calculation."
+    )
+    parser.add_argument(
+        "--config-filepath",
+        type=str,
+        default="config.json",
+        help="Configuration file to generate journeys for and price them with.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Write a synthetic journey CSV.")
+    generate.add_argument("output", help="Path of the CSV file to write.")
+    run = commands.add_parser("run", help="Time each stage of pricing a journey CSV.")
+    run.add_argument(
+        "--filepath",
+        type=str,
+        default=None,
+        help="CSV file to price. Default generates a temporary one with --rows.",
+    )
+    run.add_argument(
+        "--save",
+        action="store_true",
+        help="Save the results, tagged with the git revision and machine, to the "
+        "history file.",
+    )
+    compare = commands.add_parser(
+        "compare",
+        help="Compare the latest saved run with a baseline and exit with status 1 "
+        "if a stage got slower.",
+    )
+    compare.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="Git revision of the baseline run. Default is the run before the latest.",
+    )
+    compare.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Largest tolerated drop in throughput, as a fraction. Default is 0.1.",
+    )
+    timestamps = commands.add_parser(
+        "timestamps",
+        help="Compare the fixed-format timestamp parser with strptime.",
+    )
+    timestamps.add_argument(
+        "--filepath",
+        type=str,
+        default=None,
+        help="CSV file whose timestamps to parse. Default generates them with --rows.",
+    )
+    for command in (run, compare):
+        command.add_argument(
+            "--history",
+            type=str,
+            default=DEFAULT_HISTORY,
+            help=f"Benchmark history file. Default is '{DEFAULT_HISTORY}'.",
+        )
+    for command in (generate, run, timestamps):
+        command.add_argument(
+            "--rows", type=int, default=100_000, help="Journeys to generate."
+        )
+        command.add_argument(
+            "--seed", type=int, default=0, help="Seed for the generated journeys."
+        )
+        command.add_argument(
+            "--days", type=int, default=28, help="Days the journeys are spread over."
+        )
+    for command in (generate, run):
+        command.add_argument(
+            "--cards",
+            type=int,
+            default=0,
+            help="Number of card IDs to generate. Default writes a single-card file.",
+        )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.disable(logging.CRITICAL + 1)
+
+    if args.command == "compare":
+        history = load_history(resolve_path(args.history))
+        try:
+            baseline, candidate = select_records(
+                history, machine_fingerprint()["id"], args.baseline
+            )
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            sys.exit(2)
+        comparison = compare_records(baseline, candidate, args.threshold)
+        print(format_comparison(baseline, candidate, comparison))
+        if any(result[-1] for result in comparison):
+            sys.exit(1)
+        return
+
+    config = ConfigLoader(resolve_path(args.config_filepath)).load_config()
+    if args.command == "generate":
+        write_journeys_csv(
+            resolve_path(args.output),
+            config,
+            args.rows,
+            args.seed,
+            args.cards,
+            args.days,
+        )
+        print(f"Wrote {args.rows} journeys to {args.output}.")
+        return
+
+    if args.command == "timestamps":
+        if args.filepath is None:
+            rows = generate_journeys(config, args.rows, args.seed, days=args.days)
+            date_times = [row[-1] for row in rows]
+        else:
+            with open(resolve_path(args.filepath), newline="") as file:
+                reader = csv.reader(file)
+                next(reader, None)
+                date_times = [row[-1] for row in reader]
+        print(format_speedup(benchmark_timestamps(date_times)))
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = source = args.filepath
+        if file_path is None:
+            source = (
+                f"generated rows={args.rows} seed={args.seed} cards={args.cards} "
+                f"days={args.days}"
+            )
+            file_path = os.path.join(temp_dir, "journeys.csv")
+            write_journeys_csv(
+                file_path, config, args.rows, args.seed, args.cards, args.days
+            )
+        results, total = run_benchmark(args.config_filepath, file_path)
+
+    print(format_results(results))
+    if args.save:
+        save_record(resolve_path(args.history), make_record(results, source))
+    if isinstance(total, dict):
+        print(f"Cards: {len(total)}")
+    else:
+        print(f"Total Fare: ${total}")
+
+
+if __name__ == "__main__":
+    main()
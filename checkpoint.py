@@ -0,0 +1,116 @@
+import copy
+import json
+import os
+from journey import format_timestamp
+
+CHECKPOINT_VERSION = 1
+
+
+class CheckpointError(ValueError):
+    """Raised when a checkpoint cannot be read or does not fit the input."""
+
+    pass
+
+
+class PricingState:
+    """Tracker state carried over from one run to the next.
+
+    Holds the `UserJourneyTracker` of every card priced so far and the time of the
+    latest journey, so a later run can price only new journeys and still apply
+    the daily and weekly caps accumulated before it.
+    """
+
+    def __init__(self, fare_rules, checkpoint=None):
+        self.fare_rules = fare_rules
+        self._checkpoint = checkpoint
+        self.reset()
+
+    def reset(self):
+        """Go back to the state the run started from, e.g. before pricing again."""
+        self.trackers = {}
+        self.last_timestamp = None
+        # Free-form, JSON-serializable details saved with the checkpoint
+        self.metadata = {}
+        if self._checkpoint is not None:
+            self._restore(self._checkpoint)
+
+    def _restore(self, checkpoint):
+        if checkpoint.get("version") != CHECKPOINT_VERSION:
+            raise CheckpointError(
+                f"Unsupported checkpoint version: {checkpoint.get('version')}"
+            )
+        line_pairs = self.fare_rules.line_pairs
+        self.last_timestamp = checkpoint["last_timestamp"]
+        self.metadata = copy.deepcopy(checkpoint.get("metadata", {}))
+        for card in checkpoint["cards"]:
+            fares = {}
+            for key, pair_fares in card["fares"].items():
+                pair_id = line_pairs.lookup(*key.split(",", 1))
+                if pair_id is None:
+                    raise CheckpointError(
+                        f"Checkpoint line pair {key} is not in the fare chart."
+                    )
+                fares[pair_id] = pair_fares
+            tracker = self.fare_rules.new_tracker()
+            tracker.set_state(card["week_start_day"], fares)
+            self.trackers[card["card_id"]] = tracker
+
+    def to_checkpoint(self):
+        """Return the state as a JSON-serializable checkpoint."""
+        pair_keys = self.fare_rules.line_pairs.keys
+        cards = []
+        for card_id, tracker in self.trackers.items():
+            week_start_day, fares = tracker.get_state()
+            cards.append(
+                {
+                    "card_id": card_id,
+                    "week_start_day": week_start_day,
+                    "fares": {
+                        pair_keys[pair_id]: pair_fares
+                        for pair_id, pair_fares in fares.items()
+                    },
+                }
+            )
+        return {
+            "version": CHECKPOINT_VERSION,
+            "last_timestamp": self.last_timestamp,
+            "metadata": self.metadata,
+            "cards": cards,
+        }
+
+    def resume(self, journeys):
+        """Pass time-ordered journeys through, recording the latest one.
+
+        Raises `CheckpointError` if the first journey is earlier than the last
+        one priced before, since the caps could no longer be applied correctly.
+        """
+        journeys = iter(journeys)
+        journey = next(journeys, None)
+        if journey is None:
+            return
+        if self.last_timestamp is not None and journey.timestamp < self.last_timestamp:
+            raise CheckpointError(
+                f"Journey at {journey.date_time} is earlier than the last journey "
+                f"in the checkpoint at {format_timestamp(self.last_timestamp)}."
+            )
+        yield journey
+        for journey in journeys:
+            yield journey
+        self.last_timestamp = journey.timestamp
+
+    @classmethod
+    def load(cls, fare_rules, file_path):
+        """Load the state saved to `file_path` by `save`."""
+        try:
+            with open(file_path) as file:
+                checkpoint = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            raise CheckpointError(f"Cannot read checkpoint {file_path}: {e}")
+        return cls(fare_rules, checkpoint)
+
+    def save(self, file_path):
+        """Write the state to `file_path`, replacing it atomically."""
+        temp_path = f"{file_path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self.to_checkpoint(), file, separators=(",", ":"))
+        os.replace(temp_path, file_path)
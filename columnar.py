@@ -0,0 +1,236 @@
+import argparse
+import json
+import logging
+import os
+import struct
+import sys
+from array import array
+from operator import attrgetter
+from compression import open_input
+from config_loader import ConfigLoader
+from fare_system import FareRules
+from journey import Journey
+from settings import BASE_DIR
+from utils import resolve_path
+
+COLUMNAR_MAGIC = b"FAREJRNY"
+COLUMNAR_VERSION = 1
+# Header length in bytes, stored after the magic
+_HEADER_LENGTH = struct.Struct("<I")
+# Columns start on a multiple of this, so they can be mapped as aligned arrays
+_ALIGNMENT = 8
+# Array type codes of the timestamp, pair code and card code columns
+_TIMESTAMP, _PAIR_CODE, _CARD_CODE = "q", "H", "I"
+
+
+class JourneyColumns:
+    """Time-ordered journeys held as dictionary-encoded column arrays.
+
+    `timestamps` are seconds since the epoch. `pair_codes` and `card_codes`
+    index `pair_ids` (`LinePairIndex` IDs) and `cards` (card IDs); without card
+    IDs both `card_codes` and `cards` are None. Iterating yields `Journey`s.
+    """
+
+    def __init__(self, timestamps, pair_codes, pair_ids, card_codes=None, cards=None):
+        self.timestamps = timestamps
+        self.pair_codes = pair_codes
+        self.pair_ids = pair_ids
+        self.card_codes = card_codes
+        self.cards = cards
+
+    @classmethod
+    def from_journeys(cls, journeys):
+        """Sort journeys by time and encode them as columns."""
+        journeys = sorted(journeys, key=attrgetter("timestamp"))
+        has_card_id = bool(journeys) and journeys[0].card_id is not None
+
+        pair_codes, card_codes = {}, {}
+        timestamps = array(_TIMESTAMP)
+        pair_column = array(_PAIR_CODE)
+        card_column = array(_CARD_CODE) if has_card_id else None
+        try:
+            for journey in journeys:
+                timestamps.append(journey.timestamp)
+                pair_code = pair_codes.setdefault(journey.pair_id, len(pair_codes))
+                pair_column.append(pair_code)
+                if has_card_id:
+                    card_code = card_codes.setdefault(journey.card_id, len(card_codes))
+                    card_column.append(card_code)
+        except OverflowError:
+            raise ValueError("Too many distinct line pairs or cards to store.")
+        cards = list(card_codes) if has_card_id else None
+        return cls(timestamps, pair_column, list(pair_codes), card_column, cards)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __iter__(self):
+        pair_ids = self.pair_ids
+        if self.card_codes is None:
+            for timestamp, pair_code in zip(self.timestamps, self.pair_codes):
+                yield Journey(pair_ids[pair_code], timestamp)
+        else:
+            cards = self.cards
+            for timestamp, pair_code, card_code in zip(
+                self.timestamps, self.pair_codes, self.card_codes
+            ):
+                yield Journey(pair_ids[pair_code], timestamp, cards[card_code])
+
+
+def is_columnar(file_path):
+    """Return whether `file_path` is a journey file written by `write_columns`."""
+    try:
+        with open_input(file_path) as file:
+            return file.read(len(COLUMNAR_MAGIC)) == COLUMNAR_MAGIC
+    except (OSError, EOFError):  # left for the CSV reader to report
+        return False
+
+
+def _column_bytes(column):
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    data = column.tobytes()
+    return data + bytes(-len(data) % _ALIGNMENT)
+
+
+def write_columns(file_path, journeys, line_pairs):
+    """Write journeys to `file_path` in the columnar format, in time order.
+
+    The file holds a magic string, a JSON header naming the line pairs and
+    card IDs used, then little-endian columns: int64 timestamps, uint16 pair
+    codes and, if the journeys have card IDs, uint32 card codes. Pairs are
+    stored by name, so the file can be priced with any configuration that has
+    them. Returns the number of journeys written.
+    """
+    columns = JourneyColumns.from_journeys(journeys)
+    has_card_id = columns.cards is not None
+
+    header = {
+        "version": COLUMNAR_VERSION,
+        "rows": len(columns),
+        "pairs": [line_pairs.keys[pair_id] for pair_id in columns.pair_ids],
+        "cards": columns.cards,
+    }
+    header = json.dumps(header, separators=(",", ":")).encode()
+    prefix_length = len(COLUMNAR_MAGIC) + _HEADER_LENGTH.size
+    header += b" " * (-(prefix_length + len(header)) % _ALIGNMENT)
+
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(COLUMNAR_MAGIC)
+        file.write(_HEADER_LENGTH.pack(len(header)))
+        file.write(header)
+        file.write(_column_bytes(columns.timestamps))
+        file.write(_column_bytes(columns.pair_codes))
+        if has_card_id:
+            file.write(_column_bytes(columns.card_codes))
+    os.replace(temp_path, file_path)
+    return len(columns)
+
+
+def _read_column(data, offset, typecode, rows):
+    column = array(typecode)
+    end = offset + rows * column.itemsize
+    column.frombytes(data[offset:end])
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column, end + -end % _ALIGNMENT
+
+
+def read_columns(file_path, line_pairs, decompression=None, batch=None):
+    """Load a file written by `write_columns` as `JourneyColumns`.
+
+    The columns are read straight into arrays, without parsing any text. Line
+    pairs are resolved against `line_pairs`, raising `ValueError` for a pair
+    that is not in the fare chart. A compressed file is decompressed first,
+    adding the time spent to `decompression`. With `batch` True the file must
+    have card IDs, with False it must not, like the header of a journey CSV.
+    """
+    logging.info(f"Attempting to read columnar journeys from {file_path}.")
+    with open_input(file_path, stats=decompression) as file:
+        data = memoryview(file.read())
+
+    offset = len(COLUMNAR_MAGIC)
+    if data[:offset] != COLUMNAR_MAGIC:
+        raise ValueError(f"{file_path} is not a columnar journey file.")
+    (header_length,) = _HEADER_LENGTH.unpack_from(data, offset)
+    offset += _HEADER_LENGTH.size
+    header = json.loads(bytes(data[offset : offset + header_length]))
+    offset += header_length
+    if header.get("version") != COLUMNAR_VERSION:
+        raise ValueError(f"Unsupported columnar file version: {header.get('version')}")
+    has_card_id = header["cards"] is not None
+    if batch is not None and batch != has_card_id:
+        raise ValueError(
+            f"{file_path} {'has' if has_card_id else 'has no'} card IDs; "
+            f"it cannot be priced {'without' if has_card_id else 'as'} a batch."
+        )
+
+    pair_ids = []
+    for key in header["pairs"]:
+        from_line, _, to_line = key.partition(",")
+        pair_id = line_pairs.lookup(from_line, to_line)
+        if pair_id is None:
+            raise ValueError(f"Invalid journey combination: {from_line} to {to_line}")
+        pair_ids.append(pair_id)
+
+    rows = header["rows"]
+    timestamps, offset = _read_column(data, offset, _TIMESTAMP, rows)
+    pair_codes, offset = _read_column(data, offset, _PAIR_CODE, rows)
+    card_codes = cards = None
+    if has_card_id:
+        card_codes, offset = _read_column(data, offset, _CARD_CODE, rows)
+        cards = [sys.intern(card_id) for card_id in header["cards"]]
+    if len(timestamps) != rows or len(pair_codes) != rows:
+        raise ValueError(f"{file_path} is truncated.")
+    logging.info(f"Successfully read {rows} journeys from {file_path}.")
+    return JourneyColumns(timestamps, pair_codes, pair_ids, card_codes, cards)
+
+
+def parse_args(argv=None):
+    """Parse columnar file arguments."""
+    parser = argparse.ArgumentParser(
+        description="Convert journey CSVs to the columnar journey format."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser(
+        "convert", help="Validate a journey CSV and write it as a columnar file."
+    )
+    convert.add_argument("input", help="Journey CSV to convert.")
+    convert.add_argument("output", help="Path of the columnar file to write.")
+    convert.add_argument(
+        "--config-filepath",
+        type=str,
+        default=os.path.join(BASE_DIR, "config.json"),
+        help="Configuration to validate the journeys' line pairs against.",
+    )
+    convert.add_argument(
+        "--reader",
+        type=str,
+        default="csv",
+        choices=["csv", "mmap"],
+        help="CSV reader to use, see main.py --reader.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    # Imported here since main reads columnar files through this module
+    from main import read_csv
+
+    args = parse_args(argv)
+    logging.disable(logging.CRITICAL + 1)
+    try:
+        config = ConfigLoader(resolve_path(args.config_filepath)).load_config()
+        line_pairs = FareRules(config).line_pairs
+        journeys = read_csv(args.input, line_pairs, reader=args.reader)
+        rows = write_columns(resolve_path(args.output), journeys, line_pairs)
+    except Exception as e:
+        print(f"An error occurred: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Wrote {rows} journeys to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
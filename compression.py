@@ -0,0 +1,88 @@
+import bz2
+import gzip
+import io
+import lzma
+import time
+from utils import resolve_path
+
+# Leading bytes of each supported compressed format, and the opener for it
+COMPRESSION_FORMATS = {
+    "gzip": (b"\x1f\x8b", gzip.open),
+    "bz2": (b"BZh", bz2.open),
+    "xz": (b"\xfd7zXZ\x00", lzma.open),
+}
+# Size of the reads from the decompressor
+READ_BUFFER = 1024 * 1024
+
+
+class DecompressionStats:
+    """Bytes decompressed from an input file and the time spent doing it."""
+
+    __slots__ = ("format", "decompressed_bytes", "wall", "cpu")
+
+    def __init__(self):
+        self.format = None
+        self.reset()
+
+    def reset(self):
+        self.decompressed_bytes = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+
+
+class _TimedReader(io.RawIOBase):
+    """Raw reader over a decompressing file that adds up the time spent in it."""
+
+    def __init__(self, file, stats):
+        self._file = file
+        self._stats = stats
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        stats = self._stats
+        wall_started = time.perf_counter()
+        cpu_started = time.process_time()
+        count = self._file.readinto(buffer)
+        stats.wall += time.perf_counter() - wall_started
+        stats.cpu += time.process_time() - cpu_started
+        stats.decompressed_bytes += count
+        return count
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def detect_compression(file_path):
+    """Return the name of the format `file_path` is compressed with, or None."""
+    with open(resolve_path(file_path), "rb") as file:
+        start = file.read(8)
+    for name, (magic, _) in COMPRESSION_FORMATS.items():
+        if start.startswith(magic):
+            return name
+    return None
+
+
+def open_input(file_path, text=False, stats=None):
+    """Open an input file for reading, decompressing it if it is compressed.
+
+    Compression is detected from the file's leading bytes, whatever its name,
+    and the file is decompressed as it is read, in `READ_BUFFER` sized reads.
+    Time spent decompressing is added to `stats`, a `DecompressionStats`, if
+    given. Returns a binary file, or a text file with `text`.
+    """
+    file_path = resolve_path(file_path)
+    compression = detect_compression(file_path)
+    if compression is None:
+        file = open(file_path, "rb", buffering=READ_BUFFER)
+    else:
+        if stats is None:
+            stats = DecompressionStats()
+        stats.format = compression
+        opener = COMPRESSION_FORMATS[compression][1]
+        file = io.BufferedReader(
+            _TimedReader(opener(file_path, "rb"), stats), READ_BUFFER
+        )
+    return io.TextIOWrapper(file) if text else file
@@ -1,9 +1,16 @@
+import hashlib
 import json
 import logging
+import os
+import pickle
 from datetime import datetime
 from constants import TIME_FORMAT
+from fare_system import FareRules
 from utils import resolve_path
 
+# Bump whenever the pickled layout of `FareRules` changes, so old caches are ignored
+COMPILED_CACHE_VERSION = 1
+
 
 class ConfigError(Exception):
     """Base class for all configuration-related exceptions."""
@@ -42,14 +49,70 @@ class ConfigLoader:
         logging.info("Configuration successfully loaded and validated.")
         return config
 
+    def load_compiled(self, cache_dir):
+        """Load the configuration compiled into `FareRules`, through a cache.
+
+        Compiled rules are pickled into `cache_dir` under the SHA-256 of the
+        config file's content. When a cache file for the current content exists
+        it is loaded with a single read, skipping validation and compilation;
+        otherwise the configuration is loaded as usual and the cache written.
+        """
+        raw_config = self._read_config_bytes()
+        digest = hashlib.sha256(raw_config).hexdigest()
+        cache_path = os.path.join(
+            cache_dir, f"config_v{COMPILED_CACHE_VERSION}_{digest}.pickle"
+        )
+
+        try:
+            with open(cache_path, "rb") as f:
+                fare_rules = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            # A damaged cache file can fail to unpickle in almost any way
+            logging.warning(f"Ignoring unreadable config cache {cache_path}: {e}")
+        else:
+            if isinstance(fare_rules, FareRules):
+                logging.info(f"Loaded compiled configuration from {cache_path}.")
+                return fare_rules
+            logging.warning(
+                f"Ignoring config cache {cache_path}: it holds a "
+                f"{type(fare_rules).__name__}, not compiled fare rules."
+            )
+
+        logging.info(f"Loading configuration from {self.config_path}.")
+        config = self._parse_config(raw_config)
+        self._validate_config(config)
+        fare_rules = FareRules(config)
+        logging.info("Configuration successfully loaded, validated and compiled.")
+
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                pickle.dump(fare_rules, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            logging.warning(f"Could not write config cache {cache_path}: {e}")
+        return fare_rules
+
     def _read_config_from_file(self):
         """Read the configuration from a JSON file."""
+        return self._parse_config(self._read_config_bytes())
+
+    def _read_config_bytes(self):
+        """Read the raw content of the configuration file."""
         try:
-            with open(self.config_path, "r") as f:
-                return json.load(f)
+            with open(self.config_path, "rb") as f:
+                return f.read()
         except FileNotFoundError:
             logging.exception(f"Config file {self.config_path} not found.")
             raise ConfigError("Configuration file is missing.")
+
+    def _parse_config(self, raw_config):
+        """Decode the configuration from the raw JSON content."""
+        try:
+            return json.loads(raw_config)
         except json.JSONDecodeError:
             logging.exception(
                 "Error decoding config file. Please check the file format."
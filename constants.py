@@ -1,3 +1,14 @@
 DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
 TIME_FORMAT = "%H:%M"
 LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+DAYS_OF_WEEK = (
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+)
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = len(DAYS_OF_WEEK) * MINUTES_PER_DAY
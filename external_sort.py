@@ -0,0 +1,87 @@
+import heapq
+import logging
+import struct
+import tempfile
+from operator import attrgetter, itemgetter
+from journey import Journey
+
+# Approximate memory held by one Journey and its list slot, used to turn a
+# memory budget into the number of journeys sorted in memory per run.
+JOURNEY_MEMORY_ESTIMATE = 200
+
+# Spilled journeys are stored as (timestamp, line pair ID, card number).
+_RECORD = struct.Struct("<qII")
+_READ_CHUNK_RECORDS = 4096
+
+
+def run_size_for_memory(max_memory):
+    """Return how many journeys fit in one in-memory run under `max_memory` bytes."""
+    return max(1, max_memory // JOURNEY_MEMORY_ESTIMATE)
+
+
+def _read_run(run_file):
+    """Yield the spilled records of one sorted run, a chunk at a time."""
+    run_file.seek(0)
+    chunk_size = _RECORD.size * _READ_CHUNK_RECORDS
+    while True:
+        chunk = run_file.read(chunk_size)
+        if not chunk:
+            return
+        yield from _RECORD.iter_unpack(chunk)
+
+
+def external_sort(journeys, run_size, temp_dir=None):
+    """Yield journeys in time order, spilling sorted runs to disk as needed.
+
+    At most `run_size` journeys are held in memory at once. Each full run is
+    sorted and written to a temporary file as fixed-size binary records, and the
+    runs are then k-way merged back. Journeys sharing a timestamp keep their
+    input order, exactly as with an in-memory `sort`.
+    """
+    card_ids = {None: 0}
+    cards = [None]
+    run_files = []
+    run = []
+
+    def spill():
+        run.sort(key=attrgetter("timestamp"))
+        run_file = tempfile.TemporaryFile(dir=temp_dir)
+        for journey in run:
+            if journey.card_id not in card_ids:
+                card_ids[journey.card_id] = len(cards)
+                cards.append(journey.card_id)
+        run_file.write(
+            b"".join(
+                _RECORD.pack(
+                    journey.timestamp, journey.pair_id, card_ids[journey.card_id]
+                )
+                for journey in run
+            )
+        )
+        run_files.append(run_file)
+        run.clear()
+
+    try:
+        for journey in journeys:
+            run.append(journey)
+            if len(run) >= run_size:
+                spill()
+
+        if not run_files:
+            # Everything fit in a single run, no need to touch the disk
+            run.sort(key=attrgetter("timestamp"))
+            yield from run
+            return
+
+        if run:
+            spill()
+        logging.info(
+            f"Merging {len(run_files)} sorted runs of up to {run_size} journeys."
+        )
+
+        merged = heapq.merge(*map(_read_run, run_files), key=itemgetter(0))
+        for timestamp, pair_id, card_number in merged:
+            yield Journey(pair_id, timestamp, cards[card_number])
+    finally:
+        for run_file in run_files:
+            run_file.close()
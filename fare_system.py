@@ -1,7 +1,11 @@
 import logging
-from collections import defaultdict
-from datetime import datetime, timedelta
-from constants import DATE_FORMAT, TIME_FORMAT
+from datetime import datetime
+from constants import (
+    DAYS_OF_WEEK,
+    MINUTES_PER_DAY,
+    MINUTES_PER_WEEK,
+    TIME_FORMAT,
+)
 
 
 # Setting up logging for the module
@@ -9,23 +13,63 @@ logger = logging.getLogger(__name__)
 
 
 class PeakHoursChecker:
-    """Check if a given datetime is during peak hours."""
+    """Check if a given minute of the week is during peak hours."""
 
     def __init__(self, peak_hours_config):
         self.peak_hours = peak_hours_config
-
-    def is_peak(self, date_time):
-        dt_obj = datetime.strptime(date_time, DATE_FORMAT)
-        weekday = dt_obj.strftime("%A").lower()
-        time_periods = self.peak_hours.get(weekday, [])
-
-        for start, end in time_periods:
-            if start <= dt_obj.strftime(TIME_FORMAT) <= end:
-                logger.debug(f"{date_time} falls under peak hours.")
-                return True
-
-        logger.debug(f"{date_time} does not fall under peak hours.")
-        return False
+        self._peak_minutes = self._compile_peak_minutes(peak_hours_config)
+
+    @staticmethod
+    def _compile_peak_minutes(peak_hours_config):
+        """Flatten the configured time windows into one flag per minute of the week."""
+        table = bytearray(MINUTES_PER_WEEK)
+        for day_index, day in enumerate(DAYS_OF_WEEK):
+            day_offset = day_index * MINUTES_PER_DAY
+            for start, end in peak_hours_config.get(day, []):
+                start_time = datetime.strptime(start, TIME_FORMAT)
+                end_time = datetime.strptime(end, TIME_FORMAT)
+                first = day_offset + start_time.hour * 60 + start_time.minute
+                last = day_offset + end_time.hour * 60 + end_time.minute
+                # Windows include their end minute, e.g. 19:00:59 is still peak
+                table[first : last + 1] = b"\x01" * (last - first + 1)
+        return bytes(table)
+
+    @property
+    def peak_minutes(self):
+        """One byte per minute of the week, set to 1 where that minute is peak."""
+        return self._peak_minutes
+
+    def is_peak(self, minute_of_week):
+        return self._peak_minutes[minute_of_week] == 1
+
+
+class LinePairIndex:
+    """Assign dense integer IDs to the line-to-line combinations of a chart.
+
+    IDs follow the sorted order of the `"from,to"` chart keys, so every table
+    compiled from the same configuration agrees on them.
+    """
+
+    def __init__(self, combinations):
+        self.keys = sorted(combinations)
+        self._ids = {
+            tuple(key.split(",", 1)): pair_id for pair_id, key in enumerate(self.keys)
+        }
+        # Raw CSV spellings seen so far, so each is only case folded once
+        self._raw_ids = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, from_line, to_line):
+        """Return the ID for raw line names, or None if the combination is unknown."""
+        raw_pair = (from_line, to_line)
+        pair_id = self._raw_ids.get(raw_pair)
+        if pair_id is None:
+            pair_id = self._ids.get((from_line.lower(), to_line.lower()))
+            if pair_id is not None:
+                self._raw_ids[raw_pair] = pair_id
+        return pair_id
 
 
 class FareCalculator:
@@ -33,121 +77,149 @@ class FareCalculator:
 
     def __init__(self, peak_hours_checker, fare_chart_config):
         self.peak_hours_checker = peak_hours_checker
-        self._fare_chart = fare_chart_config
-
-    def get_base_fare(self, from_line, to_line, date_time):
-        line_key = f"{from_line},{to_line}"
-        fare_type = "peak" if self.peak_hours_checker.is_peak(date_time) else "non_peak"
-        fare_value = self._fare_chart[line_key][fare_type]
-        logger.debug(
-            f"Base fare from {from_line} to {to_line} during {fare_type} time: ${fare_value}."
-        )
-        return fare_value
+        # (non-peak, peak) fares per pair ID, indexed by the result of `is_peak`
+        self.fares = [
+            (fare_chart_config[key]["non_peak"], fare_chart_config[key]["peak"])
+            for key in sorted(fare_chart_config)
+        ]
+
+    def get_base_fare(self, journey):
+        is_peak = self.peak_hours_checker.is_peak(journey.minute_of_week)
+        return self.fares[journey.pair_id][is_peak]
 
 
 class FareCap:
     """Handle fare caps based on daily and weekly limits."""
 
     def __init__(self, cap_chart_config):
-        self._cap_chart = cap_chart_config
+        pair_keys = sorted(cap_chart_config)
+        self.daily_caps = [cap_chart_config[key]["daily"] for key in pair_keys]
+        self.weekly_caps = [cap_chart_config[key]["weekly"] for key in pair_keys]
 
-    def apply_daily_cap(self, from_line, to_line, accumulated_daily_fare):
-        cap = self._cap_chart[f"{from_line},{to_line}"]["daily"]
-        logger.debug(f"Applying daily cap of ${cap} for {from_line} to {to_line}.")
-        return min(accumulated_daily_fare, cap)
+    def apply_daily_cap(self, pair_id, accumulated_daily_fare):
+        return min(accumulated_daily_fare, self.daily_caps[pair_id])
 
-    def apply_weekly_cap(self, from_line, to_line, accumulated_weekly_fare):
-        cap = self._cap_chart[f"{from_line},{to_line}"]["weekly"]
-        logger.debug(f"Applying weekly cap of ${cap} for {from_line} to {to_line}.")
-        return min(accumulated_weekly_fare, cap)
+    def apply_weekly_cap(self, pair_id, accumulated_weekly_fare):
+        return min(accumulated_weekly_fare, self.weekly_caps[pair_id])
 
 
 class UserJourneyTracker:
-    """Track user journeys and calculate fares."""
-
-    def __init__(self, fare_calculator, fare_cap):
-        self.fare_calculator = fare_calculator
-        self.fare_cap = fare_cap
-        self._daily_fares = defaultdict(int)
-        self._weekly_fares = defaultdict(int)
-        self._last_journey_date = None
-        self._week_start_date = None
+    """Track user journeys and calculate fares.
 
-    def _reset_daily_fares(self):
-        for key in self._daily_fares:
-            self._daily_fares[key] = 0
+    If a `trace` sink such as `JourneyTraceWriter` is given, every priced journey
+    is recorded to it; without one, tracing costs a single `is None` check.
+    """
 
-    def _reset_weekly_fares(self):
-        for key in self._weekly_fares:
-            self._weekly_fares[key] = 0
+    __slots__ = ("fare_calculator", "fare_cap", "trace", "_fares", "_week_start_day")
 
-    def _reset_fares_if_needed(self, current_date):
+    def __init__(self, fare_calculator, fare_cap, trace=None):
+        self.fare_calculator = fare_calculator
+        self.fare_cap = fare_cap
+        self.trace = trace
+        # Per line pair: [day of its last journey, daily fare, weekly fare]. The
+        # day stamp tells whether the amounts still belong to the current day and
+        # week, so nothing has to be reset when either rolls over.
+        self._fares = {}
+        self._week_start_day = None
+
+    def get_state(self):
+        """Return the fare week start and the accumulated fares that still count.
+
+        Fares are returned as a dict of pair ID to [day of last journey, daily
+        fare, weekly fare], leaving out pairs not used since the week started.
+        """
+        if self._week_start_day is None:
+            return None, {}
+        fares = {
+            pair_id: list(pair_fares)
+            for pair_id, pair_fares in self._fares.items()
+            if pair_fares[0] >= self._week_start_day
+        }
+        return self._week_start_day, fares
+
+    def set_state(self, week_start_day, fares):
+        """Continue from a state returned by `get_state`."""
+        self._week_start_day = week_start_day
+        self._fares = {
+            pair_id: list(pair_fares) for pair_id, pair_fares in fares.items()
+        }
+
+    def _update_week(self, current_day):
         # Check if a new week has started
-        if self._week_start_date is None or (
-            current_date - self._week_start_date
-        ) >= timedelta(days=7):
-            logger.debug(
-                f"Resetting fares for the week starting {self._week_start_date}."
-            )
-            self._reset_weekly_fares()
-            self._week_start_date = current_date
+        if self._week_start_day is None or current_day - self._week_start_day >= 7:
+            logger.debug(f"Starting a new fare week on day {current_day}.")
+            self._week_start_day = current_day
 
-        # Check if a new day has begun
-        if (
-            self._last_journey_date is not None
-            and self._last_journey_date != current_date
-        ):
-            logger.debug(f"Resetting daily fares for {self._last_journey_date}.")
-            self._reset_daily_fares()
-
-        self._last_journey_date = current_date
-
-    def add_journey(self, from_line, to_line, date_time):
-        logger.debug(f"=================================== Start Add New Journey Entry")
-        journey_date = datetime.strptime(date_time, DATE_FORMAT).date()
-        self._reset_fares_if_needed(journey_date)
+    def add_journey(self, journey):
+        pair_id = journey.pair_id
+        current_day = journey.day
+        self._update_week(current_day)
 
         # Calculate base fare
-        base_fare = self.fare_calculator.get_base_fare(from_line, to_line, date_time)
-
-        # Calculate accumulated fares with the current journey
-        logger.debug(
-            f"Prev accumulated daily fare for journey from {from_line} to {to_line} is ${self._daily_fares[(from_line, to_line)]}."
-        )
-        logger.debug(
-            f"Prev accumulated weekly fare for journey from {from_line} to {to_line} is ${self._weekly_fares[(from_line, to_line)]}."
-        )
-        accumulated_daily_fare = self._daily_fares[(from_line, to_line)] + base_fare
-        accumulated_weekly_fare = self._weekly_fares[(from_line, to_line)] + base_fare
+        base_fare = self.fare_calculator.get_base_fare(journey)
+
+        # Accumulated fares from earlier journeys, ignoring any from a past day/week
+        fares = self._fares.get(pair_id)
+        if fares is None:
+            fares = self._fares[pair_id] = [current_day, 0, 0]
+        last_day, daily_fare, weekly_fare = fares
+        if last_day != current_day:
+            daily_fare = 0
+            if last_day < self._week_start_day:
+                weekly_fare = 0
 
         # Apply caps
         capped_daily_fare = self.fare_cap.apply_daily_cap(
-            from_line, to_line, accumulated_daily_fare
+            pair_id, daily_fare + base_fare
         )
         capped_weekly_fare = self.fare_cap.apply_weekly_cap(
-            from_line, to_line, accumulated_weekly_fare
+            pair_id, weekly_fare + base_fare
         )
 
         # Determine the fare to charge for this journey
         fare_to_charge = min(
             base_fare,
-            capped_daily_fare - self._daily_fares[(from_line, to_line)],
-            capped_weekly_fare - self._weekly_fares[(from_line, to_line)],
+            capped_daily_fare - daily_fare,
+            capped_weekly_fare - weekly_fare,
         )
 
         # Update accumulated fares
-        self._daily_fares[(from_line, to_line)] += fare_to_charge
-        self._weekly_fares[(from_line, to_line)] += fare_to_charge
+        fares[0] = current_day
+        fares[1] = daily_fare + fare_to_charge
+        fares[2] = weekly_fare + fare_to_charge
 
-        logger.debug(
-            f"Accumulated daily fare for journey from {from_line} to {to_line} is ${self._daily_fares[(from_line, to_line)]}."
-        )
-        logger.debug(
-            f"Accumulated weekly fare for journey from {from_line} to {to_line} is ${self._weekly_fares[(from_line, to_line)]}."
-        )
-        logger.debug(
-            f"Fare to charge for journey from {from_line} to {to_line} is ${fare_to_charge}."
-        )
-        logger.debug(f"=================================== Finish New Journey Entry")
+        if self.trace is not None:
+            is_peak = self.fare_calculator.peak_hours_checker.is_peak(
+                journey.minute_of_week
+            )
+            self.trace.record(
+                journey, is_peak, base_fare, daily_fare, weekly_fare, fare_to_charge
+            )
 
         return fare_to_charge
+
+
+class FareRules:
+    """The pricing components compiled from one configuration.
+
+    These hold no per-rider state, so a single instance can price any number of
+    cards, each with its own `UserJourneyTracker`.
+    """
+
+    def __init__(self, config):
+        self.line_pairs = LinePairIndex(config["fare_chart"])
+        self.peak_hours_checker = PeakHoursChecker(config["peak_hours"])
+        self.fare_calculator = FareCalculator(
+            self.peak_hours_checker, config["fare_chart"]
+        )
+        self.fare_cap = FareCap(config["cap_chart"])
+
+    @classmethod
+    def compile(cls, config):
+        """Compile a configuration, or return it as is if it is already compiled."""
+        if isinstance(config, cls):
+            return config
+        return cls(config)
+
+    def new_tracker(self, trace=None):
+        return UserJourneyTracker(self.fare_calculator, self.fare_cap, trace)
@@ -0,0 +1,154 @@
+import csv
+import logging
+import os
+import sys
+import time
+from journey import JourneyOrderError, check_header, validate_csv_data
+
+POLL_INTERVAL = 1.0
+# Most bytes parsed per poll, so a long backlog is priced in bounded batches
+READ_SIZE = 8 * 1024 * 1024
+
+
+def _read_header(file_path, batch=None):
+    """Return if a journey CSV has card IDs and the offset of the line after its
+    header, or (None, 0) while the header is not complete yet."""
+    with open(file_path, "rb") as file:
+        line = file.readline()
+    if not line.endswith(b"\n"):
+        return None, 0
+    header = next(csv.reader([line.decode()]), None)
+    return check_header(header, batch), len(line)
+
+
+def follow_journeys(
+    file_path,
+    line_pairs,
+    offset=0,
+    poll_interval=POLL_INTERVAL,
+    idle_timeout=None,
+    batch=None,
+):
+    """Yield batches of journeys appended to a CSV file, as they are written.
+
+    The file is polled every `poll_interval` seconds from byte `offset`, and
+    only complete lines are parsed, so a row that is still being written is
+    picked up on a later poll. Each batch is a list of (journey, offset after its
+    line) pairs. Stops after `idle_timeout` seconds without new rows, if given.
+    `batch` says whether the file must have card IDs, see `main.iter_csv`.
+    """
+    has_card_id = None
+    idle_since = time.monotonic()
+    while True:
+        if has_card_id is None:
+            has_card_id, data_offset = _read_header(file_path, batch)
+            offset = max(offset, data_offset)
+        appended = []
+        if has_card_id is not None:
+            with open(file_path, "rb") as file:
+                if os.fstat(file.fileno()).st_size < offset:
+                    raise ValueError(
+                        f"{file_path} is shorter than the offset {offset}; it was "
+                        "truncated or replaced."
+                    )
+                file.seek(offset)
+                data = file.read(READ_SIZE)
+            lines = data[: data.rfind(b"\n") + 1].splitlines(keepends=True)
+            rows = csv.reader(line.decode() for line in lines)
+            for line, row in zip(lines, rows):
+                offset += len(line)
+                if not row:
+                    continue
+                if has_card_id:
+                    card_id, *row = row
+                    journey = validate_csv_data(row, line_pairs, card_id)
+                else:
+                    journey = validate_csv_data(row, line_pairs)
+                appended.append((journey, offset))
+
+        if appended:
+            idle_since = time.monotonic()
+            yield appended
+        elif idle_timeout is not None and time.monotonic() - idle_since > idle_timeout:
+            return
+        else:
+            time.sleep(poll_interval)
+
+
+def follow_and_price(
+    state,
+    file_path,
+    checkpoint_to=None,
+    poll_interval=POLL_INTERVAL,
+    idle_timeout=None,
+    out=sys.stdout,
+    batch=None,
+):
+    """Price journeys as they are appended to `file_path`, printing each charge.
+
+    Pricing continues from `state`, a `PricingState`, and from the offset saved
+    in it for this file. After every batch the state, the offset and the running
+    totals are saved to `checkpoint_to`, so a restart neither skips nor re-prices
+    a row. Journeys must be appended in time order. Returns the total fare.
+    `batch` says whether the file must have card IDs, see `main.iter_csv`.
+    """
+    file_path = os.path.abspath(file_path)
+    followed = state.metadata.get("follow", {})
+    if followed.get("file") == file_path:
+        offset = followed["offset"]
+        total_fare = followed["total_fare"]
+        card_totals = {card_id: total for card_id, total in followed["card_totals"]}
+    else:
+        offset, total_fare, card_totals = 0, 0, {}
+    logging.info(f"Following {file_path} from byte {offset}.")
+
+    line_pairs = state.fare_rules.line_pairs
+    saved_offset = offset
+
+    def save():
+        state.metadata["follow"] = {
+            "file": file_path,
+            "offset": offset,
+            "total_fare": total_fare,
+            "card_totals": list(card_totals.items()),
+        }
+        if checkpoint_to:
+            state.save(checkpoint_to)
+
+    try:
+        for appended in follow_journeys(
+            file_path, line_pairs, offset, poll_interval, idle_timeout, batch
+        ):
+            for journey, end_offset in appended:
+                last_timestamp = state.last_timestamp
+                if last_timestamp is not None and journey.timestamp < last_timestamp:
+                    raise JourneyOrderError(
+                        f"Journey at {journey.date_time} is earlier than the journey "
+                        "before it; appended rows must be in time order."
+                    )
+                state.last_timestamp = journey.timestamp
+
+                card_id = journey.card_id
+                tracker = state.trackers.get(card_id)
+                if tracker is None:
+                    tracker = state.trackers[card_id] = state.fare_rules.new_tracker()
+                fare = tracker.add_journey(journey)
+                total_fare += fare
+                card_totals[card_id] = card_totals.get(card_id, 0) + fare
+                offset = end_offset
+
+                card = "" if card_id is None else f"Card {card_id} "
+                print(
+                    f"{card}{journey.date_time} {line_pairs.keys[journey.pair_id]}: "
+                    f"${fare} (card total ${card_totals[card_id]}, "
+                    f"total ${total_fare})",
+                    file=out,
+                    flush=True,
+                )
+            save()
+            saved_offset = offset
+    finally:
+        # Also keep what was priced of a batch that was interrupted
+        if offset != saved_offset:
+            save()
+    return total_fare
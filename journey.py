@@ -0,0 +1,180 @@
+import sys
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from operator import attrgetter
+from constants import DATE_FORMAT, MINUTES_PER_DAY
+
+SECONDS_PER_DAY = 24 * 60 * 60
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# 1970-01-01 was a Thursday, three days after the start of its week
+EPOCH_WEEKDAY = 3
+# Length of a `DATE_FORMAT` timestamp written with zero padding
+TIMESTAMP_LENGTH = len("2023-09-11T07:58:30")
+# Distinct dates whose start `parse_timestamp` remembers
+DAY_CACHE_SIZE = 4096
+CSV_HEADER = ["from_line", "to_line", "date_time"]
+# Batch files carry the card each journey was made with as an extra first column
+BATCH_CSV_HEADER = ["card_id"] + CSV_HEADER
+
+
+def strptime_timestamp(date_time):
+    """Parse a `DATE_FORMAT` string with `datetime.strptime`.
+
+    This is the general parser `parse_timestamp` falls back to. It also accepts
+    fields without zero padding, such as "2023-9-11T7:05:00".
+    """
+    dt_obj = datetime.strptime(date_time, DATE_FORMAT)
+    return (
+        (dt_obj.toordinal() - EPOCH_ORDINAL) * SECONDS_PER_DAY
+        + dt_obj.hour * 3600
+        + dt_obj.minute * 60
+        + dt_obj.second
+    )
+
+
+@lru_cache(maxsize=DAY_CACHE_SIZE)
+def _day_start(date_part):
+    """Return the timestamp a "YYYY-MM-DD" date starts at, or None if it is invalid."""
+    year, month, day = date_part[:4], date_part[5:7], date_part[8:]
+    if not (year.isdecimal() and month.isdecimal() and day.isdecimal()):
+        return None
+    try:
+        ordinal = date(int(year), int(month), int(day)).toordinal()
+    except ValueError:
+        return None
+    return (ordinal - EPOCH_ORDINAL) * SECONDS_PER_DAY
+
+
+def parse_timestamp(date_time):
+    """Parse a `DATE_FORMAT` string into whole seconds since 1970-01-01T00:00:00.
+
+    Zero-padded timestamps, which is nearly all of them, are sliced at their
+    fixed offsets and range-checked here, several times faster than `strptime`.
+    Anything else goes through `strptime_timestamp`, so exactly the same strings
+    are accepted and invalid ones raise the same `ValueError`.
+    """
+    if (
+        len(date_time) == TIMESTAMP_LENGTH
+        and date_time[4] == "-"
+        and date_time[7] == "-"
+        and date_time[10] == "T"
+        and date_time[13] == ":"
+        and date_time[16] == ":"
+    ):
+        day_start = _day_start(date_time[:10])
+        hour, minute, second = date_time[11:13], date_time[14:16], date_time[17:]
+        if (
+            day_start is not None
+            and hour.isdecimal()
+            and minute.isdecimal()
+            and second.isdecimal()
+        ):
+            hour, minute, second = int(hour), int(minute), int(second)
+            if hour < 24 and minute < 60 and second < 60:
+                return day_start + hour * 3600 + minute * 60 + second
+    return strptime_timestamp(date_time)
+
+
+def format_timestamp(timestamp):
+    """Format seconds since the epoch back into a `DATE_FORMAT` string."""
+    return (EPOCH + timedelta(seconds=timestamp)).strftime(DATE_FORMAT)
+
+
+class Journey:
+    """A single validated journey, with its timestamp parsed exactly once."""
+
+    __slots__ = ("pair_id", "timestamp", "day", "minute_of_week", "card_id")
+
+    def __init__(self, pair_id, timestamp, card_id=None):
+        self.pair_id = pair_id
+        self.timestamp = timestamp
+        self.card_id = card_id
+        self.day = timestamp // SECONDS_PER_DAY
+        self.minute_of_week = (
+            self.day + EPOCH_WEEKDAY
+        ) % 7 * MINUTES_PER_DAY + timestamp % SECONDS_PER_DAY // 60
+
+    @classmethod
+    def from_row(cls, line_pairs, from_line, to_line, date_time, card_id=None):
+        """Build a journey from raw CSV fields, resolving its `LinePairIndex` ID.
+
+        Raises a `ValueError` naming the field that is invalid.
+        """
+        if card_id is not None:
+            if not card_id:
+                raise ValueError("Missing 'card_id'.")
+            card_id = sys.intern(card_id)
+
+        pair_id = line_pairs.lookup(from_line, to_line)
+        if pair_id is None:
+            raise ValueError(f"Invalid journey combination: {from_line} to {to_line}")
+
+        try:
+            timestamp = parse_timestamp(date_time)
+        except ValueError:
+            raise ValueError(f"Invalid 'date_time' format: {date_time}") from None
+        return cls(pair_id, timestamp, card_id)
+
+    @property
+    def date_time(self):
+        return format_timestamp(self.timestamp)
+
+    def __repr__(self):
+        card = "" if self.card_id is None else f", card_id={self.card_id!r}"
+        return f"Journey({self.pair_id!r}, {self.date_time!r}{card})"
+
+
+def check_header(header, batch=None):
+    """Check the header of a journey CSV, returning if it has a `card_id` column.
+
+    Batch files need `BATCH_CSV_HEADER` and other files `CSV_HEADER`, so that
+    the journeys of several cards are never priced as those of one rider. With
+    `batch` None, either header is accepted.
+    """
+    has_card_id = header == BATCH_CSV_HEADER
+    if header not in (CSV_HEADER, BATCH_CSV_HEADER) or batch not in (None, has_card_id):
+        raise ValueError("Unexpected CSV header format.")
+    return has_card_id
+
+
+def validate_csv_data(journey, line_pairs, card_id=None):
+    """Validate a CSV row and return it parsed as a `Journey`.
+
+    `journey` holds the row's fields after its `card_id`, if it has one.
+    """
+    if len(journey) != 3:
+        raise ValueError(f"Expected {3 if card_id is None else 4} fields.")
+    from_line, to_line, date_time = journey
+    return Journey.from_row(line_pairs, from_line, to_line, date_time, card_id)
+
+
+class JourneyOrderError(ValueError):
+    """Raised when journeys expected in time order arrive out of order."""
+
+    pass
+
+
+def ensure_time_order(journeys):
+    """Pass journeys through unchanged, checking that none goes back in time."""
+    previous = None
+    for position, journey in enumerate(journeys, start=1):
+        if previous is not None and journey.timestamp < previous.timestamp:
+            raise JourneyOrderError(
+                f"Journey #{position} at {journey.date_time} is earlier than the "
+                f"journey before it at {previous.date_time}; "
+                "input is not in time order."
+            )
+        previous = journey
+        yield journey
+
+
+def in_time_order(journeys, presorted=False):
+    """Return journeys from start -> end.
+
+    Journeys are sorted unless `presorted` is set, in which case their order is
+    only checked as they are consumed.
+    """
+    if presorted:
+        return ensure_time_order(journeys)
+    return sorted(journeys, key=attrgetter("timestamp"))
@@ -0,0 +1,76 @@
+import json
+from journey import format_timestamp
+
+TRACE_FIELDS = (
+    "card_id",
+    "date_time",
+    "line_pair",
+    "peak",
+    "base_fare",
+    "daily_before",
+    "weekly_before",
+    "charged",
+    "daily_after",
+    "weekly_after",
+)
+
+
+class JourneyTraceWriter:
+    """Write one NDJSON audit record per priced journey, in buffered batches.
+
+    `record` only appends a tuple; formatting and writing happen when the buffer
+    fills up or the writer is flushed or closed.
+    """
+
+    def __init__(self, file_path, line_pairs=None, buffer_size=10_000):
+        self._file = open(file_path, "w", buffering=1024 * 1024)
+        self._pair_keys = line_pairs.keys if line_pairs is not None else None
+        self._buffer_size = buffer_size
+        self._buffer = []
+
+    def record(self, journey, is_peak, base_fare, daily_fare, weekly_fare, charged):
+        self._buffer.append(
+            (journey, is_peak, base_fare, daily_fare, weekly_fare, charged)
+        )
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def _format(self, journey, is_peak, base_fare, daily_fare, weekly_fare, charged):
+        line_pair = journey.pair_id
+        if self._pair_keys is not None:
+            line_pair = self._pair_keys[line_pair]
+        values = (
+            journey.card_id,
+            format_timestamp(journey.timestamp),
+            line_pair,
+            is_peak,
+            base_fare,
+            daily_fare,
+            weekly_fare,
+            charged,
+            daily_fare + charged,
+            weekly_fare + charged,
+        )
+        return json.dumps(dict(zip(TRACE_FIELDS, values))) + "\n"
+
+    def flush(self):
+        self._file.write("".join(self._format(*record) for record in self._buffer))
+        self._buffer.clear()
+        self._file.flush()
+
+    def reset(self):
+        """Discard everything recorded so far, e.g. before pricing again."""
+        self._buffer.clear()
+        self._file.seek(0)
+        self._file.truncate()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
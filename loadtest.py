@@ -0,0 +1,288 @@
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import time
+import zlib
+
+from benchmark import generate_journeys
+from config_loader import ConfigLoader
+from fare_system import FareRules
+from journey import BATCH_CSV_HEADER, CSV_HEADER, check_header, validate_csv_data
+from main import calculate_card_total_fares
+from server import DEFAULT_HOST, DEFAULT_PORT, MAX_LINE_BYTES
+from settings import BASE_DIR
+from utils import resolve_path
+
+PERCENTILES = (50, 95, 99, 99.9)
+
+
+def read_rows(file_path):
+    """Read a journey CSV as dicts keyed by its header."""
+    with open(resolve_path(file_path), newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        check_header(header)
+        return [dict(zip(header, row)) for row in reader]
+
+
+def build_requests(rows, card_prefix, line_pairs):
+    """Turn journey rows into time-ordered fare requests.
+
+    Every card ID is prefixed with `card_prefix`, so a run never shares trackers
+    with journeys an earlier run already sent to the same server. Rows without a
+    card belong to a single rider, `card_prefix` itself. Rows are validated with
+    `validate_csv_data` first; invalid ones are logged and left out. Returns the
+    requests and the number of invalid rows.
+    """
+    timed_requests = []
+    invalid = 0
+    for row in rows:
+        try:
+            fields = (row["from_line"], row["to_line"], row["date_time"])
+            journey = validate_csv_data(fields, line_pairs, row.get("card_id"))
+        except (KeyError, ValueError) as e:
+            logging.warning(f"{row}: {e}")
+            invalid += 1
+            continue
+        request = {
+            "card_id": card_prefix + (journey.card_id or ""),
+            "from_line": row["from_line"],
+            "to_line": row["to_line"],
+            "date_time": row["date_time"],
+        }
+        timed_requests.append((journey.timestamp, request))
+    timed_requests.sort(key=lambda timed_request: timed_request[0])
+    return [request for _, request in timed_requests], invalid
+
+
+def offline_totals(config, requests):
+    """Price the requests with `calculate_card_total_fares`, keyed by card ID.
+
+    Requests that fail validation are left out, as the server rejects them too.
+    """
+    line_pairs = FareRules.compile(config).line_pairs
+    journeys = []
+    for request in requests:
+        row = (request["from_line"], request["to_line"], request["date_time"])
+        try:
+            journeys.append(validate_csv_data(row, line_pairs, request["card_id"]))
+        except ValueError:
+            pass
+    return calculate_card_total_fares(config, journeys, presorted=True)
+
+
+class LoadResult:
+    """Latencies, errors and charges collected by `run_load`."""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.card_totals = {}
+        self.elapsed = 0.0
+
+
+async def _connection(queue, result, start, rate, host, port, unix_socket):
+    if unix_socket:
+        reader, writer = await asyncio.open_unix_connection(
+            unix_socket, limit=MAX_LINE_BYTES
+        )
+    else:
+        reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE_BYTES)
+    try:
+        for index, request in queue:
+            if rate:
+                # Latency counts from when the request was due, so a slow server
+                # cannot hide queueing delay by slowing down the sender
+                due = start + index / rate
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                due = time.perf_counter()
+            writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            line = await reader.readline()
+            result.latencies.append(time.perf_counter() - due)
+            if not line:
+                raise ConnectionError("The fare server closed the connection.")
+            response = json.loads(line)
+            if "error" in response:
+                result.errors += 1
+                logging.warning(f"{request}: {response['error']}")
+            else:
+                card_id = request["card_id"]
+                totals = result.card_totals
+                totals[card_id] = totals.get(card_id, 0) + response["fare"]
+    finally:
+        writer.close()
+
+
+async def run_load(
+    requests,
+    connections=8,
+    rate=None,
+    host=DEFAULT_HOST,
+    port=DEFAULT_PORT,
+    unix_socket=None,
+):
+    """Send `requests` over `connections` concurrent connections.
+
+    Each card always uses the same connection, which sends one request at a time,
+    so a card's journeys reach the server in order. With `rate`, requests are
+    paced to that many per second overall; otherwise they are sent as fast as
+    the server answers.
+    """
+    queues = [[] for _ in range(connections)]
+    for index, request in enumerate(requests):
+        card = zlib.crc32(request["card_id"].encode()) % connections
+        queues[card].append((index, request))
+
+    result = LoadResult()
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            _connection(queue, result, start, rate, host, port, unix_socket)
+            for queue in queues
+            if queue
+        )
+    )
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def percentile(sorted_values, percent):
+    """Return the nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def format_report(result, mismatches):
+    """Format latency percentiles, throughput, errors and charge mismatches."""
+    latencies = sorted(result.latencies)
+    count = len(latencies)
+    throughput = count / result.elapsed if result.elapsed else 0.0
+    lines = [
+        f"requests: {count}",
+        f"throughput: {throughput:,.0f} req/s",
+        f"errors: {result.errors}",
+    ]
+    for percent in PERCENTILES:
+        lines.append(f"p{percent:g}: {percentile(latencies, percent) * 1e3:.3f} ms")
+    lines.append(f"charge mismatches: {len(mismatches)}")
+    for card_id, served, expected in mismatches[:10]:
+        lines.append(f"  {card_id}: served ${served}, expected ${expected}")
+    return "\n".join(lines)
+
+
+def compare_totals(served, expected):
+    """Return (card ID, served total, offline total) for every card that differs."""
+    return [
+        (card_id, served.get(card_id, 0), expected.get(card_id, 0))
+        for card_id in sorted(set(served) | set(expected))
+        if served.get(card_id, 0) != expected.get(card_id, 0)
+    ]
+
+
+def parse_args(argv=None):
+    """Parse load test arguments."""
+    parser = argparse.ArgumentParser(
+        description="Replay journeys against the fare server and report latency."
+    )
+    parser.add_argument(
+        "--host", type=str, default=DEFAULT_HOST, help="Server address."
+    )
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help="Server TCP port."
+    )
+    parser.add_argument(
+        "--unix-socket",
+        type=str,
+        default=None,
+        help="Use this Unix socket path instead of TCP.",
+    )
+    parser.add_argument(
+        "--config-filepath",
+        type=str,
+        default=os.path.join(BASE_DIR, "config.json"),
+        help="Configuration the server runs with, to check the charges against.",
+    )
+    parser.add_argument(
+        "--filepath",
+        type=str,
+        default=None,
+        help="Journey CSV to replay. Default generates synthetic journeys.",
+    )
+    parser.add_argument(
+        "--rows", type=int, default=10_000, help="Synthetic journeys to generate."
+    )
+    parser.add_argument(
+        "--cards", type=int, default=100, help="Synthetic cards to generate."
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed for the synthetic journeys."
+    )
+    parser.add_argument(
+        "--connections", type=int, default=8, help="Concurrent connections."
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="Target requests per second. Default sends as fast as possible.",
+    )
+    parser.add_argument(
+        "--card-prefix",
+        type=str,
+        default=None,
+        help="Prefix for the card IDs sent, so runs do not share server state. "
+        "Default is unique per run.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+
+    config = ConfigLoader(resolve_path(args.config_filepath)).load_config()
+    if args.filepath:
+        rows = read_rows(args.filepath)
+    else:
+        header = BATCH_CSV_HEADER if args.cards else CSV_HEADER
+        rows = [
+            dict(zip(header, row))
+            for row in generate_journeys(config, args.rows, args.seed, args.cards)
+        ]
+    card_prefix = args.card_prefix
+    if card_prefix is None:
+        card_prefix = f"lt{os.getpid()}-{int(time.time())}-"
+    line_pairs = FareRules.compile(config).line_pairs
+    requests, invalid = build_requests(rows, card_prefix, line_pairs)
+
+    result = asyncio.run(
+        run_load(
+            requests,
+            args.connections,
+            args.rate,
+            args.host,
+            args.port,
+            args.unix_socket,
+        )
+    )
+    # Invalid rows are never sent, and count as requests the server would reject
+    result.errors += invalid
+    logging.disable(logging.CRITICAL + 1)
+    mismatches = compare_totals(result.card_totals, offline_totals(config, requests))
+    print(format_report(result, mismatches))
+    if result.errors or mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
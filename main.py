@@ -1,52 +1,83 @@
 import argparse
+import cProfile
 import csv
 import logging
 import os
+import pstats
 import sys
 from datetime import datetime
+from functools import partial
+from itertools import chain
 
+from checkpoint import PricingState
+from columnar import JourneyColumns, is_columnar, read_columns
+from compression import DecompressionStats, open_input
 from config_loader import ConfigLoader
-from constants import DATE_FORMAT, LOG_FORMAT
-from fare_system import PeakHoursChecker, UserJourneyTracker, FareCalculator, FareCap
+from constants import LOG_FORMAT
+from external_sort import external_sort, run_size_for_memory
+from fare_system import FareRules
+from follow import follow_and_price
+from journey import JourneyOrderError, check_header, in_time_order, validate_csv_data
+from journey_trace import JourneyTraceWriter
+from mmap_reader import (
+    InvalidRowsError,
+    can_split,
+    iter_csv_mmap,
+    validate_csv_chunks,
+)
+from multi_file import merge_journeys, read_files
+from parallel import calculate_card_total_fares_parallel
+from profiling import StageTimer
+from rejects import RejectWriter, format_row
 from settings import BASE_DIR
-from utils import resolve_path
+from utils import expand_input_paths, parse_size, resolve_path
 
-# Setting up logging
-logging.basicConfig(level=logging.CRITICAL, format=LOG_FORMAT)
+# Number of functions printed by --profile
+PROFILE_LINES = 25
+# Exit status of a run that quarantined more rows than --max-rejects
+REJECTS_EXIT_CODE = 3
 
 
-def validate_csv_data(journey, valid_combinations):
-    from_line, to_line, date_time = journey
+def iter_csv(file_path, line_pairs, decompression=None, rejects=None, batch=None):
+    """Yield validated journeys from the input CSV one row at a time.
 
-    if f"{from_line.lower()},{to_line.lower()}" not in valid_combinations:
-        raise ValueError(f"Invalid journey combination: {from_line} to {to_line}")
-
-    try:
-        datetime.strptime(date_time, DATE_FORMAT)
-    except ValueError:
-        raise ValueError(f"Invalid 'date_time' format: {date_time}")
-
-
-def read_csv(file_path, valid_line_combinations):
-    """Read the input CSV file and return the list of journeys."""
+    Compressed files are decompressed as they are read, see
+    `compression.open_input`, adding the time spent to `decompression`.
+    Invalid rows raise a `ValueError`, or are recorded to `rejects` and skipped
+    if it is given. The header must have a `card_id` column if `batch` is True
+    and must not if it is False, see `journey.check_header`.
+    """
     try:
         logging.info(f"Attempting to read CSV from {file_path}.")
-        absolute_path = resolve_path(file_path)
-        with open(absolute_path, mode="r") as file:
+        with open_input(file_path, text=True, stats=decompression) as file:
             csv_reader = csv.reader(file)
-            header = next(csv_reader)  # Extract header
-
-            if header != ["from_line", "to_line", "date_time"]:
-                logging.critical("Unexpected CSV header format.")
-                raise ValueError("Unexpected CSV header format.")
-
-            journeys = list(csv_reader)
-            for journey in journeys:
-                validate_csv_data(journey, valid_line_combinations)  # Validate each row
+            header = next(csv_reader, None)  # Extract header
+
+            try:
+                has_card_id = check_header(header, batch)
+            except ValueError as e:
+                logging.critical(str(e))
+                raise
+
+            journey_count = 0
+            for row in csv_reader:
+                try:
+                    if has_card_id:
+                        card_id = row[0] if row else ""
+                        journey = validate_csv_data(row[1:], line_pairs, card_id)
+                    else:
+                        journey = validate_csv_data(row, line_pairs)
+                except ValueError as e:
+                    if rejects is None:
+                        raise
+                    line_number = csv_reader.line_num
+                    rejects.record(file_path, line_number, str(e), format_row(row))
+                    continue
+                yield journey
+                journey_count += 1
             logging.info(
-                f"Successfully read and validated {len(journeys)} journeys from {file_path}."
+                f"Successfully read and validated {journey_count} journeys from {file_path}."
             )
-            return journeys
     except FileNotFoundError:
         logging.critical(f"CSV file {file_path} not found.")
         raise
@@ -57,31 +88,248 @@ def read_csv(file_path, valid_line_combinations):
         raise
 
 
-def calculate_user_total_fare(config, journeys):
-    """Process each journey from the CSV and calculate the total fare."""
+def read_csv(
+    file_path,
+    line_pairs,
+    stream=False,
+    reader="csv",
+    decompression=None,
+    rejects=None,
+    batch=None,
+):
+    """Read the input CSV file and return the list of journeys.
+
+    With `stream=True` a generator is returned instead, which reads and validates
+    one row at a time as it is consumed, so memory does not grow with the file.
+    With `reader="mmap"` the file is scanned with `mmap_reader.iter_csv_mmap`.
+    A file written by `columnar.write_columns` is recognised and loaded as
+    `JourneyColumns` instead, whatever the reader. Gzip, bz2 and xz files are
+    decompressed as they are read, and the time spent is added to
+    `decompression`, a `DecompressionStats`, if given. With `rejects`, a
+    `RejectWriter`, invalid rows are recorded to it and skipped. `batch` says
+    whether the file must have card IDs, see `iter_csv`.
+    """
+    if is_columnar(file_path):
+        journeys = read_columns(file_path, line_pairs, decompression, batch)
+        return iter(journeys) if stream else journeys
+    if reader == "mmap":
+        journeys = iter_csv_mmap(file_path, line_pairs, decompression, rejects, batch)
+    else:
+        journeys = iter_csv(file_path, line_pairs, decompression, rejects, batch)
+    if stream:
+        return journeys
+    return list(journeys)
+
+
+def calculate_user_total_fare(
+    config, journeys, presorted=False, trace=None, state=None
+):
+    """Process each journey from the CSV and calculate the total fare.
+
+    Journeys are sorted by time first, unless `presorted` is set, in which case
+    they are priced in a single pass as they arrive and a `JourneyOrderError` is
+    raised at the first journey that is earlier than the one before it. Every
+    priced journey is recorded to `trace`, if given. With a `PricingState`,
+    pricing continues from its tracker, which is left updated.
+    """
     logging.info("Starting fare calculation for the given user journeys.")
 
-    peak_hours_checker = PeakHoursChecker(config["peak_hours"])
-    fare_calculator = FareCalculator(peak_hours_checker, config["fare_chart"])
-    fare_cap = FareCap(config["cap_chart"])
-    user_tracker = UserJourneyTracker(fare_calculator, fare_cap)
+    journeys = in_time_order(journeys, presorted)
+    if state is None:
+        user_tracker = FareRules.compile(config).new_tracker(trace)
+    else:
+        journeys = state.resume(journeys)
+        user_tracker = state.trackers.get(None)
+        if user_tracker is None:
+            user_tracker = state.trackers[None] = state.fare_rules.new_tracker()
+        user_tracker.trace = trace
     total_fare = 0
-
-    # Sort journey from start -> end
-    journeys.sort(key=lambda x: datetime.strptime(x[2], DATE_FORMAT))
+    journey_count = 0
 
     for journey in journeys:
-        from_line, to_line, date_time = journey
-        from_line = from_line.lower()
-        to_line = to_line.lower()
-        fare_to_charge = user_tracker.add_journey(from_line, to_line, date_time)
+        fare_to_charge = user_tracker.add_journey(journey)
 
         total_fare += fare_to_charge
+        journey_count += 1
 
-    logging.info(f"Total Fare for {len(journeys)} journeys: ${total_fare}.")
+    logging.info(f"Total Fare for {journey_count} journeys: ${total_fare}.")
     return total_fare
 
 
+def calculate_card_total_fares(
+    config, journeys, presorted=False, trace=None, state=None
+):
+    """Calculate the total fare of every card in a batch of journeys.
+
+    The configuration is compiled once and each card keeps its own tracker, so
+    this gives the same totals as pricing every card's journeys separately.
+    Returns a dict mapping each `card_id` to its total fare. With a
+    `PricingState`, cards continue from their trackers in it, and the state is
+    left updated; only cards with journeys in this batch are returned.
+    """
+    logging.info("Starting fare calculation for a batch of cards.")
+
+    journeys = in_time_order(journeys, presorted)
+    if state is None:
+        fare_rules = FareRules.compile(config)
+        trackers = {}
+    else:
+        journeys = state.resume(journeys)
+        fare_rules = state.fare_rules
+        trackers = state.trackers
+        for tracker in trackers.values():
+            tracker.trace = trace
+    card_totals = {}
+    journey_count = 0
+
+    for journey in journeys:
+        card_id = journey.card_id
+        tracker = trackers.get(card_id)
+        if tracker is None:
+            tracker = trackers[card_id] = fare_rules.new_tracker(trace)
+        fare_to_charge = tracker.add_journey(journey)
+        card_totals[card_id] = card_totals.get(card_id, 0) + fare_to_charge
+        journey_count += 1
+
+    logging.info(
+        f"Calculated fares for {len(card_totals)} cards over {journey_count} journeys."
+    )
+    return card_totals
+
+
+def sum_card_totals(card_totals):
+    """Add up per-card totals in card order, whatever order they were seen in."""
+    return sum(card_totals[card_id] for card_id in sorted(card_totals, key=str))
+
+
+def price_csv(
+    config,
+    file_path,
+    line_pairs,
+    stream=False,
+    max_memory=None,
+    calculate=calculate_user_total_fare,
+    trace=None,
+    timer=None,
+    state=None,
+    reader="csv",
+    parse_workers=1,
+    rejects=None,
+    batch=None,
+):
+    """Read and price a journey CSV with `calculate`.
+
+    `file_path` is a path or a list of paths, whose journeys are priced
+    together. With `stream`, the input is priced in a single pass as it is
+    read, merging several files by time. Otherwise, or if a streamed input
+    turns out not to be in time order, it is sorted first: in memory by
+    default, or with an on-disk merge sort holding roughly `max_memory` bytes
+    of journeys at a time when that is given. In memory, several files are
+    parsed on `parse_workers` processes, sorted one by one and merged; a single
+    CSV is split into byte ranges for them instead, and an `InvalidRowsError`
+    lists all of its invalid rows. A
+    `trace` writer and a `PricingState`, if given, are passed on to
+    `calculate`, and each stage is timed with `timer`. `reader` selects the
+    CSV reader, see `read_csv`. Time spent decompressing a compressed file in
+    this process is reported as a stage of its own, split off the stage that
+    read the file. With `rejects`, a `RejectWriter`, invalid rows are recorded
+    to it and the rest of the input is priced. `batch` says whether the input
+    must have card IDs, see `read_csv`.
+    """
+    if trace is not None:
+        calculate = partial(calculate, trace=trace)
+    if state is not None:
+        calculate = partial(calculate, state=state)
+    if timer is None:
+        timer = StageTimer()
+    file_paths = [file_path] if isinstance(file_path, str) else list(file_path)
+    decompression = DecompressionStats()
+    read = partial(
+        read_csv,
+        line_pairs=line_pairs,
+        reader=reader,
+        decompression=decompression,
+        batch=batch,
+    )
+
+    def read_stream(merge=True):
+        """Stream the journeys of every file, merged by time or one after another."""
+        streams = [read(path, stream=True, rejects=rejects) for path in file_paths]
+        if len(streams) == 1:
+            return streams[0]
+        return merge_journeys(streams) if merge else chain.from_iterable(streams)
+
+    def split_decompression(timing):
+        """Report the time spent decompressing apart from the rest of `timing`."""
+        if decompression.format is not None:
+            timing.data_bytes = decompression.decompressed_bytes
+            timer.split(
+                timing,
+                f"decompress_{decompression.format}",
+                decompression.wall,
+                decompression.cpu,
+            )
+            decompression.reset()
+
+    if stream:
+        journeys = read_stream()
+        try:
+            with timer.stage("read_and_calculate") as stage:
+                return calculate(config, journeys, presorted=True)
+        except JourneyOrderError as e:
+            logging.warning(f"{e} Falling back to sorting the whole input.")
+            if trace is not None:
+                trace.reset()
+            if state is not None:
+                state.reset()
+            if rejects is not None:
+                rejects.reset()
+        finally:
+            journeys.close()
+            split_decompression(stage)
+
+    if max_memory is None and (len(file_paths) > 1 or parse_workers > 1):
+        with timer.stage("read_csv") as stage:
+            if len(file_paths) == 1 and can_split(file_paths[0]):
+                files, errors = validate_csv_chunks(
+                    file_paths[0], line_pairs, parse_workers, batch
+                )
+                if errors and rejects is None:
+                    raise InvalidRowsError(errors)
+                for line_number, reason, row in errors:
+                    rejects.record(file_paths[0], line_number, reason, row)
+            else:
+                files = read_files(read, file_paths, parse_workers, rejects)
+            stage.rows = sum(len(journeys) for journeys in files)
+        split_decompression(stage)
+        with timer.stage("merge", stage.rows):
+            journeys = list(merge_journeys(files))
+        with timer.stage("calculate", stage.rows):
+            return calculate(config, journeys, presorted=True)
+
+    if max_memory is None:
+        with timer.stage("read_csv") as stage:
+            journeys = read(file_paths[0], rejects=rejects)
+            stage.rows = len(journeys)
+        split_decompression(stage)
+        with timer.stage("sort", stage.rows):
+            # Columnar files are always written in time order
+            if not isinstance(journeys, JourneyColumns):
+                journeys = in_time_order(journeys)
+        with timer.stage("calculate", stage.rows):
+            return calculate(config, journeys, presorted=True)
+
+    # Reading, sorting and pricing all happen as the merged runs are consumed
+    try:
+        with timer.stage("external_sort_and_calculate") as stage:
+            journeys = external_sort(
+                read_stream(merge=False), run_size_for_memory(max_memory)
+            )
+            return calculate(config, journeys, presorted=True)
+    finally:
+        split_decompression(stage)
+
+
 def parse_args():
     """Parse application user-inserted-arguments."""
     parser = argparse.ArgumentParser(
@@ -90,8 +338,10 @@ def parse_args():
     parser.add_argument(
         "--filepath",
         type=str,
-        default=os.path.join(BASE_DIR, "data/target.csv"),
-        help="Path to the input CSV file",
+        nargs="+",
+        default=[os.path.join(BASE_DIR, "data/target.csv")],
+        help="Path to the input CSV file. Several paths, globs (quoted) or "
+        "directories can be given to price their journeys together.",
     )
     parser.add_argument(
         "--log-level",
@@ -117,13 +367,140 @@ def parse_args():
         default=os.path.join(BASE_DIR, "logs"),
         help="Directory to save the log file. Default is 'logs' directory.",
     )
+    parser.add_argument(
+        "--config-cache",
+        type=str,
+        default=None,
+        help="Directory to cache the compiled configuration in, so later runs "
+        "with the same configuration file skip validating and compiling it.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Price the input in a single pass with constant memory, assuming it "
+        "is already in time order (falls back to sorting if it is not).",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=parse_size,
+        default=None,
+        help="Sort unordered input on disk, holding about this much journey data "
+        "in memory at a time (e.g. 512M, 2G). Default sorts entirely in memory.",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Price every card in a file with a leading 'card_id' column and "
+        "print a total per card.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="With --batch, price cards on this many worker processes. Default is 1.",
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        default="python",
+        choices=["python", "numpy"],
+        help="Fare engine to use. 'numpy' prices the whole file with vectorized "
+        "array operations (requires numpy and whole-number fares and caps).",
+    )
+    parser.add_argument(
+        "--trace-file",
+        type=str,
+        default=None,
+        help="Write an NDJSON audit record of how every journey was priced to "
+        "this file.",
+    )
+    parser.add_argument(
+        "--resume-from",
+        type=str,
+        default=None,
+        help="Continue from the tracker state in this checkpoint file, so only "
+        "journeys after it need to be priced.",
+    )
+    parser.add_argument(
+        "--checkpoint-to",
+        type=str,
+        default=None,
+        help="Save the tracker state to this checkpoint file after pricing, for a "
+        "later run to --resume-from.",
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="Keep pricing rows as they are appended to the input file, printing "
+        "each charge, until interrupted. Use with --checkpoint-to to resume later.",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        help="With --follow, seconds between checks for new rows. Default is 1.",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=1,
+        help="Parse and validate the input on this many worker processes, one "
+        "file or one part of a single file each. Default is 1.",
+    )
+    parser.add_argument(
+        "--on-error",
+        type=str,
+        default="abort",
+        choices=["abort", "quarantine"],
+        help="What to do with an invalid row: 'abort' the run (default), or "
+        "'quarantine' it to --reject-file and price the rest of the input.",
+    )
+    parser.add_argument(
+        "--reject-file",
+        type=str,
+        default=None,
+        help="With --on-error=quarantine, CSV file to write rejected rows to. "
+        "Default is a timestamped file in --log-dir.",
+    )
+    parser.add_argument(
+        "--max-rejects",
+        type=int,
+        default=0,
+        help=f"With --on-error=quarantine, exit with status {REJECTS_EXIT_CODE} "
+        "if more rows than this are rejected. Default is 0.",
+    )
+    parser.add_argument(
+        "--reader",
+        type=str,
+        default="csv",
+        choices=["csv", "mmap"],
+        help="CSV reader to use. 'mmap' scans the memory-mapped file and parses "
+        "rows straight from bytes.",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print the wall time, CPU time and rows/sec of each stage at exit.",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Trace memory allocations with tracemalloc and print the peak of each "
+        "stage at exit (slows the run down).",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the run with cProfile and print the slowest functions at "
+        "exit. With --write-log, the full stats are also saved to --log-dir.",
+    )
 
     args = parser.parse_args()
 
     # Check if the script was run without any arguments, then activate interactive mode
     if len(sys.argv) == 1:
         # Displaying only the filename for better user experience
-        default_csv_display = os.path.basename(args.filepath)
+        default_csv_display = os.path.basename(args.filepath[0])
         default_config_display = os.path.basename(args.config_filepath)
         default_logdir_display = os.path.basename(args.log_dir)
 
@@ -132,7 +509,7 @@ def parse_args():
             f"Path to the input CSV file (default: {default_csv_display}): "
         ).strip()
         args.filepath = (
-            resolve_path(input_filepath) if input_filepath else args.filepath
+            [resolve_path(input_filepath)] if input_filepath else args.filepath
         )
 
         input_config_filepath = input(
@@ -179,6 +556,7 @@ def configure_log(log_level, write_log=False, log_dir="logs"):
         raise ValueError(f"Invalid log level: {log_level}")
 
     # Configure logger
+    logging.basicConfig(format=LOG_FORMAT)
     logger = logging.getLogger()
     logger.setLevel(numeric_log_level)
 
@@ -198,22 +576,179 @@ def configure_log(log_level, write_log=False, log_dir="logs"):
         logger.addHandler(file_handler)
 
 
+def print_card_totals(card_totals):
+    """Print the total fare of each card followed by the overall total."""
+    for card_id in sorted(card_totals, key=str):
+        if card_id is not None:
+            print(f"Card {card_id}: ${card_totals[card_id]}")
+    print(f"Total Fare: ${sum_card_totals(card_totals)}")
+
+
+def write_profile(profiler, write_log=False, log_dir="logs"):
+    """Print the slowest functions of a profiled run, saving the full stats too."""
+    stats = pstats.Stats(profiler, stream=sys.stderr)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_LINES)
+
+    if write_log:
+        log_folder = resolve_path(log_dir)
+        os.makedirs(log_folder, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        stats_path = f"{log_folder}/profile_{timestamp}.pstats"
+        stats.dump_stats(stats_path)
+        print(f"Profile saved to {stats_path}", file=sys.stderr)
+
+
 def main():
     """Main application logic."""
     args = parse_args()
     configure_log(args.log_level, args.write_log, args.log_dir)
 
+    timer = StageTimer(trace_memory=args.trace_memory)
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+
+    trace = None
+    rejects = None
     try:
-        config_loader = ConfigLoader(args.config_filepath)
-        config = config_loader.load_config()
+        if args.batch and args.engine == "numpy":
+            raise ValueError("The numpy engine does not support --batch.")
+        if args.trace_file and (args.engine == "numpy" or args.workers > 1):
+            raise ValueError(
+                "--trace-file needs the python engine and a single worker."
+            )
+        checkpointing = args.resume_from or args.checkpoint_to
+        if checkpointing and (args.engine == "numpy" or args.workers > 1):
+            raise ValueError(
+                "--resume-from and --checkpoint-to need the python engine and a "
+                "single worker."
+            )
 
-        valid_line_combinations = set(config["fare_chart"].keys())
-        user_journey = read_csv(args.filepath, valid_line_combinations)
-        total_fare = calculate_user_total_fare(config, user_journey)
-        print(f"Total Fare: ${total_fare}")
+        if args.follow and (args.stream or args.max_memory or args.trace_file):
+            raise ValueError(
+                "--follow cannot be combined with --stream, --max-memory or "
+                "--trace-file."
+            )
+        if args.follow and (args.engine == "numpy" or args.workers > 1):
+            raise ValueError("--follow needs the python engine and a single worker.")
+        file_paths = expand_input_paths(args.filepath)
+        if args.workers > 1 and not args.batch:
+            raise ValueError("--workers needs --batch.")
+        if args.follow and len(file_paths) > 1:
+            raise ValueError("--follow needs a single input file.")
+        quarantine = args.on_error == "quarantine"
+        if args.follow and quarantine:
+            raise ValueError("--follow cannot be combined with --on-error=quarantine.")
+        if args.reject_file and not quarantine:
+            raise ValueError("--reject-file needs --on-error=quarantine.")
+
+        with timer.stage("load_config"):
+            config_loader = ConfigLoader(args.config_filepath)
+            if args.config_cache:
+                config = config_loader.load_compiled(resolve_path(args.config_cache))
+            else:
+                config = FareRules(config_loader.load_config())
+
+        line_pairs = config.line_pairs
+        state = None
+        if args.resume_from:
+            state = PricingState.load(config, resolve_path(args.resume_from))
+        elif args.checkpoint_to or args.follow:
+            state = PricingState(config)
+        if args.trace_file:
+            trace = JourneyTraceWriter(resolve_path(args.trace_file), line_pairs)
+        if quarantine:
+            reject_file = args.reject_file
+            if reject_file is None:
+                log_folder = resolve_path(args.log_dir)
+                os.makedirs(log_folder, exist_ok=True)
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                reject_file = f"{log_folder}/rejects_{timestamp}.csv"
+            rejects = RejectWriter(resolve_path(reject_file))
+        if args.follow:
+            checkpoint_to = args.checkpoint_to and resolve_path(args.checkpoint_to)
+            try:
+                with timer.stage("follow"):
+                    follow_and_price(
+                        state,
+                        file_paths[0],
+                        checkpoint_to,
+                        args.poll_interval,
+                        batch=args.batch,
+                    )
+            except KeyboardInterrupt:
+                logging.info("Stopped following the input file.")
+            return
+        if args.batch:
+            calculate = calculate_card_total_fares
+            if args.workers > 1:
+                calculate = partial(
+                    calculate_card_total_fares_parallel, workers=args.workers
+                )
+            card_totals = price_csv(
+                config,
+                file_paths,
+                line_pairs,
+                stream=args.stream,
+                max_memory=args.max_memory,
+                calculate=calculate,
+                trace=trace,
+                timer=timer,
+                state=state,
+                reader=args.reader,
+                parse_workers=args.parse_workers,
+                rejects=rejects,
+                batch=args.batch,
+            )
+            print_card_totals(card_totals)
+        else:
+            calculate = calculate_user_total_fare
+            if args.engine == "numpy":
+                # Only this engine pays for importing numpy
+                from vectorized import calculate_user_total_fare_vectorized
+
+                calculate = calculate_user_total_fare_vectorized
+            total_fare = price_csv(
+                config,
+                file_paths,
+                line_pairs,
+                stream=args.stream,
+                max_memory=args.max_memory,
+                calculate=calculate,
+                trace=trace,
+                timer=timer,
+                state=state,
+                reader=args.reader,
+                parse_workers=args.parse_workers,
+                rejects=rejects,
+                batch=args.batch,
+            )
+            print(f"Total Fare: ${total_fare}")
+
+        if args.checkpoint_to:
+            state.save(resolve_path(args.checkpoint_to))
+        if rejects is not None and rejects.count:
+            print(f"Rejected {rejects.count} rows, see {reject_file}", file=sys.stderr)
+            if rejects.count > args.max_rejects:
+                logging.critical(
+                    f"Rejected {rejects.count} rows, more than the limit of "
+                    f"{args.max_rejects}."
+                )
+                sys.exit(REJECTS_EXIT_CODE)
     except Exception as e:
         logging.critical(f"An error occurred: {str(e)}")
         sys.exit(1)
+    finally:
+        if trace is not None:
+            trace.close()
+        if rejects is not None:
+            rejects.close()
+        if profiler is not None:
+            profiler.disable()
+            write_profile(profiler, args.write_log, args.log_dir)
+        if args.timings or args.trace_memory:
+            print(timer.report(), file=sys.stderr)
+        timer.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,313 @@
+import csv
+import logging
+import mmap
+import multiprocessing
+import sys
+from functools import partial
+from columnar import JourneyColumns, is_columnar
+from compression import DecompressionStats, detect_compression, open_input
+from journey import (
+    Journey,
+    check_header,
+    parse_timestamp,
+    validate_csv_data,
+)
+from utils import resolve_path
+
+# Invalid rows named in the message of an `InvalidRowsError`
+REPORTED_ERRORS = 10
+# Bytes of whole lines split at a time
+BLOCK_SIZE = 1024 * 1024
+TIME_LENGTH = len("07:58:30")
+
+
+def _seconds_of_day(time):
+    """Parse the "HH:MM:SS" half of a timestamp into seconds since midnight.
+
+    Most of a large file's times of day are only seen a few times, so they are
+    checked here at their fixed offsets rather than through `parse_timestamp`,
+    which they fall back to if they are not zero padded.
+    """
+    if len(time) == TIME_LENGTH and time[2] == time[5] == 0x3A:  # ":"
+        hour, minute, second = time[:2], time[3:5], time[6:]
+        if hour.isdigit() and minute.isdigit() and second.isdigit():
+            hour, minute, second = int(hour), int(minute), int(second)
+            if hour < 24 and minute < 60 and second < 60:
+                return hour * 3600 + minute * 60 + second
+    return parse_timestamp("1970-01-01T" + time.decode())
+
+
+class _RowParser:
+    """Parse journey CSV lines straight from bytes.
+
+    Each row is cut into its card ID, line pair, date and time of day, and each
+    of those is decoded and validated the first time a spelling is seen and
+    looked up by its raw bytes after that, which for real inputs is nearly every
+    row. Lines the fast path does not handle, such as quoted fields, go through
+    `csv` and `validate_csv_data`.
+    """
+
+    def __init__(self, line_pairs, has_card_id):
+        self.line_pairs = line_pairs
+        self.has_card_id = has_card_id
+        self._pair_ids = {}
+        self._days = {}
+        self._seconds = {}
+        self._card_ids = {}
+
+    def _pair_id(self, raw_pair):
+        if raw_pair.count(b",") != 1:
+            raise ValueError(f"Expected {3 + self.has_card_id} fields.")
+        from_line, _, to_line = raw_pair.decode().partition(",")
+        pair_id = self.line_pairs.lookup(from_line, to_line)
+        if pair_id is None:
+            raise ValueError(f"Invalid journey combination: {from_line} to {to_line}")
+        self._pair_ids[raw_pair] = pair_id
+        return pair_id
+
+    def _timestamp(self, raw, date, time):
+        try:
+            day_start = self._days.get(date)
+            if day_start is None:
+                day_start = parse_timestamp(date.decode() + "T00:00:00")
+            seconds = self._seconds.get(time)
+            if seconds is None:
+                seconds = _seconds_of_day(time)
+        except ValueError:
+            raise ValueError(f"Invalid 'date_time' format: {raw.decode()}") from None
+        self._days[date] = day_start
+        self._seconds[time] = seconds
+        return day_start + seconds
+
+    def _card_id(self, raw):
+        if not raw:
+            raise ValueError("Missing 'card_id'.")
+        card_id = self._card_ids[raw] = sys.intern(raw.decode())
+        return card_id
+
+    def parse(self, line):
+        """Return the journey of one line, without its line ending."""
+        if b'"' in line:
+            row = next(csv.reader([line.decode()]))
+            if self.has_card_id:
+                card_id, *row = row
+                return validate_csv_data(row, self.line_pairs, card_id)
+            return validate_csv_data(row, self.line_pairs)
+
+        if self.has_card_id:
+            raw_card_id, _, line = line.partition(b",")
+        raw_pair, _, raw_timestamp = line.rpartition(b",")
+        pair_id = self._pair_ids.get(raw_pair)
+        if pair_id is None:
+            pair_id = self._pair_id(raw_pair)
+
+        date, _, time = raw_timestamp.partition(b"T")
+        day_start = self._days.get(date)
+        seconds = self._seconds.get(time)
+        if day_start is None or seconds is None:
+            timestamp = self._timestamp(raw_timestamp, date, time)
+        else:
+            timestamp = day_start + seconds
+
+        if not self.has_card_id:
+            return Journey(pair_id, timestamp)
+        card_id = self._card_ids.get(raw_card_id)
+        if card_id is None:
+            card_id = self._card_id(raw_card_id)
+        return Journey(pair_id, timestamp, card_id)
+
+
+def _split_lines(block):
+    """Split a block of whole lines, dropping their line endings."""
+    lines = block.split(b"\n")
+    if not lines[-1]:
+        lines.pop()
+    if b"\r" in block:
+        lines = [line[:-1] if line.endswith(b"\r") else line for line in lines]
+    return lines
+
+
+def _lines_in(buffer, start, end):
+    """Yield the lines of `buffer[start:end]`, without line endings.
+
+    The range is split a block of about `BLOCK_SIZE` bytes at a time, rather
+    than searching for each line ending separately.
+    """
+    position = start
+    while position < end:
+        block_end = position + BLOCK_SIZE
+        if block_end < end:
+            block_end = buffer.find(b"\n", block_end - 1, end) + 1 or end
+        else:
+            block_end = end
+        yield from _split_lines(buffer[position:block_end])
+        position = block_end
+
+
+def _mapped_lines(file):
+    """Yield the lines of a file, without line endings, from a memory map."""
+    size = file.seek(0, 2)
+    if size == 0:
+        return
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        yield from _lines_in(buffer, 0, size)
+
+
+def _streamed_lines(file):
+    """Yield the lines of a file, without line endings, as it is read."""
+    rest = b""
+    for block in iter(partial(file.read, BLOCK_SIZE), b""):
+        block = rest + block
+        block_end = block.rfind(b"\n") + 1
+        rest = block[block_end:]
+        yield from _split_lines(block[:block_end])
+    if rest:
+        yield from _split_lines(rest)
+
+
+def _has_card_id(header, batch=None):
+    """Check the header line of a journey CSV, returning if it has card IDs."""
+    if header is not None:
+        header = next(csv.reader([header.decode()]), None)
+    try:
+        return check_header(header, batch)
+    except ValueError as e:
+        logging.critical(str(e))
+        raise
+
+
+def iter_csv_mmap(file_path, line_pairs, decompression=None, rejects=None, batch=None):
+    """Yield validated journeys like `main.iter_csv`, scanning a memory map.
+
+    Line boundaries are found in the mapped file and each row is parsed from
+    its bytes, without building a list of field strings. Compressed files
+    cannot be mapped, so their lines are read from the decompressed stream,
+    see `compression.open_input`. Errors name the line of the file they were
+    found on. With `rejects`, invalid rows are recorded to it and skipped.
+    `batch` says whether the header must have card IDs, see `main.iter_csv`.
+    """
+    logging.info(f"Attempting to read CSV from {file_path} with mmap.")
+    if decompression is None:
+        decompression = DecompressionStats()
+    with open_input(file_path, stats=decompression) as file:
+        if decompression.format is not None:
+            lines = _streamed_lines(file)
+        else:
+            lines = _mapped_lines(file)
+        parse = _RowParser(line_pairs, _has_card_id(next(lines, None), batch)).parse
+
+        line_number = 1
+        for line_number, line in enumerate(lines, start=2):
+            try:
+                journey = parse(line)
+            except (ValueError, UnicodeDecodeError) as e:
+                if rejects is None:
+                    raise ValueError(f"Line {line_number}: {e}") from None
+                row = line.decode(errors="replace")
+                rejects.record(file_path, line_number, str(e), row)
+                continue
+            yield journey
+    logging.info(
+        f"Successfully read and validated {line_number - 1} journeys from {file_path}."
+    )
+
+
+class InvalidRowsError(ValueError):
+    """Raised for a journey CSV with invalid rows, listing all of them.
+
+    `errors` holds the (line number, reason, raw row) of every invalid row.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        shown = "; ".join(
+            f"Line {line_number}: {reason}"
+            for line_number, reason, _ in errors[:REPORTED_ERRORS]
+        )
+        if len(errors) > REPORTED_ERRORS:
+            shown += f"; and {len(errors) - REPORTED_ERRORS} more"
+        super().__init__(f"{len(errors)} invalid rows. {shown}")
+
+
+def _validate_chunk(file_path, line_pairs, has_card_id, start, end):
+    """Worker: validate the rows in one byte range of a journey CSV.
+
+    Returns the valid journeys as time-ordered `JourneyColumns`, the (line
+    number, reason, raw row) of every invalid row, counting lines from 1 at
+    `start`, and the number of lines in the range.
+    """
+    parse = _RowParser(line_pairs, has_card_id).parse
+    journeys = []
+    errors = []
+    line_number = 0
+    with open(file_path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for line_number, line in enumerate(_lines_in(buffer, start, end), 1):
+                try:
+                    journeys.append(parse(line))
+                except (ValueError, UnicodeDecodeError) as e:
+                    row = line.decode(errors="replace")
+                    errors.append((line_number, str(e), row))
+    return JourneyColumns.from_journeys(journeys), errors, line_number
+
+
+def can_split(file_path):
+    """Return whether `validate_csv_chunks` can split `file_path` into ranges."""
+    return detect_compression(file_path) is None and not is_columnar(file_path)
+
+
+def validate_csv_chunks(file_path, line_pairs, workers, batch=None):
+    """Validate a journey CSV on `workers` processes, each taking a byte range.
+
+    The file is cut into ranges of about equal size, moved forward to the next
+    line boundary, and every worker parses and validates its range with the
+    same checks as `iter_csv_mmap`. Rather than stopping at the first invalid
+    row, all of them are collected. Returns the valid journeys as a list of
+    time-ordered `JourneyColumns`, one per range, for `merge_journeys`, and the
+    (line number, reason, raw row) of every invalid row in file order. The
+    header is checked against `batch` like in `iter_csv_mmap`.
+    """
+    logging.info(f"Validating {file_path} in {workers} chunks.")
+    file_path = resolve_path(file_path)
+    with open(file_path, "rb") as file:
+        size = file.seek(0, 2)
+        if size == 0:
+            _has_card_id(None, batch)
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            header_end = buffer.find(b"\n")
+            if header_end < 0:
+                header_end = size
+            has_card_id = _has_card_id(buffer[:header_end], batch)
+            boundaries = [min(header_end + 1, size)]
+            for index in range(1, workers):
+                target = boundaries[0] + (size - boundaries[0]) * index // workers
+                line_end = buffer.find(b"\n", max(target, boundaries[-1]))
+                boundaries.append(size if line_end < 0 else line_end + 1)
+            boundaries.append(size)
+    ranges = [
+        (start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start
+    ]
+
+    validate = partial(_validate_chunk, file_path, line_pairs, has_card_id)
+    if len(ranges) > 1:
+        context = multiprocessing.get_context()
+        with context.Pool(len(ranges)) as pool:
+            results = pool.starmap(validate, ranges, chunksize=1)
+    else:
+        results = [validate(start, end) for start, end in ranges]
+
+    chunks = []
+    errors = []
+    # Line numbers in each range restart at 1; the header is line 1 of the file
+    lines_before = 1
+    for journeys, chunk_errors, line_count in results:
+        chunks.append(journeys)
+        errors.extend(
+            (lines_before + line, reason, row) for line, reason, row in chunk_errors
+        )
+        lines_before += line_count
+    logging.info(
+        f"Validated {sum(len(chunk) for chunk in chunks)} journeys from {file_path}, "
+        f"{len(errors)} invalid."
+    )
+    return chunks, errors
@@ -0,0 +1,61 @@
+import heapq
+import logging
+import multiprocessing
+from functools import partial
+from operator import attrgetter
+from columnar import JourneyColumns
+from journey import in_time_order
+from rejects import RejectList
+
+
+def _read_file(read, file_path, rejects=None):
+    try:
+        return read(file_path, rejects=rejects)
+    except ValueError as e:
+        raise ValueError(f"{file_path}: {e}") from None
+
+
+def _read_columns(read, quarantine, file_path):
+    """Worker: read one journey file and return it as time-ordered columns.
+
+    With `quarantine`, the rows rejected on the way are returned as well.
+    """
+    rejects = RejectList() if quarantine else None
+    columns = JourneyColumns.from_journeys(_read_file(read, file_path, rejects))
+    return columns, rejects and rejects.rows
+
+
+def read_files(read, file_paths, parse_workers=1, rejects=None):
+    """Read and validate journey files, returning each one in time order.
+
+    `read` maps a file path to its journeys, e.g. `main.read_csv` with the line
+    pairs bound. With more than one `parse_workers`, files are parsed, validated
+    and sorted in that many processes at once and sent back as `JourneyColumns`,
+    which are much cheaper to transfer than `Journey` objects. Errors name the
+    file they were found in. With `rejects`, invalid rows are recorded to it
+    instead, and skipped.
+    """
+    parse_workers = min(parse_workers, len(file_paths))
+    if parse_workers <= 1:
+        return [in_time_order(_read_file(read, path, rejects)) for path in file_paths]
+
+    logging.info(f"Reading {len(file_paths)} files on {parse_workers} workers.")
+    context = multiprocessing.get_context()
+    read_columns = partial(_read_columns, read, rejects is not None)
+    with context.Pool(parse_workers) as pool:
+        results = pool.map(read_columns, file_paths, chunksize=1)
+    files = []
+    for columns, rejected in results:
+        files.append(columns)
+        for row in rejected or ():
+            rejects.record(*row)
+    return files
+
+
+def merge_journeys(sequences):
+    """Merge time-ordered journey sequences into one, with a k-way merge.
+
+    Journeys at the same time keep the order of the sequences they come from,
+    so merging the same files always gives the same order.
+    """
+    return heapq.merge(*sequences, key=attrgetter("timestamp"))
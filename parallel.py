@@ -0,0 +1,152 @@
+import logging
+import multiprocessing
+import queue
+import zlib
+from array import array
+from operator import attrgetter
+from fare_system import FareRules
+from journey import Journey, JourneyOrderError
+
+# Journeys are shipped to workers in chunks to amortise queue overhead, and each
+# worker's queue holds only a few chunks so a slow worker throttles the reader.
+# A chunk holds the columns of its journeys: pair IDs, timestamps and card IDs.
+CHUNK_SIZE = 10_000
+MAX_QUEUED_CHUNKS = 4
+# Seconds between checks that the workers are alive while waiting on a queue
+LIVENESS_INTERVAL = 1.0
+
+
+def card_partition(card_id, workers):
+    """Pick the worker for a card, the same way in every run and process."""
+    if card_id is None:
+        return 0
+    return zlib.crc32(card_id.encode()) % workers
+
+
+def _price_partition(config, inbox, outbox):
+    """Worker loop: price every chunk sent to `inbox`, then report card totals."""
+    try:
+        fare_rules = FareRules.compile(config)
+        trackers = {}
+        card_totals = {}
+        while (chunk := inbox.get()) is not None:
+            for pair_id, timestamp, card_id in zip(*chunk):
+                tracker = trackers.get(card_id)
+                if tracker is None:
+                    tracker = trackers[card_id] = fare_rules.new_tracker()
+                    card_totals[card_id] = 0
+                journey = Journey(pair_id, timestamp, card_id)
+                card_totals[card_id] += tracker.add_journey(journey)
+        outbox.put((None, card_totals))
+    except Exception as e:
+        outbox.put((f"{type(e).__name__}: {e}", None))
+        # Keep draining so the parent never blocks on a full queue
+        while inbox.get() is not None:
+            pass
+
+
+def _new_chunk():
+    return array("q"), array("q"), []
+
+
+def _check_workers(processes):
+    """Raise if a worker has died, e.g. killed by a signal or out of memory."""
+    for process in processes:
+        if process.exitcode not in (None, 0):
+            raise RuntimeError(
+                f"Fare calculation worker {process.pid} died with exit code "
+                f"{process.exitcode}."
+            )
+
+
+def _put(inbox, item, processes):
+    """Send `item` to a worker, failing instead of blocking if a worker died."""
+    while True:
+        try:
+            return inbox.put(item, timeout=LIVENESS_INTERVAL)
+        except queue.Full:
+            _check_workers(processes)
+
+
+def _get(outbox, processes):
+    """Receive a worker's result, failing instead of blocking if a worker died."""
+    while True:
+        try:
+            return outbox.get(timeout=LIVENESS_INTERVAL)
+        except queue.Empty:
+            _check_workers(processes)
+
+
+def calculate_card_total_fares_parallel(config, journeys, presorted=False, workers=2):
+    """Calculate the total fare of every card, sharding cards across processes.
+
+    Each card always goes to the same worker, which keeps its own trackers and
+    receives that card's journeys in time order, so the totals are identical to
+    `main.calculate_card_total_fares`. A `RuntimeError` is raised if a worker
+    fails or dies. Each card's worker is looked up in a dict after its first
+    journey, so the parent does little more per journey than append it to the
+    columns of its worker's next chunk.
+    """
+    logging.info(
+        f"Starting fare calculation for a batch of cards on {workers} workers."
+    )
+
+    context = multiprocessing.get_context()
+    outbox = context.Queue()
+    inboxes = [context.Queue(MAX_QUEUED_CHUNKS) for _ in range(workers)]
+    processes = [
+        context.Process(target=_price_partition, args=(config, inbox, outbox))
+        for inbox in inboxes
+    ]
+    for process in processes:
+        process.start()
+
+    finished = False
+    try:
+        if not presorted:
+            journeys = sorted(journeys, key=attrgetter("timestamp"))
+        partitions = {}
+        chunks = [_new_chunk() for _ in range(workers)]
+        previous = None
+        for position, journey in enumerate(journeys, start=1):
+            timestamp = journey.timestamp
+            if previous is not None and timestamp < previous.timestamp:
+                raise JourneyOrderError(
+                    f"Journey #{position} at {journey.date_time} is earlier than "
+                    f"the journey before it at {previous.date_time}; "
+                    "input is not in time order."
+                )
+            previous = journey
+
+            card_id = journey.card_id
+            partition = partitions.get(card_id)
+            if partition is None:
+                partition = partitions[card_id] = card_partition(card_id, workers)
+            pair_ids, timestamps, card_ids = chunk = chunks[partition]
+            pair_ids.append(journey.pair_id)
+            timestamps.append(timestamp)
+            card_ids.append(card_id)
+            if len(card_ids) >= CHUNK_SIZE:
+                _put(inboxes[partition], chunk, processes)
+                chunks[partition] = _new_chunk()
+
+        for inbox, chunk in zip(inboxes, chunks):
+            if chunk[2]:
+                _put(inbox, chunk, processes)
+            _put(inbox, None, processes)
+
+        card_totals = {}
+        for _ in processes:
+            error, partition_totals = _get(outbox, processes)
+            if error is not None:
+                raise RuntimeError(f"Fare calculation worker failed: {error}")
+            card_totals.update(partition_totals)
+        finished = True
+    finally:
+        for process in processes:
+            if not finished:
+                process.terminate()
+            process.join()
+
+    logging.info(f"Calculated fares for {len(card_totals)} cards.")
+    return card_totals
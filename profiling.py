@@ -0,0 +1,97 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class StageTiming:
+    """Wall time, CPU time, rows, bytes and peak traced memory of a stage of a run."""
+
+    __slots__ = ("name", "wall", "cpu", "rows", "data_bytes", "peak_memory")
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.rows = rows
+        # Bytes of input the stage went through, if it reads any
+        self.data_bytes = None
+        self.peak_memory = None
+
+
+class StageTimer:
+    """Time the stages of a run, optionally tracing peak memory with tracemalloc.
+
+    Each `stage` block adds a `StageTiming`; the caller can set its `rows` once
+    they are known. CPU time only covers this process, not worker processes.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        timing = StageTiming(name, rows)
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        wall_started = time.perf_counter()
+        cpu_started = time.process_time()
+        try:
+            yield timing
+        finally:
+            timing.wall = time.perf_counter() - wall_started
+            timing.cpu = time.process_time() - cpu_started
+            if self.trace_memory:
+                timing.peak_memory = tracemalloc.get_traced_memory()[1]
+            self.stages.append(timing)
+
+    def split(self, timing, name, wall, cpu):
+        """Move `wall` and `cpu` seconds of a finished stage into a new stage.
+
+        The new stage is recorded just before `timing`, with the same rows and
+        bytes, so work done inside a stage, such as decompressing its input, is
+        reported on its own without being counted twice in the total.
+        """
+        part = StageTiming(name, timing.rows)
+        part.wall = wall
+        part.cpu = cpu
+        part.data_bytes = timing.data_bytes
+        timing.wall = max(timing.wall - wall, 0.0)
+        timing.cpu = max(timing.cpu - cpu, 0.0)
+        self.stages.insert(self.stages.index(timing), part)
+        return part
+
+    def stop(self):
+        """Stop tracing memory, if this timer started it."""
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def report(self):
+        """Format the stages as a table, with a total row at the end."""
+        header = f"{'stage':<20}{'wall (s)':>10}{'cpu (s)':>10}{'rows/sec':>14}"
+        show_bytes = any(timing.data_bytes is not None for timing in self.stages)
+        if show_bytes:
+            header += f"{'MB/s':>10}"
+        if self.trace_memory:
+            header += f"{'peak mem':>12}"
+        lines = [header]
+        for timing in self.stages:
+            rate = "-"
+            if timing.rows is not None and timing.wall > 0:
+                rate = f"{timing.rows / timing.wall:,.0f}"
+            line = f"{timing.name:<20}{timing.wall:>10.3f}{timing.cpu:>10.3f}"
+            line += f"{rate:>14}"
+            if show_bytes:
+                rate = "-"
+                if timing.data_bytes is not None and timing.wall > 0:
+                    rate = f"{timing.data_bytes / timing.wall / 1024**2:,.1f}"
+                line += f"{rate:>10}"
+            if self.trace_memory:
+                line += f"{timing.peak_memory / 1024**2:>11.1f}M"
+            lines.append(line)
+        wall = sum(timing.wall for timing in self.stages)
+        cpu = sum(timing.cpu for timing in self.stages)
+        lines.append(f"{'total':<20}{wall:>10.3f}{cpu:>10.3f}")
+        return "\n".join(lines)
@@ -0,0 +1,70 @@
+import csv
+import io
+
+REJECT_FIELDS = ("file", "line", "reason", "row")
+
+
+def format_row(fields):
+    """Write parsed CSV fields back as one CSV line, quoting them where needed."""
+    line = io.StringIO()
+    csv.writer(line, lineterminator="").writerow(fields)
+    return line.getvalue()
+
+
+class RejectList:
+    """Collect rejected input rows in memory, e.g. in a worker process.
+
+    Each row is kept as a (file, line number, reason, raw row) tuple.
+    """
+
+    def __init__(self):
+        self.rows = []
+
+    @property
+    def count(self):
+        return len(self.rows)
+
+    def record(self, file_path, line_number, reason, row):
+        self.rows.append((file_path, line_number, reason, row))
+
+    def reset(self):
+        """Discard everything recorded so far, e.g. before reading again."""
+        self.rows.clear()
+
+
+class RejectWriter(RejectList):
+    """Write rejected input rows to a CSV file as they are found.
+
+    Every row goes straight to the file with its source file, line number and
+    the reason it was rejected, so the rejects of an interrupted run are kept.
+    `count` is the number of rows written.
+    """
+
+    def __init__(self, file_path):
+        self._file = open(file_path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._count = 0
+        self._writer.writerow(REJECT_FIELDS)
+
+    @property
+    def count(self):
+        return self._count
+
+    def record(self, file_path, line_number, reason, row):
+        self._writer.writerow((file_path, line_number, reason, row))
+        self._count += 1
+
+    def reset(self):
+        self._file.seek(0)
+        self._file.truncate()
+        self._writer.writerow(REJECT_FIELDS)
+        self._count = 0
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,325 @@
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+
+from checkpoint import PricingState
+from config_loader import ConfigLoader
+from constants import LOG_FORMAT
+from fare_system import FareRules
+from journey import check_header, validate_csv_data
+from settings import BASE_DIR
+from utils import resolve_path
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Longest request line accepted, which bounds the size of a batch
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+
+class FareService:
+    """Price journeys one request at a time against resident pricing state.
+
+    The compiled rules and every card's tracker stay in memory between requests,
+    so a journey costs one validation and one `add_journey` call. Journeys of
+    the same card must arrive in time order.
+    """
+
+    def __init__(self, fare_rules, state=None):
+        self.fare_rules = fare_rules
+        self.state = state if state is not None else PricingState(fare_rules)
+        # Time of each card's latest journey, to reject ones from the past
+        self._last_timestamps = {}
+
+    def charge(self, request):
+        """Charge one journey request and return the fare."""
+        card_id = request.get("card_id")
+        journey = validate_csv_data(
+            (request["from_line"], request["to_line"], request["date_time"]),
+            self.fare_rules.line_pairs,
+            card_id,
+        )
+
+        last_timestamp = self._last_timestamps.get(journey.card_id)
+        if last_timestamp is None:
+            last_timestamp = self.state.last_timestamp
+        if last_timestamp is not None and journey.timestamp < last_timestamp:
+            raise ValueError(
+                f"Journey at {journey.date_time} is earlier than the previous "
+                "journey of this card."
+            )
+
+        tracker = self.state.trackers.get(journey.card_id)
+        if tracker is None:
+            tracker = self.state.trackers[
+                journey.card_id
+            ] = self.fare_rules.new_tracker()
+        fare = tracker.add_journey(journey)
+        self._last_timestamps[journey.card_id] = journey.timestamp
+        return fare
+
+    def _result(self, request):
+        try:
+            return {"fare": self.charge(request)}
+        except KeyError as e:
+            return {"error": f"Missing {e}."}
+        except (TypeError, ValueError, AttributeError) as e:
+            return {"error": str(e)}
+
+    def handle(self, message):
+        """Answer one decoded request, a single journey or a batch of them.
+
+        A request with `"journeys": [...]` is answered with `"results"`, one
+        result per journey in order; otherwise the request is itself a journey.
+        Each result is either `{"fare": ...}` or `{"error": ...}`, and the
+        request's `id`, if any, is echoed back.
+        """
+        if not isinstance(message, dict):
+            return {"error": "Request must be a JSON object."}
+        journeys = message.get("journeys")
+        if journeys is not None and not isinstance(journeys, list):
+            response = {"error": "'journeys' must be a list."}
+        elif journeys is not None:
+            response = {"results": [self._result(journey) for journey in journeys]}
+        else:
+            response = self._result(message)
+        if "id" in message:
+            response["id"] = message["id"]
+        return response
+
+    def save_checkpoint(self, file_path):
+        """Save every card's tracker to a checkpoint, see `PricingState.save`.
+
+        The checkpoint's last journey time is the latest journey of any card, so
+        a run resumed from it only accepts journeys after that.
+        """
+        if self._last_timestamps:
+            latest = max(self._last_timestamps.values())
+            if self.state.last_timestamp is None or latest > self.state.last_timestamp:
+                self.state.last_timestamp = latest
+        self.state.save(file_path)
+
+
+async def handle_connection(service, reader, writer):
+    """Answer line-delimited JSON requests until the client disconnects."""
+    try:
+        while line := await reader.readline():
+            try:
+                response = service.handle(json.loads(line))
+            except json.JSONDecodeError as e:
+                response = {"error": f"Invalid JSON: {e}"}
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+    except (ConnectionError, asyncio.LimitOverrunError, ValueError) as e:
+        logging.warning(f"Closing connection: {e}")
+    finally:
+        writer.close()
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None):
+    """Serve fare requests until SIGINT or SIGTERM is received."""
+
+    async def handler(reader, writer):
+        await handle_connection(service, reader, writer)
+
+    if unix_socket:
+        server = await asyncio.start_unix_server(
+            handler, unix_socket, limit=MAX_LINE_BYTES
+        )
+        address = unix_socket
+    else:
+        server = await asyncio.start_server(handler, host, port, limit=MAX_LINE_BYTES)
+        address = "{}:{}".format(*server.sockets[0].getsockname()[:2])
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:  # e.g. on Windows
+            pass
+
+    logging.info(f"Fare server listening on {address}.")
+    print(f"Listening on {address}", flush=True)
+    async with server:
+        await stop.wait()
+    logging.info("Fare server stopped.")
+
+
+class FareClient:
+    """Blocking client for the fare server, for local use and testing."""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None):
+        if unix_socket:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(unix_socket)
+        else:
+            self._socket = socket.create_connection((host, port))
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._socket.makefile("rwb")
+
+    def request(self, message):
+        """Send one request and return the decoded response."""
+        self._file.write(json.dumps(message).encode() + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("The fare server closed the connection.")
+        return json.loads(line)
+
+    def charge(self, from_line, to_line, date_time, card_id=None):
+        """Return the fare for one journey, raising `ValueError` if rejected."""
+        message = {"from_line": from_line, "to_line": to_line, "date_time": date_time}
+        if card_id is not None:
+            message["card_id"] = card_id
+        response = self.request(message)
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response["fare"]
+
+    def charge_batch(self, journeys):
+        """Send a batch of journey dicts and return their results in order."""
+        return self.request({"journeys": journeys})["results"]
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def charge_csv(client, file_path, batch_size=1000):
+    """Charge every journey of a journey CSV through the server.
+
+    Rows are sent in batches of `batch_size` and must be in time order for each
+    card. Returns the total fare, raising `ValueError` at the first rejected row.
+    """
+    total_fare = 0
+    with open(resolve_path(file_path), newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        check_header(header)
+
+        rows = [dict(zip(header, row)) for row in reader]
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start : start + batch_size]
+        for row, result in zip(batch, client.charge_batch(batch)):
+            if "error" in result:
+                raise ValueError(f"{row}: {result['error']}")
+            total_fare += result["fare"]
+    return total_fare
+
+
+def parse_args(argv=None):
+    """Parse fare server arguments."""
+    parser = argparse.ArgumentParser(
+        description="Serve fares for single journeys over line-delimited JSON."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="Run the fare server.")
+    client_parser = commands.add_parser(
+        "client", help="Charge the journeys of a CSV file through a running server."
+    )
+    for command in (serve_parser, client_parser):
+        command.add_argument(
+            "--host", type=str, default=DEFAULT_HOST, help="Server address."
+        )
+        command.add_argument(
+            "--port", type=int, default=DEFAULT_PORT, help="Server TCP port."
+        )
+        command.add_argument(
+            "--unix-socket",
+            type=str,
+            default=None,
+            help="Use this Unix socket path instead of TCP.",
+        )
+
+    serve_parser.add_argument(
+        "--config-filepath",
+        type=str,
+        default=os.path.join(BASE_DIR, "config.json"),
+        help="Path to the configuration file",
+    )
+    serve_parser.add_argument(
+        "--config-cache",
+        type=str,
+        default=None,
+        help="Directory to cache the compiled configuration in.",
+    )
+    serve_parser.add_argument(
+        "--resume-from",
+        type=str,
+        default=None,
+        help="Start from the tracker state in this checkpoint file.",
+    )
+    serve_parser.add_argument(
+        "--checkpoint-to",
+        type=str,
+        default=None,
+        help="Save the tracker state to this checkpoint file on shutdown.",
+    )
+    serve_parser.add_argument(
+        "--log-level",
+        type=str,
+        default="INFO",
+        choices=["DEBUG", "INFO", "CRITICAL"],
+        help="Set the logging level",
+    )
+
+    client_parser.add_argument(
+        "--filepath", type=str, required=True, help="Path to the input CSV file"
+    )
+    client_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Journeys sent per request. Default is 1000.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == "client":
+        try:
+            with FareClient(args.host, args.port, args.unix_socket) as client:
+                total_fare = charge_csv(client, args.filepath, args.batch_size)
+        except (OSError, ValueError) as e:
+            print(f"An error occurred: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Total Fare: ${total_fare}")
+        return
+
+    logging.basicConfig(level=args.log_level, format=LOG_FORMAT)
+    try:
+        config_loader = ConfigLoader(resolve_path(args.config_filepath))
+        if args.config_cache:
+            fare_rules = config_loader.load_compiled(resolve_path(args.config_cache))
+        else:
+            fare_rules = FareRules(config_loader.load_config())
+        state = None
+        if args.resume_from:
+            state = PricingState.load(fare_rules, resolve_path(args.resume_from))
+    except Exception as e:
+        logging.critical(f"An error occurred: {str(e)}")
+        sys.exit(1)
+
+    service = FareService(fare_rules, state)
+    asyncio.run(serve(service, args.host, args.port, args.unix_socket))
+    if args.checkpoint_to:
+        service.save_checkpoint(resolve_path(args.checkpoint_to))
+        logging.info(f"Saved tracker state to {args.checkpoint_to}.")
+
+
+if __name__ == "__main__":
+    main()
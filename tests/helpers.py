@@ -0,0 +1,37 @@
+import json
+import logging
+import tempfile
+import unittest
+from fare_system import FareRules
+from main import calculate_card_total_fares, price_csv
+
+CONFIG_PATH = "tests/data/test_config.json"
+CSV_PATH = "tests/data/batch_two_cards_128.csv"
+
+
+def as_tuples(journeys):
+    return [(j.pair_id, j.timestamp, j.card_id) for j in journeys]
+
+
+class PricingTestCase(unittest.TestCase):
+    """Loads the test configuration and gives each test a temporary directory.
+
+    Logging is disabled for the duration of the test.
+    """
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        with open(CONFIG_PATH) as f:
+            self.config = json.load(f)
+        self.fare_rules = FareRules(self.config)
+        self.line_pairs = self.fare_rules.line_pairs
+
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+
+    def price(self, file_path, calculate=calculate_card_total_fares, **kwargs):
+        return price_csv(
+            self.config, file_path, self.line_pairs, calculate=calculate, **kwargs
+        )
@@ -0,0 +1,154 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import benchmark
+import main
+from fare_system import LinePairIndex, PeakHoursChecker
+
+
+class TestBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.config_path = "tests/data/test_config.json"
+        with open(self.config_path) as f:
+            self.config = json.load(f)
+        self.line_pairs = LinePairIndex(self.config["fare_chart"])
+
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.file_path = os.path.join(temp_dir.name, "journeys.csv")
+
+    def test_generate_journeys_is_deterministic(self):
+        rows = list(benchmark.generate_journeys(self.config, 500, seed=3))
+        self.assertEqual(len(rows), 500)
+        self.assertEqual(rows, list(benchmark.generate_journeys(self.config, 500, 3)))
+        self.assertNotEqual(rows, list(benchmark.generate_journeys(self.config, 500)))
+
+    def test_generated_journeys_are_valid_and_peak_skewed(self):
+        rows = list(benchmark.generate_journeys(self.config, 2000, cards=10))
+        journeys = [
+            main.validate_csv_data(row[1:], self.line_pairs, row[0]) for row in rows
+        ]
+        peak_hours_checker = PeakHoursChecker(self.config["peak_hours"])
+
+        timestamps = [journey.timestamp for journey in journeys]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual({journey.pair_id for journey in journeys}, set(range(4)))
+        self.assertLessEqual(len({journey.card_id for journey in journeys}), 10)
+        peak = sum(peak_hours_checker.is_peak(j.minute_of_week) for j in journeys)
+        self.assertGreater(peak / len(journeys), 0.4)
+
+    def test_run_benchmark_matches_main(self):
+        for cards, calculate in (
+            (0, main.calculate_user_total_fare),
+            (5, main.calculate_card_total_fares),
+        ):
+            with self.subTest(cards=cards):
+                benchmark.write_journeys_csv(
+                    self.file_path, self.config, 1000, seed=1, cards=cards
+                )
+                with patch.object(main.logging, "info"):
+                    results, total = benchmark.run_benchmark(
+                        self.config_path, self.file_path
+                    )
+                    expected = main.price_csv(
+                        self.config,
+                        self.file_path,
+                        self.line_pairs,
+                        calculate=calculate,
+                    )
+
+                self.assertEqual(total, expected)
+                self.assertEqual(
+                    [result[0] for result in results],
+                    ["load_config", "read_csv", "sort", "calculate"],
+                )
+                self.assertTrue(all(rows == 1000 for _, _, rows, _ in results[1:]))
+                self.assertIn("rows/sec", benchmark.format_results(results))
+
+    def test_benchmark_timestamps(self):
+        rows = benchmark.generate_journeys(self.config, 500)
+        results = benchmark.benchmark_timestamps([row[-1] for row in rows])
+        self.assertEqual(
+            [result[0] for result in results], ["strptime", "fixed_format"]
+        )
+        self.assertTrue(all(rows == 500 for _, _, rows, _ in results))
+        self.assertIn("speedup", benchmark.format_speedup(results))
+
+        with self.assertRaises(ValueError):
+            benchmark.benchmark_timestamps(["2023-09-11T25:00:00"])
+
+
+class TestBenchmarkHistory(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.history_path = os.path.join(temp_dir.name, "bench", "history.json")
+
+    def make_record(self, revision, calculate_seconds, machine_id="m1"):
+        results = [
+            ("read_csv", 1.0, 1000, None),
+            ("validate", 1.0, 1000, None),
+            ("calculate", calculate_seconds, 1000, None),
+        ]
+        with patch.object(benchmark, "git_revision", return_value=revision):
+            record = benchmark.make_record(results, "generated rows=1000")
+        record["machine"]["id"] = machine_id
+        return record
+
+    def test_save_and_load_history(self):
+        self.assertEqual(benchmark.load_history(self.history_path), [])
+        for revision in ("abc", "def"):
+            benchmark.save_record(self.history_path, self.make_record(revision, 1.0))
+
+        history = benchmark.load_history(self.history_path)
+        self.assertEqual([record["revision"] for record in history], ["abc", "def"])
+        self.assertEqual(history[0]["stages"]["calculate"]["rows"], 1000)
+        self.assertIn("cpu_count", history[0]["machine"])
+
+    def test_select_records(self):
+        history = [
+            self.make_record("abc", 1.0),
+            self.make_record("bcd", 1.0),
+            self.make_record("xyz", 1.0, machine_id="m2"),
+            self.make_record("cde", 1.0),
+        ]
+
+        baseline, candidate = benchmark.select_records(history, "m1")
+        self.assertEqual((baseline["revision"], candidate["revision"]), ("bcd", "cde"))
+        baseline, _ = benchmark.select_records(history, "m1", baseline="ab")
+        self.assertEqual(baseline["revision"], "abc")
+
+        with self.assertRaises(ValueError):
+            benchmark.select_records(history, "m2")
+        with self.assertRaises(ValueError):
+            benchmark.select_records(history, "m1", baseline="xyz")
+
+    def test_compare_flags_stage_regressions(self):
+        baseline = self.make_record("abc", 1.0)
+        comparison = benchmark.compare_records(
+            baseline, self.make_record("bcd", 1.05), 0.1
+        )
+        self.assertFalse(any(result[-1] for result in comparison))
+
+        # Every stage the baseline recorded is watched, validate included
+        baseline["stages"]["validate"]["seconds"] = 0.5
+        comparison = benchmark.compare_records(
+            baseline, self.make_record("bcd", 1.5), 0.1
+        )
+        regressed = [result[0] for result in comparison if result[-1]]
+        self.assertEqual(regressed, ["validate", "calculate"])
+
+        # Stages only one of the runs recorded are not compared
+        del baseline["stages"]["read_csv"]
+        comparison = benchmark.compare_records(
+            baseline, self.make_record("bcd", 1.0), 0.1
+        )
+        self.assertEqual(
+            [result[0] for result in comparison], ["validate", "calculate"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
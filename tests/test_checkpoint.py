@@ -0,0 +1,100 @@
+import os
+import random
+import unittest
+import main
+from checkpoint import CheckpointError, PricingState
+from helpers import PricingTestCase
+from journey import Journey
+
+
+class TestPricingState(PricingTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(11)
+        start = 1694390400  # 2023-09-11T00:00:00, a Monday
+        self.journeys = sorted(
+            (
+                Journey(
+                    rng.randrange(len(self.fare_rules.line_pairs)),
+                    start + rng.randrange(0, 20 * 24 * 3600),
+                    f"card-{rng.randrange(5)}",
+                )
+                for _ in range(600)
+            ),
+            key=lambda journey: journey.timestamp,
+        )
+        self.checkpoint_path = os.path.join(self.temp_dir, "checkpoint.json")
+
+    def test_resumed_runs_match_a_single_run(self):
+        expected = main.calculate_card_total_fares(self.config, self.journeys)
+
+        totals = {}
+        state = PricingState(self.fare_rules)
+        for part in (self.journeys[:150], self.journeys[150:151], self.journeys[151:]):
+            for card_id, total in main.calculate_card_total_fares(
+                self.config, part, state=state
+            ).items():
+                totals[card_id] = totals.get(card_id, 0) + total
+            state.save(self.checkpoint_path)
+            state = PricingState.load(self.fare_rules, self.checkpoint_path)
+
+        self.assertEqual(totals, expected)
+        self.assertEqual(state.last_timestamp, self.journeys[-1].timestamp)
+
+    def test_single_card_resume(self):
+        journeys = [Journey(j.pair_id, j.timestamp) for j in self.journeys]
+        expected = main.calculate_user_total_fare(self.config, journeys)
+
+        state = PricingState(self.fare_rules)
+        total = main.calculate_user_total_fare(self.config, journeys[:300], state=state)
+        state = PricingState(self.fare_rules, state.to_checkpoint())
+        total += main.calculate_user_total_fare(
+            self.config, journeys[300:], state=state
+        )
+        self.assertEqual(total, expected)
+
+    def test_checkpoint_leaves_out_past_weeks(self):
+        state = PricingState(self.fare_rules)
+        main.calculate_card_total_fares(self.config, self.journeys, state=state)
+
+        for card in state.to_checkpoint()["cards"]:
+            for last_day, _, _ in card["fares"].values():
+                self.assertGreaterEqual(last_day, card["week_start_day"])
+
+    def test_earlier_journey_is_rejected(self):
+        state = PricingState(self.fare_rules)
+        main.calculate_card_total_fares(self.config, self.journeys[100:], state=state)
+
+        with self.assertRaises(CheckpointError):
+            main.calculate_card_total_fares(
+                self.config, self.journeys[:100], state=state
+            )
+
+    def test_invalid_checkpoints(self):
+        state = PricingState(self.fare_rules)
+        main.calculate_card_total_fares(self.config, self.journeys, state=state)
+        checkpoint = state.to_checkpoint()
+
+        with self.assertRaises(CheckpointError):
+            PricingState(self.fare_rules, dict(checkpoint, version=99))
+
+        checkpoint["cards"][0]["fares"]["blue,blue"] = [0, 0, 0]
+        with self.assertRaises(CheckpointError):
+            PricingState(self.fare_rules, checkpoint)
+
+        with self.assertRaises(CheckpointError):
+            PricingState.load(self.fare_rules, self.checkpoint_path)
+
+    def test_reset_restores_the_loaded_state(self):
+        state = PricingState(self.fare_rules)
+        main.calculate_card_total_fares(self.config, self.journeys[:300], state=state)
+        checkpoint = state.to_checkpoint()
+
+        state = PricingState(self.fare_rules, checkpoint)
+        main.calculate_card_total_fares(self.config, self.journeys[300:], state=state)
+        state.reset()
+        self.assertEqual(state.to_checkpoint(), checkpoint)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import unittest
+from unittest.mock import patch
+import columnar
+from fare_system import FareRules
+from helpers import CONFIG_PATH, CSV_PATH, PricingTestCase, as_tuples
+from journey import in_time_order
+from main import calculate_user_total_fare, price_csv, read_csv
+from vectorized import calculate_user_total_fare_vectorized, np
+
+
+class TestColumnar(PricingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.file_path = os.path.join(self.temp_dir, "journeys.jrny")
+
+    def convert(self, csv_path):
+        journeys = read_csv(csv_path, self.line_pairs)
+        columnar.write_columns(self.file_path, journeys, self.line_pairs)
+        return journeys
+
+    def test_round_trip(self):
+        for csv_path in (
+            "tests/data/simulate_multiple_day_cap_restart_298.csv",
+            CSV_PATH,
+        ):
+            with self.subTest(csv_path=csv_path):
+                journeys = self.convert(csv_path)
+                self.assertTrue(columnar.is_columnar(self.file_path))
+                self.assertFalse(columnar.is_columnar(csv_path))
+                columns = read_csv(self.file_path, self.line_pairs)
+                self.assertEqual(len(columns), len(journeys))
+                self.assertEqual(
+                    as_tuples(columns),
+                    sorted(as_tuples(journeys), key=lambda row: row[1]),
+                )
+
+    def test_prices_like_the_csv(self):
+        csv_path = "tests/data/simulate_2_week_cap_restart_115.csv"
+        self.convert(csv_path)
+        for stream in (False, True):
+            with self.subTest(stream=stream):
+                self.assertEqual(
+                    price_csv(self.config, self.file_path, self.line_pairs, stream),
+                    price_csv(self.config, csv_path, self.line_pairs, stream),
+                )
+
+        self.convert(CSV_PATH)
+        self.assertEqual(self.price(self.file_path), self.price(CSV_PATH))
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_numpy_engine_uses_the_columns(self):
+        self.convert("tests/data/simulate_multiple_day_cap_restart_298.csv")
+        columns = columnar.read_columns(self.file_path, self.line_pairs)
+        with patch.object(columnar.JourneyColumns, "__iter__") as iterate:
+            total_fare = calculate_user_total_fare_vectorized(
+                self.config, columns, presorted=True
+            )
+        iterate.assert_not_called()
+        self.assertEqual(
+            total_fare, calculate_user_total_fare(self.config, columns, presorted=True)
+        )
+
+    def test_pairs_resolved_by_name(self):
+        self.convert("tests/data/test.csv")
+        # A new pair that sorts first shifts the IDs of all the others
+        extended = dict(self.config)
+        extended["fare_chart"] = {"blue,blue": {"peak": 1, "non_peak": 1}}
+        extended["fare_chart"].update(self.config["fare_chart"])
+        extended["cap_chart"] = {"blue,blue": {"daily": 1, "weekly": 1}}
+        extended["cap_chart"].update(self.config["cap_chart"])
+        line_pairs = FareRules(extended).line_pairs
+        self.assertNotEqual(line_pairs.keys, self.line_pairs.keys)
+        expected = in_time_order(read_csv("tests/data/test.csv", line_pairs))
+        self.assertEqual(
+            [line_pairs.keys[j.pair_id] for j in read_csv(self.file_path, line_pairs)],
+            [line_pairs.keys[j.pair_id] for j in expected],
+        )
+
+        missing = dict(self.config)
+        missing["fare_chart"] = dict(list(self.config["fare_chart"].items())[:1])
+        missing["cap_chart"] = dict(list(self.config["cap_chart"].items())[:1])
+        with self.assertRaisesRegex(ValueError, "Invalid journey combination"):
+            read_csv(self.file_path, FareRules(missing).line_pairs)
+
+    def test_batch_must_match_the_cards(self):
+        for csv_path, batch, message in (
+            (CSV_PATH, False, "has card IDs"),
+            ("tests/data/test.csv", True, "has no card IDs"),
+        ):
+            with self.subTest(csv_path=csv_path):
+                self.convert(csv_path)
+                self.assertEqual(
+                    len(read_csv(self.file_path, self.line_pairs, batch=not batch)),
+                    len(read_csv(csv_path, self.line_pairs)),
+                )
+                with self.assertRaisesRegex(ValueError, message):
+                    read_csv(self.file_path, self.line_pairs, batch=batch)
+
+    def test_truncated_file(self):
+        self.convert("tests/data/test.csv")
+        with open(self.file_path, "r+b") as f:
+            f.truncate(os.path.getsize(self.file_path) - 64)
+        with self.assertRaises(ValueError):
+            columnar.read_columns(self.file_path, self.line_pairs)
+
+    def test_convert_command(self):
+        config_path = os.path.abspath(CONFIG_PATH)
+        with patch("builtins.print") as mock_print:
+            columnar.main(
+                [
+                    "convert",
+                    os.path.abspath("tests/data/test.csv"),
+                    self.file_path,
+                    f"--config-filepath={config_path}",
+                    "--reader=mmap",
+                ]
+            )
+        mock_print.assert_called_once_with(f"Wrote 100 journeys to {self.file_path}.")
+        self.assertEqual(
+            price_csv(self.config, self.file_path, self.line_pairs),
+            price_csv(self.config, "tests/data/test.csv", self.line_pairs),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import bz2
+import gzip
+import lzma
+import os
+import unittest
+from columnar import write_columns
+from compression import DecompressionStats, detect_compression, open_input
+from helpers import CSV_PATH, PricingTestCase, as_tuples
+from main import read_csv
+from profiling import StageTimer
+
+
+class TestCompressedInput(PricingTestCase):
+    def setUp(self):
+        super().setUp()
+        with open(CSV_PATH, "rb") as f:
+            self.data = f.read()
+
+    def compress(self, module, data=None, name="journeys"):
+        """Write the data compressed with `module`, under a misleading name."""
+        file_path = os.path.join(self.temp_dir, f"{name}_{module.__name__}.csv")
+        with module.open(file_path, "wb") as f:
+            f.write(self.data if data is None else data)
+        return file_path
+
+    def test_detect_and_open(self):
+        self.assertIsNone(detect_compression(CSV_PATH))
+        for module, name in ((gzip, "gzip"), (bz2, "bz2"), (lzma, "xz")):
+            with self.subTest(name=name):
+                file_path = self.compress(module)
+                self.assertEqual(detect_compression(file_path), name)
+                stats = DecompressionStats()
+                with open_input(file_path, stats=stats) as f:
+                    self.assertEqual(f.read(), self.data)
+                self.assertEqual(stats.format, name)
+                self.assertEqual(stats.decompressed_bytes, len(self.data))
+                with open_input(file_path, text=True) as f:
+                    self.assertEqual(f.read(), self.data.decode())
+
+    def test_read_csv_decompresses(self):
+        expected = as_tuples(read_csv(CSV_PATH, self.line_pairs))
+        for module in (gzip, bz2, lzma):
+            file_path = self.compress(module)
+            for reader in ("csv", "mmap"):
+                with self.subTest(module=module.__name__, reader=reader):
+                    for stream in (False, True):
+                        journeys = read_csv(file_path, self.line_pairs, stream, reader)
+                        self.assertEqual(as_tuples(journeys), expected)
+
+    def test_read_columnar_decompresses(self):
+        journeys = read_csv(CSV_PATH, self.line_pairs)
+        columnar_path = os.path.join(self.temp_dir, "journeys.jrny")
+        write_columns(columnar_path, journeys, self.line_pairs)
+        with open(columnar_path, "rb") as f:
+            file_path = self.compress(gzip, f.read(), name="columnar")
+
+        self.assertEqual(
+            sorted(as_tuples(read_csv(file_path, self.line_pairs))),
+            sorted(as_tuples(journeys)),
+        )
+
+    def test_decompression_is_timed_separately(self):
+        file_path = self.compress(lzma)
+        for stream, max_memory, stage in (
+            (False, None, "read_csv"),
+            (True, None, "read_and_calculate"),
+            (False, 1024**2, "external_sort_and_calculate"),
+        ):
+            with self.subTest(stage=stage):
+                timer = StageTimer()
+                self.price(file_path, stream=stream, max_memory=max_memory, timer=timer)
+                names = [timing.name for timing in timer.stages]
+                self.assertEqual(names[:2], ["decompress_xz", stage])
+                decompress, read = timer.stages[:2]
+                self.assertEqual(decompress.data_bytes, len(self.data))
+                self.assertEqual(read.data_bytes, len(self.data))
+                self.assertIn("MB/s", timer.report())
+
+        timer = StageTimer()
+        self.price(CSV_PATH, timer=timer)
+        self.assertEqual(
+            [timing.name for timing in timer.stages], ["read_csv", "sort", "calculate"]
+        )
+        self.assertNotIn("MB/s", timer.report())
+
+    def test_corrupt_file(self):
+        file_path = self.compress(gzip)
+        with open(file_path, "r+b") as f:
+            f.truncate(os.path.getsize(file_path) // 2)
+        with self.assertRaises(EOFError):
+            read_csv(file_path, self.line_pairs)
+
+
+if __name__ == "__main__":
+    unittest.main()
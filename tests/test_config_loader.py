@@ -1,3 +1,8 @@
+import logging
+import os
+import pickle
+import shutil
+import tempfile
 import unittest
 from unittest.mock import patch, mock_open
 from config_loader import (
@@ -5,6 +10,7 @@ from config_loader import (
     InvalidStructureError,
     InvalidLineToLineCombinationError,
 )
+from fare_system import FareRules
 import json
 
 
@@ -466,5 +472,85 @@ class TestConfigLoader(unittest.TestCase):
             )
 
 
+class TestCompiledConfigCache(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache_dir = os.path.join(temp_dir.name, "cache")
+        self.config_path = os.path.join(temp_dir.name, "config.json")
+        shutil.copy("tests/data/test_config.json", self.config_path)
+
+    def load(self):
+        with patch.object(logging, "warning") as mock_warning:
+            fare_rules = ConfigLoader(self.config_path).load_compiled(self.cache_dir)
+        return fare_rules, mock_warning
+
+    def test_cache_is_written_then_used(self):
+        fare_rules, _ = self.load()
+        self.assertIsInstance(fare_rules, FareRules)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        with patch.object(ConfigLoader, "_validate_config") as mock_validate:
+            cached_rules, _ = self.load()
+        mock_validate.assert_not_called()
+        self.assertEqual(cached_rules.line_pairs.keys, fare_rules.line_pairs.keys)
+        self.assertEqual(
+            cached_rules.fare_calculator.fares, fare_rules.fare_calculator.fares
+        )
+        self.assertEqual(
+            cached_rules.fare_cap.weekly_caps, fare_rules.fare_cap.weekly_caps
+        )
+        self.assertEqual(
+            cached_rules.peak_hours_checker.peak_minutes,
+            fare_rules.peak_hours_checker.peak_minutes,
+        )
+
+    def test_changed_config_is_recompiled(self):
+        self.load()
+        with open(self.config_path) as f:
+            config = json.load(f)
+        config["fare_chart"]["green,green"]["peak"] = 99
+        with open(self.config_path, "w") as f:
+            json.dump(config, f)
+
+        fare_rules, _ = self.load()
+        pair_id = fare_rules.line_pairs.lookup("green", "green")
+        self.assertEqual(fare_rules.fare_calculator.fares[pair_id][1], 99)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_corrupt_cache_is_rebuilt(self):
+        self.load()
+        (cache_file,) = os.listdir(self.cache_dir)
+        cache_path = os.path.join(self.cache_dir, cache_file)
+        with open(cache_path, "rb") as f:
+            data = f.read()
+
+        for name, content in (
+            ("not a pickle", b"not a pickle"),
+            ("text", b"garbage\n"),
+            ("truncated", data[: len(data) // 2]),
+            ("empty", b""),
+            ("wrong type", pickle.dumps({"fare_chart": {}})),
+        ):
+            with self.subTest(name):
+                with open(cache_path, "wb") as f:
+                    f.write(content)
+
+                fare_rules, mock_warning = self.load()
+                mock_warning.assert_called_once()
+                self.assertIsInstance(fare_rules, FareRules)
+                fare_rules, mock_warning = self.load()
+                mock_warning.assert_not_called()
+
+    def test_invalid_config_is_not_cached(self):
+        with open(self.config_path, "w") as f:
+            json.dump({"fare_chart": {}}, f)
+
+        with self.assertRaises(InvalidStructureError):
+            with patch.object(logging, "exception"):
+                self.load()
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+
 if __name__ == "__main__":
     unittest.main()
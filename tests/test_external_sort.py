@@ -0,0 +1,37 @@
+import random
+import unittest
+from operator import attrgetter
+from external_sort import external_sort, run_size_for_memory
+from journey import Journey
+
+
+class TestExternalSort(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(42)
+        self.journeys = [
+            Journey(rng.randrange(4), rng.randrange(50), rng.choice([None, "a", "b"]))
+            for _ in range(500)
+        ]
+
+    def as_tuples(self, journeys):
+        return [(j.timestamp, j.pair_id, j.card_id) for j in journeys]
+
+    def test_matches_in_memory_sort(self):
+        expected = sorted(self.journeys, key=attrgetter("timestamp"))
+
+        for run_size in (1, 7, 100, 499, 500, 10_000):
+            with self.subTest(run_size=run_size):
+                result = list(external_sort(iter(self.journeys), run_size))
+                # Timestamps repeat a lot, so this also checks the sort is stable
+                self.assertEqual(self.as_tuples(result), self.as_tuples(expected))
+
+    def test_empty_input(self):
+        self.assertEqual(list(external_sort(iter([]), 10)), [])
+
+    def test_run_size_for_memory(self):
+        self.assertEqual(run_size_for_memory(1), 1)
+        self.assertEqual(run_size_for_memory(200 * 1000), 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
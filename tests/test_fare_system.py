@@ -1,8 +1,15 @@
 import unittest
 from datetime import datetime, timedelta
 from unittest.mock import MagicMock
-from fare_system import FareCalculator, FareCap, PeakHoursChecker, UserJourneyTracker
-from constants import DATE_FORMAT
+from fare_system import (
+    FareCalculator,
+    FareCap,
+    FareRules,
+    LinePairIndex,
+    PeakHoursChecker,
+    UserJourneyTracker,
+)
+from journey import Journey, parse_timestamp
 
 
 class TestPeakHoursChecker(unittest.TestCase):
@@ -36,7 +43,32 @@ class TestPeakHoursChecker(unittest.TestCase):
 
         for datetime_str, expected_result in test_cases:
             with self.subTest(datetime=datetime_str, expected=expected_result):
-                self.assertEqual(peak_checker.is_peak(datetime_str), expected_result)
+                journey = Journey(0, parse_timestamp(datetime_str))
+                self.assertEqual(
+                    peak_checker.is_peak(journey.minute_of_week), expected_result
+                )
+
+    def test_window_boundaries(self):
+        peak_checker = PeakHoursChecker({"monday": [["08:00", "10:00"]]})
+
+        self.assertFalse(peak_checker.is_peak(7 * 60 + 59))
+        self.assertTrue(peak_checker.is_peak(8 * 60))
+        self.assertTrue(peak_checker.is_peak(10 * 60))  # End minute is inclusive
+        self.assertFalse(peak_checker.is_peak(10 * 60 + 1))
+        # The same time on Tuesday has no configured window
+        self.assertFalse(peak_checker.is_peak(24 * 60 + 8 * 60))
+
+
+class TestLinePairIndex(unittest.TestCase):
+    def test_lookup(self):
+        line_pairs = LinePairIndex({"red,green", "green,red", "green,green"})
+
+        self.assertEqual(len(line_pairs), 3)
+        self.assertEqual(line_pairs.keys, ["green,green", "green,red", "red,green"])
+        self.assertEqual(line_pairs.lookup("green", "red"), 1)
+        self.assertEqual(line_pairs.lookup("Green", "RED"), 1)  # Case insensitive
+        self.assertIsNone(line_pairs.lookup("red", "red"))
+        self.assertIsNone(line_pairs.lookup("green", "blue"))
 
 
 class TestFareCalculator(unittest.TestCase):
@@ -53,6 +85,7 @@ class TestFareCalculator(unittest.TestCase):
         self.fare_calculator = FareCalculator(
             self.peak_hours_checker, self.fare_chart_config
         )
+        self.line_pairs = LinePairIndex(self.fare_chart_config)
 
     def test_get_base_fare(self):
         test_cases = [
@@ -80,7 +113,7 @@ class TestFareCalculator(unittest.TestCase):
             ):
                 self.peak_hours_checker.is_peak.return_value = is_peak
                 base_fare = self.fare_calculator.get_base_fare(
-                    from_line, to_line, date_time
+                    Journey.from_row(self.line_pairs, from_line, to_line, date_time)
                 )
                 self.assertEqual(base_fare, expected_fare)
 
@@ -94,6 +127,7 @@ class TestFareCap(unittest.TestCase):
         }
 
         self.fare_cap = FareCap(self.cap_chart_config)
+        self.line_pairs = LinePairIndex(self.cap_chart_config)
 
     def test_apply_daily_cap(self):
         test_cases = [
@@ -137,7 +171,7 @@ class TestFareCap(unittest.TestCase):
         for from_line, to_line, accumulated_daily_fare, daily_cap in test_cases:
             with self.subTest(from_line=from_line, to_line=to_line):
                 result = self.fare_cap.apply_daily_cap(
-                    from_line, to_line, accumulated_daily_fare
+                    self.line_pairs.lookup(from_line, to_line), accumulated_daily_fare
                 )
                 self.assertEqual(result, min(accumulated_daily_fare, daily_cap))
 
@@ -190,7 +224,7 @@ class TestFareCap(unittest.TestCase):
         for from_line, to_line, accumulated_weekly_fare, weekly_cap in test_cases:
             with self.subTest(from_line=from_line, to_line=to_line):
                 result = self.fare_cap.apply_weekly_cap(
-                    from_line, to_line, accumulated_weekly_fare
+                    self.line_pairs.lookup(from_line, to_line), accumulated_weekly_fare
                 )
                 self.assertEqual(result, min(accumulated_weekly_fare, weekly_cap))
 
@@ -236,104 +270,92 @@ class TestUserJourneyTracker(unittest.TestCase):
         # Create a UserJourneyTracker instance with the FareCalculator and FareCap
         self.journey_tracker = UserJourneyTracker(self.fare_calculator, self.fare_cap)
 
+        self.line_pairs = LinePairIndex(self.fare_chart_config)
+
+    def add_journey(self, from_line, to_line, date_time):
+        journey = Journey.from_row(self.line_pairs, from_line, to_line, date_time)
+        return self.journey_tracker.add_journey(journey)
+
     def test_add_journey_single_daily_cap(self):
         peak_time = "2023-09-14T08:00:00"
-        fare1 = self.journey_tracker.add_journey("line1", "line2", peak_time)
-        fare2 = self.journey_tracker.add_journey("line1", "line2", peak_time)
-        fare3 = self.journey_tracker.add_journey("line1", "line2", peak_time)
+        fare1 = self.add_journey("line1", "line2", peak_time)
+        fare2 = self.add_journey("line1", "line2", peak_time)
+        fare3 = self.add_journey("line1", "line2", peak_time)
         self.assertEqual(fare1, 10)
         self.assertEqual(fare2, 10)
         self.assertEqual(fare3, 0)  # Reached daily cap for line1,line2
 
     def test_add_journey_multiple_daily_cap(self):
         peak_time = "2023-09-14T08:00:00"
-        fare1 = self.journey_tracker.add_journey("line1", "line2", peak_time)
-        fare2 = self.journey_tracker.add_journey("line1", "line2", peak_time)
-        fare3 = self.journey_tracker.add_journey("line1", "line2", peak_time)
+        fare1 = self.add_journey("line1", "line2", peak_time)
+        fare2 = self.add_journey("line1", "line2", peak_time)
+        fare3 = self.add_journey("line1", "line2", peak_time)
         self.assertEqual(fare1, 10)
         self.assertEqual(fare2, 10)
         self.assertEqual(fare3, 0)  # Reached daily cap for line1,line2
 
-        fare1 = self.journey_tracker.add_journey("line2", "line3", peak_time)
-        fare2 = self.journey_tracker.add_journey("line2", "line3", peak_time)
-        fare3 = self.journey_tracker.add_journey("line2", "line3", peak_time)
+        fare1 = self.add_journey("line2", "line3", peak_time)
+        fare2 = self.add_journey("line2", "line3", peak_time)
+        fare3 = self.add_journey("line2", "line3", peak_time)
         self.assertEqual(fare1, 12)
         self.assertEqual(fare2, 3)  # Reached partial cap for line2,line3
         self.assertEqual(fare3, 0)  # Reached daily cap for line2,line3
 
     def test_add_journey_daily_cap_reset(self):
         peak_time = "2023-09-14T08:00:00"
-        fare1 = self.journey_tracker.add_journey("line1", "line2", peak_time)
-        fare2 = self.journey_tracker.add_journey("line1", "line2", peak_time)
-        fare3 = self.journey_tracker.add_journey("line1", "line2", peak_time)
+        fare1 = self.add_journey("line1", "line2", peak_time)
+        fare2 = self.add_journey("line1", "line2", peak_time)
+        fare3 = self.add_journey("line1", "line2", peak_time)
         self.assertEqual(fare1, 10)
         self.assertEqual(fare2, 10)
         self.assertEqual(fare3, 0)  # Reached daily cap for line1,line2
 
         peak_time_tomorrow = "2023-09-15T08:00:00"
-        fare1 = self.journey_tracker.add_journey("line1", "line2", peak_time_tomorrow)
-        fare2 = self.journey_tracker.add_journey("line1", "line2", peak_time_tomorrow)
-        fare3 = self.journey_tracker.add_journey("line1", "line2", peak_time_tomorrow)
+        fare1 = self.add_journey("line1", "line2", peak_time_tomorrow)
+        fare2 = self.add_journey("line1", "line2", peak_time_tomorrow)
+        fare3 = self.add_journey("line1", "line2", peak_time_tomorrow)
         self.assertEqual(fare1, 10)  # Cap is reset, should be charged
         self.assertEqual(fare2, 10)
         self.assertEqual(fare3, 0)  # Reached daily cap for line1,line2
 
     def test_add_journey_daily_cap_reset_multiple_line(self):
         non_peak_time = "2023-09-14T21:00:00"
-        fare1 = self.journey_tracker.add_journey("line1", "line2", non_peak_time)
-        fare2 = self.journey_tracker.add_journey("line1", "line2", non_peak_time)
-        fare3 = self.journey_tracker.add_journey("line1", "line2", non_peak_time)
-        fare4 = self.journey_tracker.add_journey("line1", "line2", non_peak_time)
-        fare5 = self.journey_tracker.add_journey("line1", "line2", non_peak_time)
+        fare1 = self.add_journey("line1", "line2", non_peak_time)
+        fare2 = self.add_journey("line1", "line2", non_peak_time)
+        fare3 = self.add_journey("line1", "line2", non_peak_time)
+        fare4 = self.add_journey("line1", "line2", non_peak_time)
+        fare5 = self.add_journey("line1", "line2", non_peak_time)
         self.assertEqual(fare1, 5)
         self.assertEqual(fare2, 5)
         self.assertEqual(fare3, 5)
         self.assertEqual(fare4, 5)
         self.assertEqual(fare5, 0)  # Reached daily cap for line1,line2
 
-        fare1 = self.journey_tracker.add_journey("line2", "line3", non_peak_time)
-        fare2 = self.journey_tracker.add_journey("line2", "line3", non_peak_time)
-        fare3 = self.journey_tracker.add_journey("line2", "line3", non_peak_time)
-        fare4 = self.journey_tracker.add_journey("line2", "line3", non_peak_time)
+        fare1 = self.add_journey("line2", "line3", non_peak_time)
+        fare2 = self.add_journey("line2", "line3", non_peak_time)
+        fare3 = self.add_journey("line2", "line3", non_peak_time)
+        fare4 = self.add_journey("line2", "line3", non_peak_time)
         self.assertEqual(fare1, 6)
         self.assertEqual(fare2, 6)
         self.assertEqual(fare3, 3)  # Reached partial cap for line2,line3
         self.assertEqual(fare4, 0)  # Reached daily cap for line2,line3
 
         non_peak_time_tomorrow = "2023-09-15T21:00:00"
-        fare1 = self.journey_tracker.add_journey(
-            "line1", "line2", non_peak_time_tomorrow
-        )
-        fare2 = self.journey_tracker.add_journey(
-            "line1", "line2", non_peak_time_tomorrow
-        )
-        fare3 = self.journey_tracker.add_journey(
-            "line1", "line2", non_peak_time_tomorrow
-        )
-        fare4 = self.journey_tracker.add_journey(
-            "line1", "line2", non_peak_time_tomorrow
-        )
-        fare5 = self.journey_tracker.add_journey(
-            "line1", "line2", non_peak_time_tomorrow
-        )
+        fare1 = self.add_journey("line1", "line2", non_peak_time_tomorrow)
+        fare2 = self.add_journey("line1", "line2", non_peak_time_tomorrow)
+        fare3 = self.add_journey("line1", "line2", non_peak_time_tomorrow)
+        fare4 = self.add_journey("line1", "line2", non_peak_time_tomorrow)
+        fare5 = self.add_journey("line1", "line2", non_peak_time_tomorrow)
         self.assertEqual(fare1, 5)  # Cap is reset, should be charged
         self.assertEqual(fare2, 5)
         self.assertEqual(fare3, 5)
         self.assertEqual(fare4, 5)
         self.assertEqual(fare5, 0)  # Reached daily cap for line1,line2
 
-        fare1 = self.journey_tracker.add_journey(
-            "line2", "line3", non_peak_time_tomorrow
-        )
-        fare2 = self.journey_tracker.add_journey(
-            "line2", "line3", non_peak_time_tomorrow
-        )
-        fare3 = self.journey_tracker.add_journey(
-            "line2", "line3", non_peak_time_tomorrow
-        )
-        fare4 = self.journey_tracker.add_journey(
-            "line2", "line3", non_peak_time_tomorrow
-        )
+        fare1 = self.add_journey("line2", "line3", non_peak_time_tomorrow)
+        fare2 = self.add_journey("line2", "line3", non_peak_time_tomorrow)
+        fare3 = self.add_journey("line2", "line3", non_peak_time_tomorrow)
+        fare4 = self.add_journey("line2", "line3", non_peak_time_tomorrow)
         self.assertEqual(fare1, 6)  # Cap is reset, should be charged
         self.assertEqual(fare2, 6)
         self.assertEqual(fare3, 3)  # Reached partial cap for line2,line3
@@ -346,18 +368,16 @@ class TestUserJourneyTracker(unittest.TestCase):
 
         # Add journeys for the entire week to reach the weekly cap
         for _ in range(6):
-            fare1 = self.journey_tracker.add_journey("line3", "line4", non_peak_time)
-            fare2 = self.journey_tracker.add_journey("line3", "line4", non_peak_time)
+            fare1 = self.add_journey("line3", "line4", non_peak_time)
+            fare2 = self.add_journey("line3", "line4", non_peak_time)
             self.assertEqual(fare1, 10)
             self.assertEqual(fare2, 0)  # Reached daily cap
             running_date += timedelta(days=1)
             non_peak_time = running_date.strftime("%Y-%m-%dT%H:%M:%S")
 
-        final_uncapped_fare = self.journey_tracker.add_journey(
-            "line3", "line4", non_peak_time
-        )
+        final_uncapped_fare = self.add_journey("line3", "line4", non_peak_time)
         self.assertEqual(final_uncapped_fare, 10)
-        capped_fare = self.journey_tracker.add_journey("line3", "line4", non_peak_time)
+        capped_fare = self.add_journey("line3", "line4", non_peak_time)
         self.assertEqual(capped_fare, 0)
 
         # Advance the date to the next Monday (simulate a week later)
@@ -365,11 +385,38 @@ class TestUserJourneyTracker(unittest.TestCase):
         non_peak_time = running_date.strftime("%Y-%m-%dT%H:%M:%S")
 
         # Add a journey for the new week
-        fare = self.journey_tracker.add_journey("line3", "line4", non_peak_time)
+        fare = self.add_journey("line3", "line4", non_peak_time)
 
         # The fare should be charged since it's a new week
         self.assertEqual(fare, 10)
 
+    def test_add_journey_stale_weekly_fare_after_idle_week(self):
+        # line2,line3 reaches its $40 weekly cap over four weekdays
+        for day, expected_fare in (("14", 12), ("15", 12), ("18", 12), ("19", 4)):
+            fare = self.add_journey("line2", "line3", f"2023-09-{day}T08:00:00")
+            self.assertEqual(fare, expected_fare)
+
+        # A journey on another pair starts the next fare week
+        self.add_journey("line1", "line2", "2023-09-21T08:00:00")
+
+        # The idle pair's accumulators are from the previous week and count as zero
+        fare = self.add_journey("line2", "line3", "2023-09-22T08:00:00")
+        self.assertEqual(fare, 12)
+
+
+class TestFareRules(unittest.TestCase):
+    def test_compile(self):
+        config = {
+            "peak_hours": {"monday": [["08:00", "10:00"]]},
+            "fare_chart": {"line1,line2": {"peak": 10, "non_peak": 5}},
+            "cap_chart": {"line1,line2": {"daily": 20, "weekly": 50}},
+        }
+
+        fare_rules = FareRules.compile(config)
+        self.assertIsInstance(fare_rules, FareRules)
+        self.assertEqual(fare_rules.fare_calculator.fares, [(5, 10)])
+        self.assertIs(FareRules.compile(fare_rules), fare_rules)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,94 @@
+import io
+import os
+import unittest
+import follow
+from checkpoint import PricingState
+from helpers import PricingTestCase
+from journey import JourneyOrderError
+
+
+class TestFollow(PricingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.file_path = os.path.join(self.temp_dir, "journeys.csv")
+        self.checkpoint_path = os.path.join(self.temp_dir, "checkpoint.json")
+        open(self.file_path, "w").close()
+
+    def append(self, text):
+        with open(self.file_path, "a") as f:
+            f.write(text)
+
+    def follow(self, state=None):
+        """Price whatever has been appended so far, resuming from the checkpoint."""
+        if state is None:
+            if os.path.exists(self.checkpoint_path):
+                state = PricingState.load(self.fare_rules, self.checkpoint_path)
+            else:
+                state = PricingState(self.fare_rules)
+        out = io.StringIO()
+        total_fare = follow.follow_and_price(
+            state, self.file_path, self.checkpoint_path, 0.01, 0, out
+        )
+        return total_fare, out.getvalue().splitlines()
+
+    def test_resumes_without_repricing(self):
+        with open("tests/data/batch_two_cards_128.csv") as f:
+            lines = f.readlines()
+
+        self.assertEqual(self.follow(), (0, []))
+        self.append(lines[0])
+        self.assertEqual(self.follow(), (0, []))
+
+        priced = []
+        for start in range(1, len(lines), 40):
+            chunk = "".join(lines[start : start + 40])
+            # A row still being written is only priced once its line is complete
+            self.append(chunk[:-5])
+            total_fare, output = self.follow()
+            self.append(chunk[-5:])
+            priced += output
+        total_fare, output = self.follow()
+        priced += output
+
+        self.assertEqual(len(priced), len(lines) - 1)
+        self.assertEqual(total_fare, 128)
+        self.assertTrue(priced[-1].endswith("total $128)"))
+        self.assertEqual(self.follow(), (128, []))
+
+    def test_batch_must_match_the_header(self):
+        self.append("card_id,from_line,to_line,date_time\n")
+        with self.assertRaisesRegex(ValueError, "Unexpected CSV header format."):
+            follow.follow_and_price(
+                PricingState(self.fare_rules), self.file_path, batch=False
+            )
+
+    def test_out_of_order_row_keeps_earlier_progress(self):
+        self.append(
+            "from_line,to_line,date_time\n"
+            "green,green,2023-09-14T08:30:00\n"
+            "green,red,2023-09-14T12:00:00\n"
+            "green,green,2023-09-13T08:30:00\n"
+        )
+
+        with self.assertRaises(JourneyOrderError):
+            self.follow()
+        state = PricingState.load(self.fare_rules, self.checkpoint_path)
+        self.assertEqual(state.metadata["follow"]["total_fare"], 2 + 3)
+
+    def test_truncated_file(self):
+        self.append("from_line,to_line,date_time\ngreen,green,2023-09-14T08:30:00\n")
+        self.follow()
+        with open(self.file_path, "w") as f:
+            f.write("from_line,to_line,date_time\n")
+
+        with self.assertRaises(ValueError):
+            self.follow()
+
+    def test_unexpected_header(self):
+        self.append("a,b,c\n")
+        with self.assertRaises(ValueError):
+            self.follow()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -26,6 +26,59 @@ class TestIntegration(unittest.TestCase):
             "filepath": "tests/data/simulate_multiple_day_cap_restart_298.csv",
             "expected_result": "Total Fare: $298",
         },
+        {
+            "name": "simulate multiple day cap restart, streamed",
+            "filepath": "tests/data/simulate_multiple_day_cap_restart_298.csv",
+            "extra_args": ["--stream"],
+            "expected_result": "Total Fare: $298",
+        },
+        {
+            "name": "simulate 2 week cap restart, sorted on disk",
+            "filepath": "tests/data/simulate_2_week_cap_restart_115.csv",
+            "extra_args": ["--max-memory=4K"],
+            "expected_result": "Total Fare: $115",
+        },
+        {
+            "name": "batch of two cards",
+            "filepath": "tests/data/batch_two_cards_128.csv",
+            "extra_args": ["--batch"],
+            "expected_result": "Card card-a: $13\nCard card-b: $115\nTotal Fare: $128",
+        },
+        {
+            "name": "batch of two cards on two workers",
+            "filepath": "tests/data/batch_two_cards_128.csv",
+            "extra_args": ["--batch", "--workers=2"],
+            "expected_result": "Card card-a: $13\nCard card-b: $115\nTotal Fare: $128",
+        },
+        {
+            "name": "simulate multiple day cap restart, numpy engine",
+            "filepath": "tests/data/simulate_multiple_day_cap_restart_298.csv",
+            "extra_args": ["--engine=numpy"],
+            "expected_result": "Total Fare: $298",
+        },
+        {
+            "name": "several files matched by a glob, on two parse workers",
+            "filepath": "tests/data/simulate_2_*.csv",
+            "extra_args": ["--parse-workers=2"],
+            "expected_result": "Total Fare: $115",
+        },
+        {
+            "name": "card IDs without --batch",
+            "filepath": "tests/data/batch_two_cards_128.csv",
+            "expected_result_contains": "Unexpected CSV header format.",
+        },
+        {
+            "name": "--batch without card IDs",
+            "filepath": "tests/data/simulate_2_week_cap_restart_115.csv",
+            "extra_args": ["--batch"],
+            "expected_result_contains": "Unexpected CSV header format.",
+        },
+        {
+            "name": "--workers without --batch",
+            "filepath": "tests/data/simulate_2_week_cap_restart_115.csv",
+            "extra_args": ["--workers=2"],
+            "expected_result_contains": "--workers needs --batch.",
+        },
         {
             "name": "invalid filepath",
             "filepath": "asdasd.csv",
@@ -57,7 +110,7 @@ class TestIntegration(unittest.TestCase):
                     "--config-filepath=tests/data/test_config.json",
                     f"--filepath={test_case['filepath']}",
                     "--log-level=CRITICAL",
-                ]
+                ] + test_case.get("extra_args", [])
                 self.run_script_and_assert(
                     command,
                     expected_result=test_case.get("expected_result"),
@@ -0,0 +1,116 @@
+import unittest
+from fare_system import LinePairIndex
+from journey import (
+    BATCH_CSV_HEADER,
+    CSV_HEADER,
+    Journey,
+    check_header,
+    format_timestamp,
+    parse_timestamp,
+    strptime_timestamp,
+)
+
+
+class TestTimestamp(unittest.TestCase):
+    def test_parse_timestamp(self):
+        self.assertEqual(parse_timestamp("1970-01-01T00:00:00"), 0)
+        self.assertEqual(parse_timestamp("2023-09-14T12:30:15"), 1694694615)
+        self.assertEqual(parse_timestamp("1969-12-31T23:59:59"), -1)
+
+    def test_parse_timestamp_invalid(self):
+        with self.assertRaises(ValueError):
+            parse_timestamp("2023-09-14 12:00:00")
+
+    def test_matches_strptime(self):
+        for date_time in (
+            "2024-02-29T23:59:59",
+            "2000-01-01T00:00:00",
+            "1900-12-31T12:00:00",
+            "2023-9-11T7:05:00",
+            "2023-09-11T7:05:00",
+        ):
+            with self.subTest(date_time=date_time):
+                self.assertEqual(
+                    parse_timestamp(date_time), strptime_timestamp(date_time)
+                )
+
+    def test_fixed_format_invalid(self):
+        for date_time in (
+            "2023-02-29T12:00:00",
+            "2023-13-01T12:00:00",
+            "2023-00-10T12:00:00",
+            "2023-09-31T12:00:00",
+            "2023-09-11T24:00:00",
+            "2023-09-11T12:60:00",
+            "2023-09-11T12:00:60",
+            "2023-09-11T+1:00:00",
+            "2023-09-11T 1:00:00",
+            "+023-09-11T12:00:00",
+            "2023-09-11T12:00:0\u00b2",
+            "2023-09-11 12:00:00",
+            "2023-09-11T12:00:00 ",
+        ):
+            with self.subTest(date_time=date_time):
+                with self.assertRaises(ValueError):
+                    parse_timestamp(date_time)
+
+    def test_format_round_trip(self):
+        date_time = "2023-09-14T12:30:15"
+        self.assertEqual(format_timestamp(parse_timestamp(date_time)), date_time)
+
+
+class TestCheckHeader(unittest.TestCase):
+    def test_check_header(self):
+        self.assertFalse(check_header(CSV_HEADER))
+        self.assertFalse(check_header(CSV_HEADER, batch=False))
+        self.assertTrue(check_header(BATCH_CSV_HEADER))
+        self.assertTrue(check_header(BATCH_CSV_HEADER, batch=True))
+        for header, batch in (
+            (CSV_HEADER, True),
+            (BATCH_CSV_HEADER, False),
+            (None, None),
+            (["from", "to", "when"], None),
+        ):
+            with self.subTest(header=header, batch=batch):
+                with self.assertRaisesRegex(ValueError, "Unexpected CSV header"):
+                    check_header(header, batch)
+
+
+class TestJourney(unittest.TestCase):
+    def test_from_row(self):
+        line_pairs = LinePairIndex({"green,green", "green,red"})
+        journey = Journey.from_row(line_pairs, "Green", "RED", "2023-09-14T12:30:15")
+
+        self.assertEqual(journey.pair_id, 1)
+        self.assertEqual(journey.date_time, "2023-09-14T12:30:15")
+
+        for row, message in (
+            (("red", "red", "2023-09-14T12:30:15"), "Invalid journey combination"),
+            (("green", "red", "2023-09-14 12:30"), "Invalid 'date_time' format"),
+            (("green", "red", "2023-09-14T12:30:15", ""), "Missing 'card_id'."),
+        ):
+            with self.subTest(row=row):
+                with self.assertRaisesRegex(ValueError, message):
+                    Journey.from_row(line_pairs, *row)
+
+    def test_day_and_minute_of_week(self):
+        test_cases = [
+            ("2023-09-04T00:00:00", 0),  # Monday midnight
+            ("2023-09-04T08:00:59", 8 * 60),
+            ("2023-09-06T16:30:00", 2 * 1440 + 16 * 60 + 30),  # Wednesday
+            ("2023-09-10T23:59:59", 10079),  # Sunday, last minute of the week
+            ("1969-12-29T00:00:00", 0),  # Monday before the epoch
+        ]
+
+        for date_time, expected in test_cases:
+            with self.subTest(date_time=date_time):
+                journey = Journey(0, parse_timestamp(date_time))
+                self.assertEqual(journey.minute_of_week, expected)
+
+        monday = Journey(0, parse_timestamp("2023-09-04T23:59:59"))
+        tuesday = Journey(0, parse_timestamp("2023-09-05T00:00:00"))
+        self.assertEqual(tuesday.day - monday.day, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
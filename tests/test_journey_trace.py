@@ -0,0 +1,72 @@
+import json
+import os
+import unittest
+from unittest.mock import patch
+import main
+from helpers import PricingTestCase
+from journey_trace import TRACE_FIELDS, JourneyTraceWriter
+
+
+class TestJourneyTraceWriter(PricingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.file_path = "tests/data/simulate_2_day_cap_restart_13.csv"
+        self.trace_path = os.path.join(self.temp_dir, "trace.ndjson")
+
+    def read_trace(self):
+        with open(self.trace_path) as f:
+            return [json.loads(line) for line in f]
+
+    def price_user(self, **kwargs):
+        return self.price(
+            self.file_path, calculate=main.calculate_user_total_fare, **kwargs
+        )
+
+    def test_records_every_journey(self):
+        with JourneyTraceWriter(
+            self.trace_path, self.line_pairs, buffer_size=2
+        ) as trace:
+            total_fare = self.price_user(trace=trace)
+
+        records = self.read_trace()
+        journeys = main.read_csv(self.file_path, self.line_pairs)
+        self.assertEqual(len(records), len(journeys))
+        self.assertEqual(tuple(records[0]), TRACE_FIELDS)
+        self.assertEqual(sum(record["charged"] for record in records), total_fare)
+        for record in records:
+            self.assertEqual(
+                record["daily_after"], record["daily_before"] + record["charged"]
+            )
+            self.assertEqual(
+                record["weekly_after"], record["weekly_before"] + record["charged"]
+            )
+            self.assertIn(record["line_pair"], self.line_pairs.keys)
+
+    def test_tracing_does_not_change_the_total(self):
+        with JourneyTraceWriter(self.trace_path, self.line_pairs) as trace:
+            self.assertEqual(self.price_user(trace=trace), self.price_user())
+
+    def test_stream_fallback_discards_partial_trace(self):
+        self.file_path = os.path.join(self.temp_dir, "in.csv")
+        with open(self.file_path, "w") as file:
+            file.write(
+                "from_line,to_line,date_time\n"
+                "green,green,2023-09-14T08:30:00\n"
+                "green,red,2023-09-14T12:00:00\n"
+                "green,green,2023-09-13T08:30:00\n"
+            )
+
+        with JourneyTraceWriter(
+            self.trace_path, self.line_pairs, buffer_size=1
+        ) as trace:
+            with patch.object(main.logging, "warning") as mock_warning:
+                self.price_user(stream=True, trace=trace)
+
+        mock_warning.assert_called_once()
+        records = self.read_trace()
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]["date_time"], "2023-09-13T08:30:00")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import loadtest
+import main
+import server
+from fare_system import FareRules
+
+
+class TestLoadTest(unittest.TestCase):
+    def setUp(self):
+        with open("tests/data/test_config.json") as f:
+            self.config = json.load(f)
+        self.line_pairs = FareRules(self.config).line_pairs
+
+    def test_percentile(self):
+        values = list(range(1, 1001))
+        self.assertEqual(loadtest.percentile(values, 50), 500)
+        self.assertEqual(loadtest.percentile(values, 99.9), 999)
+        self.assertEqual(loadtest.percentile(values, 100), 1000)
+        self.assertEqual(loadtest.percentile([7], 99), 7)
+        self.assertEqual(loadtest.percentile([], 50), 0.0)
+
+    def test_build_requests(self):
+        rows = loadtest.read_rows("tests/data/batch_two_cards_128.csv")
+        requests, invalid = loadtest.build_requests(rows, "run1-", self.line_pairs)
+
+        self.assertEqual(invalid, 0)
+        self.assertEqual(len(requests), len(rows))
+        self.assertEqual(
+            {request["card_id"] for request in requests}, {"run1-card-a", "run1-card-b"}
+        )
+        date_times = [request["date_time"] for request in requests]
+        self.assertEqual(date_times, sorted(date_times))
+
+    def test_invalid_rows_are_counted(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "journeys.csv")
+            with open(file_path, "w") as f:
+                f.write(
+                    "card_id,from_line,to_line,date_time\n"
+                    "a,green,green,2023-09-11T08:00:00\n"
+                    "a,green,green,2023-09-11 07:00\n"
+                    "b,green,blue,2023-09-11T07:00:00\n"
+                    ",green,green,2023-09-11T07:00:00\n"
+                    "b,green\n"
+                    "b,red,green,2023-09-11T06:00:00\n"
+                )
+            rows = loadtest.read_rows(file_path)
+
+        with patch.object(loadtest.logging, "warning") as mock_warning:
+            requests, invalid = loadtest.build_requests(rows, "t-", self.line_pairs)
+        self.assertEqual(invalid, 4)
+        self.assertEqual(mock_warning.call_count, 4)
+        self.assertEqual(
+            [(request["card_id"], request["date_time"]) for request in requests],
+            [("t-b", "2023-09-11T06:00:00"), ("t-a", "2023-09-11T08:00:00")],
+        )
+
+    def test_compare_totals(self):
+        self.assertEqual(loadtest.compare_totals({"a": 1}, {"a": 1}), [])
+        self.assertEqual(
+            loadtest.compare_totals({"a": 1, "b": 2}, {"a": 3, "c": 4}),
+            [("a", 1, 3), ("b", 2, 0), ("c", 0, 4)],
+        )
+
+    def test_run_load_matches_offline_totals(self):
+        rows = loadtest.read_rows("tests/data/batch_two_cards_128.csv")
+        requests, _ = loadtest.build_requests(rows, "t-", self.line_pairs)
+        service = server.FareService(FareRules(self.config))
+
+        async def run():
+            async def handler(reader, writer):
+                await server.handle_connection(service, reader, writer)
+
+            tcp_server = await asyncio.start_server(handler, "127.0.0.1", 0)
+            port = tcp_server.sockets[0].getsockname()[1]
+            async with tcp_server:
+                return await loadtest.run_load(
+                    requests, connections=3, rate=5000, port=port
+                )
+
+        result = asyncio.run(run())
+        with patch.object(main.logging, "info"):
+            expected = loadtest.offline_totals(self.config, requests)
+
+        self.assertEqual(len(result.latencies), len(requests))
+        self.assertEqual(result.errors, 0)
+        self.assertEqual(loadtest.compare_totals(result.card_totals, expected), [])
+        self.assertEqual(sum(result.card_totals.values()), 128)
+        self.assertIn("p99.9:", loadtest.format_report(result, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
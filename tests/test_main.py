@@ -1,11 +1,40 @@
 import unittest
 import logging
 import os
+import subprocess
+import sys
 from unittest.mock import patch, mock_open
 import main
+from fare_system import LinePairIndex
+from journey import Journey, JourneyOrderError
+from profiling import StageTimer
 
 
 class TestMainScript(unittest.TestCase):
+    config = {
+        "peak_hours": {
+            "monday": [["08:00", "10:00"], ["16:30", "19:00"]],
+            "tuesday": [["08:00", "10:00"], ["16:30", "19:00"]],
+            "wednesday": [["08:00", "10:00"], ["16:30", "19:00"]],
+            "thursday": [["08:00", "10:00"], ["16:30", "19:00"]],
+            "friday": [["08:00", "10:00"], ["16:30", "19:00"]],
+            "saturday": [["10:00", "14:00"], ["18:00", "23:00"]],
+            "sunday": [["18:00", "23:00"]],
+        },
+        "fare_chart": {
+            "green,green": {"peak": 2, "non_peak": 1},
+            "red,red": {"peak": 3, "non_peak": 2},
+            "green,red": {"peak": 4, "non_peak": 3},
+            "red,green": {"peak": 3, "non_peak": 2},
+        },
+        "cap_chart": {
+            "green,green": {"daily": 8, "weekly": 55},
+            "red,red": {"daily": 12, "weekly": 70},
+            "green,red": {"daily": 15, "weekly": 90},
+            "red,green": {"daily": 15, "weekly": 90},
+        },
+    }
+
     def setUp(self):
         # Clear handlers before every test
         for handler in logging.getLogger().handlers[:]:
@@ -32,22 +61,25 @@ class TestMainScript(unittest.TestCase):
     def test_validate_csv_data_valid(self):
         # Valid journey data
         journey = ["line1", "line2", "2023-09-14T12:00:00"]
-        valid_combinations = {"line1,line2"}
+        line_pairs = LinePairIndex({"line1,line2"})
 
         # Ensure no exceptions are raised for valid data
         try:
-            main.validate_csv_data(journey, valid_combinations)
+            parsed = main.validate_csv_data(journey, line_pairs)
         except Exception as e:
             self.fail(f"validate_csv_data raised an unexpected exception: {e}")
 
+        self.assertEqual(parsed.pair_id, 0)
+        self.assertEqual(parsed.date_time, "2023-09-14T12:00:00")
+
     def test_validate_csv_data_invalid_combination(self):
         # Invalid journey data with an invalid line combination
         journey = ["line1", "line3", "2023-09-14T12:00:00"]
-        valid_combinations = {"line1,line2"}
+        line_pairs = LinePairIndex({"line1,line2"})
 
         # Ensure a ValueError is raised for an invalid line combination
         with self.assertRaises(ValueError) as context:
-            main.validate_csv_data(journey, valid_combinations)
+            main.validate_csv_data(journey, line_pairs)
 
         self.assertEqual(
             str(context.exception), "Invalid journey combination: line1 to line3"
@@ -56,11 +88,11 @@ class TestMainScript(unittest.TestCase):
     def test_validate_csv_data_invalid_date_format(self):
         # Invalid journey data with an invalid date format
         journey = ["line1", "line2", "2023-09-14 12:00:00"]
-        valid_combinations = {"line1,line2"}
+        line_pairs = LinePairIndex({"line1,line2"})
 
         # Ensure a ValueError is raised for an invalid date format
         with self.assertRaises(ValueError) as context:
-            main.validate_csv_data(journey, valid_combinations)
+            main.validate_csv_data(journey, line_pairs)
 
         self.assertEqual(
             str(context.exception), "Invalid 'date_time' format: 2023-09-14 12:00:00"
@@ -69,7 +101,7 @@ class TestMainScript(unittest.TestCase):
     def test_read_csv_valid(self):
         # Valid CSV file with one valid journey
         file_path = "valid_test.csv"
-        valid_line_combinations = {"line1,line2"}
+        line_pairs = LinePairIndex({"line1,line2"})
         content = "from_line,to_line,date_time\nline1,line2,2023-09-14T12:00:00"
 
         # Create a temporary valid CSV file
@@ -78,7 +110,7 @@ class TestMainScript(unittest.TestCase):
 
         # Ensure no exceptions are raised for a valid CSV file
         try:
-            journeys = main.read_csv(file_path, valid_line_combinations)
+            journeys = main.read_csv(file_path, line_pairs)
         except Exception as e:
             self.fail(f"read_csv raised an unexpected exception: {e}")
         finally:
@@ -87,12 +119,14 @@ class TestMainScript(unittest.TestCase):
 
         # Ensure the journeys list contains the expected data
         self.assertEqual(len(journeys), 1)
-        self.assertEqual(journeys[0], ["line1", "line2", "2023-09-14T12:00:00"])
+        self.assertEqual(
+            (journeys[0].pair_id, journeys[0].date_time), (0, "2023-09-14T12:00:00")
+        )
 
     def test_read_csv_invalid_header(self):
         # CSV file with an invalid header
         file_path = "invalid_header_test.csv"
-        valid_line_combinations = {"line1,line2"}
+        line_pairs = LinePairIndex({"line1,line2"})
         content = "invalid1,invalid2,invalid3\nline1,line2,2023-09-14T12:00:00"
 
         # Create a temporary CSV file with an invalid header
@@ -101,7 +135,7 @@ class TestMainScript(unittest.TestCase):
 
         # Ensure a ValueError is raised for an invalid CSV header
         with self.assertRaises(ValueError) as context:
-            main.read_csv(file_path, valid_line_combinations)
+            main.read_csv(file_path, line_pairs)
 
         self.assertEqual(str(context.exception), "Unexpected CSV header format.")
 
@@ -111,7 +145,7 @@ class TestMainScript(unittest.TestCase):
     def test_read_csv_invalid_data(self):
         # CSV file with invalid journey data
         file_path = "invalid_data_test.csv"
-        valid_line_combinations = {"line1,line2"}
+        line_pairs = LinePairIndex({"line1,line2"})
         content = "from_line,to_line,date_time\nline1,line3,2023-09-14T12:00:00"
 
         # Create a temporary CSV file with invalid data
@@ -120,7 +154,7 @@ class TestMainScript(unittest.TestCase):
 
         # Ensure a ValueError is raised for invalid journey data
         with self.assertRaises(ValueError) as context:
-            main.read_csv(file_path, valid_line_combinations)
+            main.read_csv(file_path, line_pairs)
 
         self.assertEqual(
             str(context.exception), "Invalid journey combination: line1 to line3"
@@ -132,11 +166,11 @@ class TestMainScript(unittest.TestCase):
     def test_read_csv_file_not_found(self):
         # Attempt to read a non-existent CSV file
         file_path = "non_existent.csv"
-        valid_line_combinations = {"line1,line2"}
+        line_pairs = LinePairIndex({"line1,line2"})
 
         # Ensure a FileNotFoundError is raised for a non-existent file
         with self.assertRaises(FileNotFoundError) as context:
-            main.read_csv(file_path, valid_line_combinations)
+            main.read_csv(file_path, line_pairs)
 
     def test_calculate_user_total_fare_valid(self):
         config = {
@@ -163,12 +197,14 @@ class TestMainScript(unittest.TestCase):
             },
         }
 
-        journeys = [
+        line_pairs = LinePairIndex(config["fare_chart"])
+        rows = [
             ["green", "green", "2023-09-14T08:30:00"],  # peak hour
             ["green", "red", "2023-09-14T12:00:00"],  # non-peak hour
             ["red", "green", "2023-09-14T19:30:00"],  # non-peak hour
             ["red", "red", "2023-09-14T19:45:00"],  # non-peak hour
         ]
+        journeys = [Journey.from_row(line_pairs, *row) for row in rows]
 
         expected_fare = (
             config["fare_chart"]["green,green"]["peak"]
@@ -182,6 +218,138 @@ class TestMainScript(unittest.TestCase):
 
         self.assertEqual(total_fare, expected_fare)
 
+    def test_read_csv_stream(self):
+        journeys = main.read_csv(
+            "tests/data/simulate_2_day_cap_restart_13.csv",
+            LinePairIndex(self.config["fare_chart"]),
+            stream=True,
+        )
+
+        self.assertNotIsInstance(journeys, list)
+        self.assertEqual(len(list(journeys)), 13)
+
+    def test_calculate_user_total_fare_presorted_out_of_order(self):
+        line_pairs = LinePairIndex(self.config["fare_chart"])
+        journeys = [
+            Journey.from_row(line_pairs, "green", "green", "2023-09-14T08:30:00"),
+            Journey.from_row(line_pairs, "green", "green", "2023-09-14T08:00:00"),
+        ]
+
+        with self.assertRaises(JourneyOrderError):
+            main.calculate_user_total_fare(self.config, iter(journeys), presorted=True)
+
+    def test_price_csv_stream_falls_back_when_unsorted(self):
+        file_path = "unsorted_test.csv"
+        content = (
+            "from_line,to_line,date_time\n"
+            "green,green,2023-09-14T08:30:00\n"
+            "green,red,2023-09-14T12:00:00\n"
+            "green,green,2023-09-13T08:30:00\n"
+        )
+        with open(file_path, "w") as file:
+            file.write(content)
+
+        timer = StageTimer()
+        try:
+            with patch.object(main.logging, "warning") as mock_warning:
+                total_fare = main.price_csv(
+                    self.config,
+                    file_path,
+                    LinePairIndex(self.config["fare_chart"]),
+                    stream=True,
+                    timer=timer,
+                )
+        finally:
+            os.remove(file_path)
+
+        self.assertEqual(total_fare, 2 + 3 + 2)
+        mock_warning.assert_called_once()
+        self.assertEqual(
+            [(stage.name, stage.rows) for stage in timer.stages],
+            [
+                ("read_and_calculate", None),
+                ("read_csv", 3),
+                ("sort", 3),
+                ("calculate", 3),
+            ],
+        )
+
+    def test_validate_csv_data_wrong_field_count(self):
+        line_pairs = LinePairIndex({"line1,line2"})
+
+        for journey, card_id, message in (
+            (["line1", "line2"], None, "Expected 3 fields."),
+            (
+                ["line1", "line2", "2023-09-14T12:00:00", "x"],
+                None,
+                "Expected 3 fields.",
+            ),
+            (["line1", "line2"], "card-a", "Expected 4 fields."),
+        ):
+            with self.subTest(journey=journey, card_id=card_id):
+                with self.assertRaises(ValueError) as context:
+                    main.validate_csv_data(journey, line_pairs, card_id)
+                self.assertEqual(str(context.exception), message)
+
+    def test_validate_csv_data_missing_card_id(self):
+        journey = ["line1", "line2", "2023-09-14T12:00:00"]
+        line_pairs = LinePairIndex({"line1,line2"})
+
+        with self.assertRaises(ValueError) as context:
+            main.validate_csv_data(journey, line_pairs, card_id="")
+
+        self.assertEqual(str(context.exception), "Missing 'card_id'.")
+
+    def test_read_csv_with_card_id(self):
+        line_pairs = LinePairIndex(self.config["fare_chart"])
+        journeys = main.read_csv("tests/data/batch_two_cards_128.csv", line_pairs)
+
+        self.assertEqual(len(journeys), 113)
+        self.assertEqual(journeys[0].card_id, "card-b")
+        self.assertEqual(journeys[0].pair_id, line_pairs.lookup("green", "green"))
+
+    def test_batch_must_match_the_header(self):
+        line_pairs = LinePairIndex(self.config["fare_chart"])
+        for file_path, batch in (
+            ("tests/data/batch_two_cards_128.csv", False),
+            ("tests/data/simulate_2_week_cap_restart_115.csv", True),
+        ):
+            for kwargs in (
+                {},
+                {"reader": "mmap"},
+                {"stream": True},
+                {"max_memory": 1024},
+                {"parse_workers": 2},
+            ):
+                with self.subTest(file_path=file_path, **kwargs):
+                    with patch.object(main.logging, "critical"):
+                        with self.assertRaisesRegex(
+                            ValueError, "Unexpected CSV header format."
+                        ):
+                            main.price_csv(
+                                self.config,
+                                file_path,
+                                line_pairs,
+                                batch=batch,
+                                **kwargs,
+                            )
+
+    def test_calculate_card_total_fares(self):
+        line_pairs = LinePairIndex(self.config["fare_chart"])
+        rows = [
+            ["green", "green", "2023-09-14T08:30:00", "a"],
+            ["green", "green", "2023-09-14T08:40:00", "b"],
+            ["green", "red", "2023-09-14T12:00:00", "a"],
+        ] + [["green", "green", "2023-09-14T09:00:00", "b"]] * 5
+        journeys = [Journey.from_row(line_pairs, *row) for row in rows]
+
+        with patch.object(main.logging, "info"):
+            card_totals = main.calculate_card_total_fares(self.config, journeys)
+
+        # Card b hits its daily cap of $8 for green,green, card a does not
+        self.assertEqual(card_totals, {"a": 2 + 3, "b": 8})
+        self.assertEqual(main.sum_card_totals(card_totals), 13)
+
     def test_log_level_none(self):
         main.configure_log("NONE")
         with self.assertRaises(
@@ -200,6 +368,31 @@ class TestMainScript(unittest.TestCase):
             main.configure_log(log_level="DEBUG", write_log=True)
             m.assert_called_once()  # Ensure that the log file was created
 
+    def test_import_leaves_logging_unconfigured(self):
+        # Other entry points, such as the server, configure logging themselves
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import logging, main, server, loadtest; "
+                "print(logging.getLogger().handlers)",
+            ],
+            capture_output=True,
+            text=True,
+            cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."),
+        )
+        self.assertEqual(result.stdout.strip(), "[]", result.stderr)
+
+    def test_import_does_not_load_numpy(self):
+        # numpy is imported by the numpy engine only, not on every run
+        result = subprocess.run(
+            [sys.executable, "-c", "import main, sys; print('numpy' in sys.modules)"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."),
+        )
+        self.assertEqual(result.stdout.strip(), "False", result.stderr)
+
     def test_log_level_control(self):
         main.configure_log("WARNING")
         with self.assertLogs(level="WARNING") as cm:
@@ -0,0 +1,166 @@
+import gzip
+import os
+import unittest
+from unittest.mock import patch
+from helpers import CSV_PATH, PricingTestCase, as_tuples
+from main import iter_csv, price_csv
+import mmap_reader
+from mmap_reader import InvalidRowsError, iter_csv_mmap, validate_csv_chunks
+from multi_file import merge_journeys
+
+
+class TestMmapReader(PricingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.file_path = os.path.join(self.temp_dir, "journeys.csv")
+
+    def write(self, text):
+        with open(self.file_path, "w", newline="") as f:
+            f.write(text)
+
+    def test_matches_csv_reader(self):
+        for file_path in (
+            "tests/data/test.csv",
+            "tests/data/batch_two_cards_128.csv",
+            "tests/data/simulate_multiple_day_cap_restart_298.csv",
+        ):
+            with self.subTest(file_path=file_path):
+                self.assertEqual(
+                    as_tuples(iter_csv_mmap(file_path, self.line_pairs)),
+                    as_tuples(iter_csv(file_path, self.line_pairs)),
+                )
+
+    def test_line_endings_quotes_and_unpadded_times(self):
+        self.write(
+            "card_id,from_line,to_line,date_time\r\n"
+            "a,green,green,2023-09-11T07:58:30\r\n"
+            '"b",green,"red",2023-09-11T08:00:00\r\n'
+            "a,red,green,2023-9-11T9:05:00"
+        )
+        self.assertEqual(
+            as_tuples(iter_csv_mmap(self.file_path, self.line_pairs)),
+            as_tuples(iter_csv(self.file_path, self.line_pairs)),
+        )
+
+    def test_lines_split_across_blocks(self):
+        with open(CSV_PATH, newline="") as f:
+            text = f.read().replace("\n", "\r\n")
+        self.write(text)
+        gzip_path = self.file_path + ".gz"
+        with gzip.open(gzip_path, "wt", newline="") as f:
+            f.write(text)
+        expected = as_tuples(iter_csv(CSV_PATH, self.line_pairs))
+        for block_size in (1, 7, 64):
+            with patch.object(mmap_reader, "BLOCK_SIZE", block_size):
+                for file_path in (self.file_path, gzip_path):
+                    with self.subTest(block_size=block_size, file_path=file_path):
+                        self.assertEqual(
+                            as_tuples(iter_csv_mmap(file_path, self.line_pairs)),
+                            expected,
+                        )
+
+    def test_errors_name_the_line(self):
+        header = "from_line,to_line,date_time\n"
+        valid = "green,green,2023-09-11T07:58:30\n"
+        for row, message in (
+            ("green,blue,2023-09-11T08:00:00", "Line 3: Invalid journey combination"),
+            ("green,green,2023-09-11T25:00:00", "Line 3: Invalid 'date_time' format"),
+            ("green,green,2023-09-11T07:5x:30", "Line 3: Invalid 'date_time' format"),
+            ("green,green,2023-09-11 07:58:30", "Line 3: Invalid 'date_time' format"),
+            ("green,green,2023-09-32T07:58:30", "Line 3: Invalid 'date_time' format"),
+            ("green,green", "Line 3: Expected 3 fields."),
+            ("green,green,2023-09-11T08:00:00,x", "Line 3: Expected 3 fields."),
+        ):
+            with self.subTest(row=row):
+                self.write(header + valid + row + "\n")
+                with self.assertRaisesRegex(ValueError, message):
+                    list(iter_csv_mmap(self.file_path, self.line_pairs))
+
+    def test_invalid_header(self):
+        for text in ("", "from,to,when\ngreen,green,2023-09-11T07:58:30\n"):
+            with self.subTest(text=text):
+                self.write(text)
+                with self.assertRaisesRegex(ValueError, "Unexpected CSV header"):
+                    list(iter_csv_mmap(self.file_path, self.line_pairs))
+
+    def test_price_csv_with_mmap_reader(self):
+        for stream in (False, True):
+            with self.subTest(stream=stream):
+                self.assertEqual(
+                    price_csv(
+                        self.config,
+                        "tests/data/simulate_2_week_cap_restart_115.csv",
+                        self.line_pairs,
+                        stream=stream,
+                        reader="mmap",
+                    ),
+                    price_csv(
+                        self.config,
+                        "tests/data/simulate_2_week_cap_restart_115.csv",
+                        self.line_pairs,
+                        stream=stream,
+                    ),
+                )
+
+
+class TestValidateCsvChunks(PricingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.file_path = os.path.join(self.temp_dir, "journeys.csv")
+        with open(CSV_PATH) as f:
+            self.lines = f.readlines()
+
+    def write(self, lines):
+        with open(self.file_path, "w", newline="") as f:
+            f.writelines(lines)
+
+    def test_matches_csv_reader(self):
+        # Reversed, so every chunk has to be sorted before merging
+        self.write(self.lines[:1] + self.lines[:0:-1])
+        expected = sorted(
+            as_tuples(iter_csv(self.file_path, self.line_pairs)),
+            key=lambda row: row[1],
+        )
+        for workers in (1, 2, 3, 7, 500):
+            with self.subTest(workers=workers):
+                chunks, errors = validate_csv_chunks(
+                    self.file_path, self.line_pairs, workers
+                )
+                self.assertEqual(errors, [])
+                self.assertEqual(as_tuples(merge_journeys(chunks)), expected)
+
+    def test_errors_keep_line_numbers(self):
+        lines = list(self.lines)
+        lines[5] = "card-a,green,blue,2023-09-11T08:00:00\n"
+        lines[60] = "card-b,green,green,2023-09-11T08:00\n"
+        lines[-1] = "card-a,green\n"
+        self.write(lines)
+
+        for workers in (1, 4):
+            with self.subTest(workers=workers):
+                chunks, errors = validate_csv_chunks(
+                    self.file_path, self.line_pairs, workers
+                )
+                self.assertEqual([error[0] for error in errors], [6, 61, len(lines)])
+                self.assertIn("Invalid journey combination", errors[0][1])
+                self.assertIn("Invalid 'date_time' format", errors[1][1])
+                self.assertEqual(errors[2][1], "Expected 4 fields.")
+                self.assertEqual(sum(len(chunk) for chunk in chunks), len(lines) - 4)
+
+        with self.assertRaises(InvalidRowsError) as raised:
+            self.price(self.file_path, parse_workers=2)
+        self.assertEqual(len(raised.exception.errors), 3)
+        self.assertIn("3 invalid rows. Line 6: ", str(raised.exception))
+
+    def test_header_only_and_empty_files(self):
+        self.write(self.lines[:1])
+        self.assertEqual(
+            validate_csv_chunks(self.file_path, self.line_pairs, 2), ([], [])
+        )
+        self.write([])
+        with self.assertRaisesRegex(ValueError, "Unexpected CSV header"):
+            validate_csv_chunks(self.file_path, self.line_pairs, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import unittest
+from functools import partial
+from helpers import CSV_PATH, PricingTestCase
+from main import read_csv
+from multi_file import merge_journeys, read_files
+from profiling import StageTimer
+
+
+class TestMultiFile(PricingTestCase):
+    def split(self, lines, parts):
+        """Deal the rows of a CSV out over several files, each with the header."""
+        header, rows = lines[0], lines[1:]
+        file_paths = []
+        for part in range(parts):
+            file_path = os.path.join(self.temp_dir, f"part{part}.csv")
+            with open(file_path, "w") as f:
+                f.writelines([header] + rows[part::parts])
+            file_paths.append(file_path)
+        return file_paths
+
+    def test_prices_like_a_single_file(self):
+        with open(CSV_PATH) as f:
+            lines = f.readlines()
+        # Sorted rows dealt out round-robin keep every part in time order
+        lines[1:] = sorted(lines[1:], key=lambda line: line.split(",")[-1])
+        file_paths = self.split(lines, 3)
+        expected = self.price(CSV_PATH)
+
+        for kwargs in (
+            {},
+            {"parse_workers": 2},
+            {"stream": True},
+            {"max_memory": 1024},
+        ):
+            with self.subTest(**kwargs):
+                self.assertEqual(self.price(file_paths, **kwargs), expected)
+
+    def test_unsorted_files(self):
+        with open(CSV_PATH) as f:
+            lines = f.readlines()
+        lines[1:] = reversed(lines[1:])
+        file_paths = self.split(lines, 3)
+        expected = self.price(CSV_PATH)
+
+        timer = StageTimer()
+        self.assertEqual(self.price(file_paths, stream=True, timer=timer), expected)
+        self.assertEqual(
+            [timing.name for timing in timer.stages],
+            ["read_and_calculate", "read_csv", "merge", "calculate"],
+        )
+        self.assertEqual(self.price(file_paths, parse_workers=3), expected)
+
+    def test_read_files(self):
+        with open(CSV_PATH) as f:
+            file_paths = self.split(f.readlines(), 2)
+
+        read = partial(read_csv, line_pairs=self.line_pairs)
+        expected = None
+        for parse_workers in (1, 2):
+            files = read_files(read, file_paths, parse_workers)
+            self.assertEqual([len(journeys) for journeys in files], [57, 56])
+            merged = [
+                (j.timestamp, j.pair_id, j.card_id) for j in merge_journeys(files)
+            ]
+            self.assertEqual(merged, sorted(merged, key=lambda row: row[0]))
+            if expected is not None:
+                self.assertEqual(merged, expected)
+            expected = merged
+
+    def test_errors_name_the_file(self):
+        with open(CSV_PATH) as f:
+            lines = f.readlines()
+        file_paths = self.split(lines, 2)
+        with open(file_paths[1], "a") as f:
+            f.write("card-a,green,blue,2023-09-11T08:00:00\n")
+
+        for parse_workers in (1, 2):
+            with self.subTest(parse_workers=parse_workers):
+                with self.assertRaisesRegex(ValueError, "part1.csv: Invalid journey"):
+                    self.price(file_paths, parse_workers=parse_workers)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import json
+import os
+import random
+import signal
+import unittest
+from unittest.mock import patch
+import main
+import parallel
+from journey import Journey, JourneyOrderError
+
+
+def _killed_worker(config, inbox, outbox):
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+class TestParallel(unittest.TestCase):
+    def setUp(self):
+        with open("tests/data/test_config.json") as f:
+            self.config = json.load(f)
+
+        rng = random.Random(7)
+        start = 1694390400  # 2023-09-11T00:00:00, a Monday
+        self.journeys = [
+            Journey(
+                rng.randrange(len(self.config["fare_chart"])),
+                start + rng.randrange(0, 21 * 24 * 3600),
+                f"card-{rng.randrange(40)}",
+            )
+            for _ in range(3000)
+        ]
+
+    def test_card_partition_is_stable(self):
+        self.assertEqual(parallel.card_partition(None, 4), 0)
+        self.assertEqual(
+            parallel.card_partition("card-1", 4), parallel.card_partition("card-1", 4)
+        )
+        self.assertTrue(0 <= parallel.card_partition("card-1", 3) < 3)
+
+    def test_matches_serial(self):
+        with patch.object(main.logging, "info"):
+            expected = main.calculate_card_total_fares(self.config, self.journeys)
+
+        for workers in (1, 3):
+            with self.subTest(workers=workers):
+                with patch.object(parallel, "CHUNK_SIZE", 50):
+                    result = parallel.calculate_card_total_fares_parallel(
+                        self.config, self.journeys, workers=workers
+                    )
+                self.assertEqual(result, expected)
+                self.assertEqual(
+                    main.sum_card_totals(result), main.sum_card_totals(expected)
+                )
+
+    def test_presorted_input_out_of_order(self):
+        with self.assertRaisesRegex(JourneyOrderError, "Journey #2 "):
+            parallel.calculate_card_total_fares_parallel(
+                self.config, self.journeys, presorted=True, workers=2
+            )
+
+    def test_worker_error_is_raised(self):
+        # An ID outside the fare chart fails inside the worker
+        self.journeys.append(Journey(99, self.journeys[0].timestamp, "x"))
+
+        with self.assertRaises(RuntimeError):
+            parallel.calculate_card_total_fares_parallel(
+                self.config, self.journeys, workers=2
+            )
+
+    def test_dead_worker_is_raised(self):
+        # Small chunks fill the queue of the dead worker before the input ends
+        for chunk_size in (10, parallel.CHUNK_SIZE):
+            with self.subTest(chunk_size=chunk_size):
+                with patch.object(
+                    parallel, "_price_partition", _killed_worker
+                ), patch.object(parallel, "CHUNK_SIZE", chunk_size), patch.object(
+                    parallel, "LIVENESS_INTERVAL", 0.05
+                ):
+                    with self.assertRaisesRegex(RuntimeError, "died with exit code"):
+                        parallel.calculate_card_total_fares_parallel(
+                            self.config, self.journeys, workers=2
+                        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import tracemalloc
+import unittest
+from profiling import StageTimer
+
+
+class TestStageTimer(unittest.TestCase):
+    def test_stages_are_recorded_in_order(self):
+        timer = StageTimer()
+        with timer.stage("first", rows=10):
+            pass
+        with timer.stage("second") as stage:
+            stage.rows = 20
+
+        self.assertEqual([t.name for t in timer.stages], ["first", "second"])
+        self.assertEqual([t.rows for t in timer.stages], [10, 20])
+        self.assertTrue(all(t.wall >= 0 and t.cpu >= 0 for t in timer.stages))
+        self.assertIsNone(timer.stages[0].peak_memory)
+
+        report = timer.report()
+        self.assertIn("rows/sec", report)
+        self.assertNotIn("peak mem", report)
+        self.assertEqual(report.splitlines()[-1].split()[0], "total")
+
+    def test_stage_is_recorded_on_error(self):
+        timer = StageTimer()
+        with self.assertRaises(ValueError):
+            with timer.stage("failing"):
+                raise ValueError()
+
+        self.assertEqual(timer.stages[0].name, "failing")
+
+    def test_split(self):
+        timer = StageTimer()
+        with timer.stage("read", rows=100) as read:
+            read.data_bytes = 2 * 1024**2
+        with timer.stage("calculate"):
+            pass
+        read.wall, read.cpu = 3.0, 2.0
+
+        part = timer.split(read, "decompress", 1.0, 0.5)
+        self.assertEqual(
+            [t.name for t in timer.stages], ["decompress", "read", "calculate"]
+        )
+        self.assertEqual((part.wall, part.cpu, part.rows), (1.0, 0.5, 100))
+        self.assertEqual((read.wall, read.cpu), (2.0, 1.5))
+        self.assertEqual(timer.report().splitlines()[1].split()[-1], "2.0")
+
+    def test_trace_memory(self):
+        timer = StageTimer(trace_memory=True)
+        try:
+            with timer.stage("allocate"):
+                data = [0] * 1_000_000
+            del data
+            with timer.stage("idle"):
+                pass
+        finally:
+            timer.stop()
+
+        allocate, idle = timer.stages
+        self.assertGreater(allocate.peak_memory, 8_000_000)
+        self.assertLess(idle.peak_memory, allocate.peak_memory)
+        self.assertIn("peak mem", timer.report())
+        self.assertFalse(tracemalloc.is_tracing())
+
+
+if __name__ == "__main__":
+    unittest.main()
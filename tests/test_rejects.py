@@ -0,0 +1,133 @@
+import csv
+import os
+import subprocess
+import sys
+import unittest
+from helpers import CONFIG_PATH, CSV_PATH, PricingTestCase
+from main import REJECTS_EXIT_CODE
+from rejects import REJECT_FIELDS, RejectList, RejectWriter
+
+PARENT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+class TestQuarantine(PricingTestCase):
+    def setUp(self):
+        super().setUp()
+        with open(CSV_PATH) as f:
+            self.lines = f.readlines()
+
+        # The same journeys with three invalid rows mixed in
+        lines = list(self.lines)
+        lines.insert(5, "card-a,green,blue,2023-09-11T08:00:00\n")
+        lines.insert(60, "card-b,green,green,2023-09-11T08:00\n")
+        lines.append("card-a,green\n")
+        self.bad_path = self.write("bad.csv", lines)
+        self.bad_lines = [6, 61, len(lines)]
+
+    def write(self, name, lines):
+        file_path = os.path.join(self.temp_dir, name)
+        with open(file_path, "w", newline="") as f:
+            f.writelines(lines)
+        return file_path
+
+    def test_prices_the_valid_rows(self):
+        expected = self.price(CSV_PATH)
+        for kwargs in (
+            {},
+            {"reader": "mmap"},
+            {"stream": True},
+            {"max_memory": 1024},
+            {"parse_workers": 2},
+            {"parse_workers": 2, "reader": "mmap"},
+        ):
+            with self.subTest(**kwargs):
+                rejects = RejectList()
+                self.assertEqual(
+                    self.price(self.bad_path, rejects=rejects, **kwargs), expected
+                )
+                self.assertEqual(rejects.count, 3)
+                self.assertEqual([row[1] for row in rejects.rows], self.bad_lines)
+                self.assertEqual({row[0] for row in rejects.rows}, {self.bad_path})
+                reasons = [row[2] for row in rejects.rows]
+                self.assertIn("Invalid journey combination", reasons[0])
+                self.assertIn("Invalid 'date_time' format", reasons[1])
+                self.assertEqual(reasons[2], "Expected 4 fields.")
+                self.assertEqual(rejects.rows[2][3], "card-a,green")
+
+    def test_quoted_rows_are_kept_as_written(self):
+        row = 'card-a,"Green,Red",Red,2023-09-11T09:00:00'
+        file_path = self.write("quoted.csv", self.lines[:3] + [row + "\n"])
+        for kwargs in ({}, {"reader": "mmap"}, {"parse_workers": 2}):
+            with self.subTest(**kwargs):
+                rejects = RejectList()
+                self.price(file_path, rejects=rejects, **kwargs)
+                self.assertEqual([reject[3] for reject in rejects.rows], [row])
+
+    def test_several_files(self):
+        good_path = self.write("good.csv", self.lines)
+        for parse_workers in (1, 2):
+            with self.subTest(parse_workers=parse_workers):
+                rejects = RejectList()
+                self.price(
+                    [good_path, self.bad_path],
+                    rejects=rejects,
+                    parse_workers=parse_workers,
+                )
+                self.assertEqual(
+                    [(row[0], row[1]) for row in rejects.rows],
+                    [(self.bad_path, line) for line in self.bad_lines],
+                )
+
+    def test_stream_fallback_does_not_repeat_rejects(self):
+        # Unsorted input makes --stream start over in memory
+        lines = self.lines[:1] + self.lines[:0:-1] + ["card-a,green\n"]
+        file_path = self.write("unsorted.csv", lines)
+        rejects = RejectList()
+        self.price(file_path, stream=True, rejects=rejects)
+        self.assertEqual([row[1] for row in rejects.rows], [len(lines)])
+
+    def test_writer(self):
+        reject_path = os.path.join(self.temp_dir, "rejects.csv")
+        with RejectWriter(reject_path) as rejects:
+            rejects.record("a.csv", 2, "Bad row.", "x,y")
+            rejects.reset()
+            self.price(self.bad_path, rejects=rejects)
+            self.assertEqual(rejects.count, 3)
+        with open(reject_path, newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(tuple(rows[0]), REJECT_FIELDS)
+        self.assertEqual([int(row[1]) for row in rows[1:]], self.bad_lines)
+
+    def test_exit_code(self):
+        reject_path = os.path.join(self.temp_dir, "rejects.csv")
+        command = [
+            sys.executable,
+            "main.py",
+            f"--config-filepath={CONFIG_PATH}",
+            f"--filepath={self.bad_path}",
+            "--log-level=CRITICAL",
+            "--batch",
+            "--on-error=quarantine",
+            f"--reject-file={reject_path}",
+        ]
+        for max_rejects, returncode in ((3, 0), (2, REJECTS_EXIT_CODE)):
+            with self.subTest(max_rejects=max_rejects):
+                result = subprocess.run(
+                    command + [f"--max-rejects={max_rejects}"],
+                    capture_output=True,
+                    text=True,
+                    cwd=PARENT_DIRECTORY,
+                )
+                self.assertEqual(result.returncode, returncode, result.stderr)
+                self.assertIn("Total Fare: $128", result.stdout)
+                self.assertIn("Rejected 3 rows", result.stderr)
+
+        result = subprocess.run(
+            command[:-2], capture_output=True, text=True, cwd=PARENT_DIRECTORY
+        )
+        self.assertIn("An error occurred:", result.stderr)
+        self.assertNotIn("Total Fare", result.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import threading
+import unittest
+from unittest.mock import patch
+import main
+import server
+from fare_system import FareRules
+
+
+class TestFareService(unittest.TestCase):
+    def setUp(self):
+        with open("tests/data/test_config.json") as f:
+            self.config = json.load(f)
+        self.service = server.FareService(FareRules(self.config))
+        self.line_pairs = FareRules(self.config).line_pairs
+
+    def test_matches_batch_pricing(self):
+        file_path = "tests/data/batch_two_cards_128.csv"
+        with patch.object(main.logging, "info"):
+            expected = main.price_csv(
+                self.config,
+                file_path,
+                self.line_pairs,
+                calculate=main.calculate_card_total_fares,
+            )
+
+        totals = {}
+        for journey in main.read_csv(file_path, self.line_pairs):
+            from_line, to_line = self.line_pairs.keys[journey.pair_id].split(",")
+            response = self.service.handle(
+                {
+                    "card_id": journey.card_id,
+                    "from_line": from_line,
+                    "to_line": to_line,
+                    "date_time": journey.date_time,
+                }
+            )
+            card_id = journey.card_id
+            totals[card_id] = totals.get(card_id, 0) + response["fare"]
+        self.assertEqual(totals, expected)
+
+    def test_batch_request(self):
+        journey = {"from_line": "green", "to_line": "red", "date_time": ""}
+        response = self.service.handle(
+            {
+                "id": 1,
+                "journeys": [
+                    dict(journey, date_time="2023-09-14T08:00:00"),
+                    dict(journey, from_line="blue"),
+                    dict(journey, date_time="2023-09-13T08:00:00"),
+                    {"from_line": "green"},
+                    dict(journey, date_time="2023-09-14T08:10:00", card_id="a"),
+                ],
+            }
+        )
+
+        self.assertEqual(response["id"], 1)
+        results = response["results"]
+        self.assertEqual(results[0], {"fare": 4})
+        self.assertEqual(
+            results[1], {"error": "Invalid journey combination: blue to red"}
+        )
+        self.assertIn("earlier than the previous journey", results[2]["error"])
+        self.assertEqual(results[3], {"error": "Missing 'to_line'."})
+        self.assertEqual(results[4], {"fare": 4})
+
+    def test_invalid_request(self):
+        self.assertIn("error", self.service.handle([1, 2]))
+        self.assertIn("error", self.service.handle({"from_line": 1, "to_line": 2}))
+        for journeys in (5, "ab", {"from_line": "green"}):
+            with self.subTest(journeys=journeys):
+                self.assertEqual(
+                    self.service.handle({"journeys": journeys, "id": 7}),
+                    {"error": "'journeys' must be a list.", "id": 7},
+                )
+
+
+class TestFareServer(unittest.TestCase):
+    def setUp(self):
+        with open("tests/data/test_config.json") as f:
+            service = server.FareService(FareRules(json.load(f)))
+
+        async def handler(reader, writer):
+            await server.handle_connection(service, reader, writer)
+
+        loop = asyncio.new_event_loop()
+        tcp_server = loop.run_until_complete(
+            asyncio.start_server(handler, "127.0.0.1", 0)
+        )
+        self.port = tcp_server.sockets[0].getsockname()[1]
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            tcp_server.close()
+            loop.run_until_complete(tcp_server.wait_closed())
+            loop.close()
+
+        self.addCleanup(stop)
+
+    def test_client_round_trip(self):
+        with server.FareClient(port=self.port) as client:
+            self.assertEqual(client.charge("green", "red", "2023-09-14T08:00:00"), 4)
+            with self.assertRaises(ValueError):
+                client.charge("green", "blue", "2023-09-14T08:00:00")
+            self.assertIn("error", client.request("not an object"))
+            self.assertIn("error", client.request({"journeys": 5}))
+
+            total = server.charge_csv(
+                client, "tests/data/batch_two_cards_128.csv", batch_size=10
+            )
+        self.assertEqual(total, 128)
+
+
+if __name__ == "__main__":
+    unittest.main()
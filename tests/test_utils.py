@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+from utils import expand_input_paths, parse_size
+
+
+class TestParseSize(unittest.TestCase):
+    def test_parse_size(self):
+        test_cases = [
+            ("1024", 1024),
+            ("2K", 2048),
+            ("512M", 512 * 1024**2),
+            ("1.5g", int(1.5 * 1024**3)),
+            ("2GB", 2 * 1024**3),
+        ]
+
+        for size, expected in test_cases:
+            with self.subTest(size=size):
+                self.assertEqual(parse_size(size), expected)
+
+    def test_parse_size_invalid(self):
+        for size in ("", "abc", "0", "-5M"):
+            with self.subTest(size=size):
+                with self.assertRaises(ValueError):
+                    parse_size(size)
+
+
+class TestExpandInputPaths(unittest.TestCase):
+    def test_expand_input_paths(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for name in ("b.csv", "a.csv", "c.txt", ".hidden.csv"):
+                open(os.path.join(temp_dir, name), "w").close()
+            os.mkdir(os.path.join(temp_dir, "nested"))
+
+            def path(name):
+                return os.path.join(temp_dir, name)
+
+            self.assertEqual(
+                expand_input_paths([temp_dir]),
+                [path("a.csv"), path("b.csv"), path("c.txt")],
+            )
+            self.assertEqual(
+                expand_input_paths([path("c.txt"), path("*.csv"), path("a.csv")]),
+                [path("c.txt"), path("a.csv"), path("b.csv")],
+            )
+            self.assertEqual(
+                expand_input_paths([path("missing.csv")]), [path("missing.csv")]
+            )
+            with self.assertRaisesRegex(ValueError, "No input files match"):
+                expand_input_paths([path("*.json")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import random
+import unittest
+from unittest.mock import patch
+import main
+import vectorized
+from fare_system import FareRules, LinePairIndex
+from journey import Journey, JourneyOrderError
+
+
+@unittest.skipIf(vectorized.np is None, "numpy is not installed")
+class TestVectorized(unittest.TestCase):
+    def setUp(self):
+        with open("tests/data/test_config.json") as f:
+            self.config = json.load(f)
+        self.line_pairs = LinePairIndex(self.config["fare_chart"])
+
+    def random_journeys(self, rng, count, days):
+        start = 1694390400  # 2023-09-11T00:00:00, a Monday
+        return sorted(
+            (
+                Journey(
+                    rng.randrange(len(self.line_pairs)),
+                    start + rng.randrange(days * 86400),
+                )
+                for _ in range(count)
+            ),
+            key=lambda journey: journey.timestamp,
+        )
+
+    def test_charges_match_tracker(self):
+        rng = random.Random(3)
+
+        for case in range(50):
+            config = json.loads(json.dumps(self.config))
+            if case % 2:
+                # Tight caps, so daily and weekly capping both kick in often
+                for key in self.line_pairs.keys:
+                    config["cap_chart"][key] = {
+                        "daily": rng.randrange(0, 15),
+                        "weekly": rng.randrange(0, 40),
+                    }
+            journeys = self.random_journeys(rng, 300, rng.choice([1, 5, 30]))
+
+            tracker = FareRules(config).new_tracker()
+            expected = [tracker.add_journey(journey) for journey in journeys]
+            timestamps, pair_ids = vectorized.journeys_to_columns(journeys)
+            with self.subTest(case=case):
+                charges = vectorized.price_columns(config, timestamps, pair_ids)
+                self.assertEqual(charges.tolist(), expected)
+
+    def test_rejects_fractional_amounts(self):
+        journeys = self.random_journeys(random.Random(5), 10, 1)
+        timestamps, pair_ids = vectorized.journeys_to_columns(journeys)
+        key = self.line_pairs.keys[0]
+        for chart, field in (
+            ("fare_chart", "peak"),
+            ("cap_chart", "daily"),
+            ("cap_chart", "weekly"),
+        ):
+            config = json.loads(json.dumps(self.config))
+            config[chart][key][field] += 0.1
+            with self.subTest(chart=chart, field=field):
+                with self.assertRaisesRegex(ValueError, "whole-number fares and caps"):
+                    vectorized.price_columns(config, timestamps, pair_ids)
+
+    def test_total_matches_data_files(self):
+        test_cases = [
+            ("tests/data/simulate_2_week_cap_restart_115.csv", 115),
+            ("tests/data/simulate_2_day_cap_restart_13.csv", 13),
+            ("tests/data/simulate_multiple_day_cap_restart_298.csv", 298),
+        ]
+
+        for file_path, expected in test_cases:
+            with self.subTest(file_path=file_path):
+                journeys = main.read_csv(file_path, self.line_pairs)
+                with patch.object(vectorized.logging, "info"):
+                    total_fare = vectorized.calculate_user_total_fare_vectorized(
+                        self.config, journeys[::-1]
+                    )
+                self.assertEqual(total_fare, expected)
+
+    def test_presorted_out_of_order(self):
+        journeys = self.random_journeys(random.Random(1), 10, 2)[::-1]
+
+        with self.assertRaises(JourneyOrderError):
+            vectorized.calculate_user_total_fare_vectorized(
+                self.config, journeys, presorted=True
+            )
+
+    def test_empty(self):
+        total_fare = vectorized.calculate_user_total_fare_vectorized(self.config, [])
+        self.assertEqual(total_fare, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import glob
 import os
 from settings import BASE_DIR
 
@@ -8,3 +9,42 @@ def resolve_path(file_path: str) -> str:
         return file_path
     else:
         return os.path.join(BASE_DIR, file_path)
+
+
+def parse_size(size: str) -> int:
+    """Parse a human-readable byte size such as `512M` or `2G` into bytes."""
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+    number = size.strip().upper().removesuffix("B")
+    multiplier = units.get(number[-1:])
+    if multiplier:
+        number = number[:-1]
+    value = int(float(number) * (multiplier or 1))
+    if value <= 0:
+        raise ValueError(f"Size must be positive: {size}")
+    return value
+
+
+def expand_input_paths(patterns):
+    """Expand input paths, globs and directories into a list of files.
+
+    A directory stands for the files directly inside it, and a glob for the
+    paths it matches, both in name order. Other paths are kept as they are, so
+    a missing file is reported when it is read. Each file is listed once.
+    """
+    file_paths = []
+    for pattern in patterns:
+        path = resolve_path(pattern)
+        if os.path.isdir(path):
+            matches = [
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if not name.startswith(".") and os.path.isfile(os.path.join(path, name))
+            ]
+        elif any(char in path for char in "*?["):
+            matches = sorted(glob.glob(path))
+        else:
+            matches = [path]
+        if not matches:
+            raise ValueError(f"No input files match {pattern}.")
+        file_paths.extend(matches)
+    return list(dict.fromkeys(file_paths))
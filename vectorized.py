@@ -0,0 +1,178 @@
+import logging
+from array import array
+from columnar import JourneyColumns
+from constants import MINUTES_PER_DAY
+from fare_system import FareRules
+from journey import EPOCH_WEEKDAY, SECONDS_PER_DAY, JourneyOrderError
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for this engine
+    np = None
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError(
+            "The numpy fare engine needs numpy, install it with `pip install numpy`."
+        )
+
+
+def journeys_to_columns(journeys):
+    """Convert journeys into (timestamps, pair IDs) column arrays."""
+    _require_numpy()
+    if isinstance(journeys, JourneyColumns):
+        pair_codes = np.frombuffer(journeys.pair_codes, dtype=np.uint16)
+        return (
+            np.frombuffer(journeys.timestamps, dtype=np.int64),
+            np.array(journeys.pair_ids, dtype=np.int64)[pair_codes],
+        )
+    timestamps = array("q")
+    pairs = array("q")
+    for journey in journeys:
+        timestamps.append(journey.timestamp)
+        pairs.append(journey.pair_id)
+    return (
+        np.frombuffer(timestamps, dtype=np.int64),
+        np.frombuffer(pairs, dtype=np.int64),
+    )
+
+
+def _week_starts(days):
+    """Return the first day of every fare week covering the sorted `days`.
+
+    A week starts on the day of the first journey and lasts seven days; the next
+    week starts on the first journey day after that, as in `UserJourneyTracker`.
+    """
+    unique_days = np.unique(days)
+    starts = []
+    index = 0
+    while index < len(unique_days):
+        week_start = unique_days[index]
+        starts.append(week_start)
+        index = np.searchsorted(unique_days, week_start + 7, side="left")
+    return np.array(starts, dtype=np.int64)
+
+
+def _group_starts(*keys):
+    """Flag the rows where any of the (already grouped) keys changes."""
+    starts = np.zeros(len(keys[0]), dtype=bool)
+    starts[0] = True
+    for key in keys:
+        starts[1:] |= key[1:] != key[:-1]
+    return starts
+
+
+def _require_whole_amounts(fare_rules):
+    """Reject fares and caps that are not integers.
+
+    The running sums are added up in a different order than the Python loop,
+    which only gives the same totals if every amount is an integer.
+    """
+    amounts = [
+        *(fare for fares in fare_rules.fare_calculator.fares for fare in fares),
+        *fare_rules.fare_cap.daily_caps,
+        *fare_rules.fare_cap.weekly_caps,
+    ]
+    if not all(type(amount) is int for amount in amounts):
+        raise ValueError(
+            "The numpy engine needs whole-number fares and caps; "
+            "use the python engine for this configuration."
+        )
+
+
+def price_columns(config, timestamps, pair_ids):
+    """Return the fare charged for every journey, given time-ordered columns.
+
+    `pair_ids` are `LinePairIndex` IDs. Within one line pair and
+    fare week, the amount charged so far each day only ever grows until it hits
+    min(daily cap, weekly cap - amount charged earlier that week), and the
+    weekly amount grows the same way, so both are capped running sums that can
+    be computed per (pair, day) and (pair, week) group without a Python loop.
+    Fares and caps must be integers, or a `ValueError` is raised.
+    """
+    _require_numpy()
+    count = len(timestamps)
+    if count == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    fare_rules = FareRules.compile(config)
+    _require_whole_amounts(fare_rules)
+    fare_matrix = np.array(fare_rules.fare_calculator.fares)
+    daily_caps = np.array(fare_rules.fare_cap.daily_caps)
+    weekly_caps = np.array(fare_rules.fare_cap.weekly_caps)
+    peak_minutes = np.frombuffer(
+        fare_rules.peak_hours_checker.peak_minutes, dtype=np.uint8
+    )
+
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    pair_ids = np.asarray(pair_ids, dtype=np.intp)
+    days = timestamps // SECONDS_PER_DAY
+    minute_of_week = (days + EPOCH_WEEKDAY) % 7 * MINUTES_PER_DAY + (
+        timestamps % SECONDS_PER_DAY
+    ) // 60
+    base_fares = fare_matrix[pair_ids, peak_minutes[minute_of_week]]
+    week_starts = _week_starts(days)
+    weeks = np.searchsorted(week_starts, days, side="right") - 1
+
+    # Group by line pair, keeping time order within each pair
+    order = np.argsort(pair_ids, kind="stable")
+    pairs = pair_ids[order]
+    fares = base_fares[order]
+    day_starts = np.flatnonzero(_group_starts(pairs, days[order]))
+    week_starts_mask = _group_starts(pairs, weeks[order])
+
+    # Running base fare within each (pair, day) group
+    running = np.cumsum(fares)
+    day_group = np.repeat(np.arange(len(day_starts)), np.diff(day_starts, append=count))
+    day_running = running - (running[day_starts] - fares[day_starts])[day_group]
+    day_totals = day_running[np.append(day_starts[1:] - 1, count - 1)]
+
+    # Amount charged on earlier days of the same (pair, week) group
+    day_pairs = pairs[day_starts]
+    day_charged = np.minimum(day_totals, daily_caps[day_pairs])
+    week_running = np.cumsum(day_charged) - day_charged
+    new_week = week_starts_mask[day_starts]
+    week_first_day = np.flatnonzero(new_week)
+    week_group = np.cumsum(new_week) - 1
+    charged_before = week_running - week_running[week_first_day][week_group]
+    charged_before = np.minimum(charged_before, weekly_caps[day_pairs])
+
+    # Cap each day's running total, then charge the increments
+    day_limit = np.minimum(
+        daily_caps[day_pairs], weekly_caps[day_pairs] - charged_before
+    )
+    capped = np.minimum(day_running, day_limit[day_group])
+    charges_grouped = np.diff(capped, prepend=0)
+    charges_grouped[day_starts] = capped[day_starts]
+
+    charges = np.empty_like(charges_grouped)
+    charges[order] = charges_grouped
+    return charges
+
+
+def calculate_user_total_fare_vectorized(config, journeys, presorted=False):
+    """Calculate the total fare like `main.calculate_user_total_fare`, using numpy.
+
+    Journeys are converted to column arrays and priced without a per-journey
+    Python loop. With `presorted`, a `JourneyOrderError` is raised if they turn
+    out not to be in time order; otherwise they are sorted first.
+    """
+    logging.info("Starting vectorized fare calculation for the given user journeys.")
+
+    timestamps, pair_ids = journeys_to_columns(journeys)
+    if presorted:
+        out_of_order = np.flatnonzero(np.diff(timestamps) < 0)
+        if len(out_of_order):
+            raise JourneyOrderError(
+                f"Journey #{out_of_order[0] + 2} is earlier than the journey before "
+                "it; input is not in time order."
+            )
+    else:
+        order = np.argsort(timestamps, kind="stable")
+        timestamps = timestamps[order]
+        pair_ids = pair_ids[order]
+
+    total_fare = price_columns(config, timestamps, pair_ids).sum().item()
+    logging.info(f"Total Fare for {len(timestamps)} journeys: ${total_fare}.")
+    return total_fare